@@ -0,0 +1 @@
+"""Reproducible benchmarks for the workout progress stack (``python -m benchmarks.run``)."""
@@ -0,0 +1,155 @@
+"""Synthetic users with a realistic workout history for benchmarking."""
+
+import random
+from datetime import datetime, timedelta
+
+from src.models.user import (
+    User,
+    UserProfile,
+    WorkoutDay,
+    WorkoutExercise,
+    WorkoutPlan,
+    WorkoutSession,
+    WorkoutSessionExerciseCompletion,
+    WorkoutSessionExerciseOverride,
+    WorkoutSetPerformance,
+    db,
+)
+from src.services.history_jobs import process_user_history
+from src.services.workout_plans import exercise_catalog
+from src.services.workout_progress import create_weekly_goal, week_start_for
+
+
+PASSWORD = "benchmark-password"
+DAYS = ("A", "B", "C")
+EXERCISES_PER_DAY = 5
+SETS_PER_EXERCISE = 3
+# One session in OVERRIDE_EVERY swaps its first exercise for another catalog entry.
+OVERRIDE_EVERY = 7
+FLUSH_EVERY = 200
+
+
+def _create_plan(user, rng):
+    catalog = exercise_catalog()
+    picked = rng.sample(catalog, len(DAYS) * EXERCISES_PER_DAY + 1)
+    plan = WorkoutPlan(
+        user_id=user.id,
+        title="Benchmark ABC",
+        status="published",
+        source="manual",
+        days_per_week=len(DAYS),
+    )
+    db.session.add(plan)
+    db.session.flush()
+    days = []
+    for day_index, code in enumerate(DAYS):
+        day = WorkoutDay(workout_plan_id=plan.id, code=code, title=f"Treino {code}", order=day_index + 1)
+        db.session.add(day)
+        db.session.flush()
+        exercises = []
+        for order in range(EXERCISES_PER_DAY):
+            item = picked[day_index * EXERCISES_PER_DAY + order]
+            exercise = WorkoutExercise(
+                workout_plan_id=plan.id,
+                workout_day_id=day.id,
+                catalog_key=item["key"],
+                name=item["name"],
+                sets=SETS_PER_EXERCISE,
+                reps="8-12",
+                order=order + 1,
+            )
+            db.session.add(exercise)
+            exercises.append(exercise)
+        days.append((day, exercises))
+    db.session.flush()
+    return plan, days, picked[-1]
+
+
+def add_session(user, plan, day, exercises, completed_at, rng, *, override=None, progression=0):
+    """Add one session with warm-up and working sets; ``completed_at=None`` leaves it active."""
+    started_at = (completed_at or datetime.utcnow()) - timedelta(minutes=rng.randint(35, 80))
+    session = WorkoutSession(
+        user_id=user.id,
+        workout_plan_id=plan.id,
+        workout_day_id=day.id,
+        started_at=started_at,
+        completed_at=completed_at,
+    )
+    db.session.add(session)
+    db.session.flush()
+    for index, exercise in enumerate(exercises):
+        catalog_key, name = exercise.catalog_key, exercise.name
+        if override is not None and index == 0:
+            catalog_key, name = override["key"], override["name"]
+            db.session.add(WorkoutSessionExerciseOverride(
+                workout_session_id=session.id,
+                workout_exercise_id=exercise.id,
+                catalog_key=catalog_key,
+                name=name,
+                sets=SETS_PER_EXERCISE,
+                reps="8-12",
+            ))
+        completion = WorkoutSessionExerciseCompletion(
+            workout_session_id=session.id,
+            workout_exercise_id=exercise.id,
+            exercise_name=name,
+            exercise_catalog_key=catalog_key,
+            completed_at=completed_at or datetime.utcnow(),
+        )
+        db.session.add(completion)
+        db.session.flush()
+        base = 20 + 5 * index + progression * 0.25
+        db.session.add(WorkoutSetPerformance(
+            completion_id=completion.id,
+            set_order=1,
+            load_kg=round(base * 0.5, 1),
+            repetitions=12,
+            is_warmup=True,
+        ))
+        for order in range(2, SETS_PER_EXERCISE + 2):
+            db.session.add(WorkoutSetPerformance(
+                completion_id=completion.id,
+                set_order=order,
+                load_kg=round(base + rng.choice((-2.5, 0, 0, 2.5)), 1),
+                repetitions=rng.randint(6, 12),
+                is_warmup=False,
+            ))
+    return session
+
+
+def seed_user(username, sessions, *, seed=0, process_history=True):
+    """Create ``username`` with ``sessions`` finished sessions spread over past weeks.
+
+    The same ``seed`` always produces the same loads, repetitions and overrides, so
+    results from different commits compare like for like. With ``process_history``
+    the PR, week counter, achievement and summary backfill runs before returning.
+    """
+    rng = random.Random(seed)
+    user = User(username=username)
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(UserProfile(user_id=user.id, timezone="UTC"))
+    plan, days, substitute = _create_plan(user, rng)
+
+    first = datetime.utcnow().replace(microsecond=0) - timedelta(days=2 * sessions + 1)
+    create_weekly_goal(user.id, 3, "UTC", effective_week_start=week_start_for(first, "UTC"))
+    for index in range(sessions):
+        day, exercises = days[index % len(days)]
+        completed_at = first + timedelta(days=2 * index, hours=rng.randint(6, 20))
+        add_session(
+            user,
+            plan,
+            day,
+            exercises,
+            completed_at,
+            rng,
+            override=substitute if index % OVERRIDE_EVERY == OVERRIDE_EVERY - 1 else None,
+            progression=index,
+        )
+        if index % FLUSH_EVERY == 0:
+            db.session.flush()
+    db.session.commit()
+    if process_history:
+        process_user_history(user.id)
+    return user.id
@@ -0,0 +1,104 @@
+"""Memory and speed of the in-memory rate limiter under a flood of distinct clients.
+
+    python -m benchmarks.rate_limit --keys 1000000
+    python -m benchmarks.rate_limit --keys 1000000 --max-keys 50000 --baseline --output limiter.json
+
+Every check comes from a new ``login`` key, as in a credential-stuffing burst from
+many addresses. One pass is timed; a second one, on a fresh limiter, samples the
+memory held (``tracemalloc``) at checkpoints. Once the key cap is reached the
+bounded limiter stays flat, while ``--baseline`` adds the unbounded
+deque-per-key limiter it replaced, which grows with every client.
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from pathlib import Path
+
+from src.services.rate_limit_backends import MemoryBackend
+
+
+class UnboundedBackend:
+    """The previous limiter: one deque of hit timestamps per key, never pruned."""
+
+    def __init__(self):
+        self._hits = defaultdict(deque)
+
+    def allow(self, key, limit, window):
+        now = time.monotonic()
+        hits = self._hits[key]
+        while hits and hits[0] <= now - window:
+            hits.popleft()
+        if len(hits) >= limit:
+            return False
+        hits.append(now)
+        return True
+
+    def size(self):
+        return len(self._hits)
+
+
+def _key(index):
+    return f"login|10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}|"
+
+
+def run(make_backend, keys, checkpoints=10, limit=5, window=60):
+    """Feed ``keys`` distinct keys to fresh backends from ``make_backend``."""
+    backend = make_backend()
+    started = time.perf_counter()
+    for index in range(keys):
+        backend.allow(_key(index), limit, window)
+    elapsed = time.perf_counter() - started
+
+    step = max(1, keys // checkpoints)
+    samples = []
+    tracemalloc.start()
+    try:
+        backend = make_backend()
+        base = tracemalloc.get_traced_memory()[0]
+        for index in range(keys):
+            backend.allow(_key(index), limit, window)
+            if (index + 1) % step == 0 or index + 1 == keys:
+                samples.append({
+                    "keys_seen": index + 1,
+                    "keys_held": backend.size(),
+                    "memory_mb": round((tracemalloc.get_traced_memory()[0] - base) / 1e6, 2),
+                })
+    finally:
+        tracemalloc.stop()
+    return {
+        "backend": type(backend).__name__,
+        "keys": keys,
+        "us_per_check": round(elapsed / keys * 1e6, 2) if keys else 0.0,
+        "checkpoints": samples,
+    }
+
+
+def _print(result):
+    print(f"{result['backend']}: {result['us_per_check']} us/check")
+    for sample in result["checkpoints"]:
+        print(f"  {sample['keys_seen']:>9} keys seen  {sample['keys_held']:>9} held  {sample['memory_mb']:>8.2f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--max-keys", type=int, default=100_000)
+    parser.add_argument("--checkpoints", type=int, default=10)
+    parser.add_argument("--baseline", action="store_true", help="Also run the unbounded deque-per-key limiter.")
+    parser.add_argument("--output", type=Path, help="Write the JSON results to this file.")
+    args = parser.parse_args(argv)
+
+    results = [run(lambda: MemoryBackend(max_keys=args.max_keys), args.keys, args.checkpoints)]
+    if args.baseline:
+        results.append(run(UnboundedBackend, args.keys, args.checkpoints))
+    for result in results:
+        _print(result)
+    if args.output:
+        args.output.write_text(json.dumps({"max_keys": args.max_keys, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Time the workout progress endpoints and services against synthetic users.
+
+    python -m benchmarks.run --sizes 10 100 1000 5000 --output results.json
+    python -m benchmarks.run --database-url postgresql://localhost/diet_bench --output pg.json
+    python -m benchmarks.run --sizes 100 --compare results.json
+
+Each size gets a fresh schema and one user with that many finished sessions. Every
+case is repeated and reports min/median/max milliseconds plus its SQL statement
+count, so JSON files written on two commits can be compared with ``--compare``.
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from main import create_app
+from src.config import TestConfig
+from src.models.user import User, WorkoutSession, db
+from src.services.achievements import evaluate_achievements
+from src.services.activities import build_session_summary
+from src.services.db_metrics import count_queries
+from src.services.history_jobs import process_user_history
+from src.services.personal_records import (
+    backfill_personal_records,
+    process_session_personal_records,
+)
+from src.services.workout_progress import rebuild_week_counts, weekly_progress
+
+from benchmarks.fixtures import add_session, seed_user
+
+
+DEFAULT_SIZES = (10, 100, 1000, 5000)
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _config(database_url):
+    class BenchmarkConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = database_url
+        RATE_LIMITS = {}
+
+    return BenchmarkConfig
+
+
+def _measure(case, repeat):
+    """Run ``case`` ``repeat`` times and keep its timings and worst statement count.
+
+    A ``(case, setup)`` pair runs ``setup`` untimed first and passes its result on.
+    """
+    case, setup = case if isinstance(case, tuple) else (case, None)
+    timings, queries = [], []
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        with count_queries() as counter:
+            started = time.perf_counter()
+            case(*args)
+            elapsed = time.perf_counter() - started
+        timings.append(elapsed * 1000)
+        queries.append(counter.count)
+    return {
+        "min_ms": round(min(timings), 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "max_ms": round(max(timings), 3),
+        "queries": max(queries),
+    }
+
+
+def _new_session(user_id, completed_at=None):
+    """Add a session shaped like the user's last one; callers time only what follows."""
+    last = (
+        WorkoutSession.query.filter_by(user_id=user_id)
+        .order_by(WorkoutSession.completed_at.desc())
+        .first()
+    )
+    exercises = sorted(last.day.exercises, key=lambda item: item.order)
+    session = add_session(
+        db.session.get(User, user_id),
+        last.plan,
+        last.day,
+        exercises,
+        completed_at,
+        random.Random(len(exercises)),
+        progression=10_000,
+    )
+    db.session.commit()
+    return session.id
+
+
+def _endpoint_cases(client, user_id):
+    def get(url):
+        def case():
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+
+        return case
+
+    def finish(session_id):
+        response = client.post(f"/api/workout_sessions/{session_id}/finish")
+        assert response.status_code == 200, response.get_json()
+
+    return {
+        "GET /api/activities": get("/api/activities"),
+        "GET /api/activities?cursor=": get("/api/activities?cursor="),
+        "GET /api/progress/overview": get("/api/progress/overview"),
+        "GET /api/progress/weekly": get("/api/progress/weekly"),
+        "POST /api/workout_sessions/<id>/finish": (finish, lambda: _new_session(user_id)),
+    }
+
+
+def _service_cases(user_id):
+    def latest_session():
+        return (
+            WorkoutSession.query.filter_by(user_id=user_id)
+            .order_by(WorkoutSession.completed_at.desc())
+            .first()
+        )
+
+    def rollback_after(function):
+        def case(*args):
+            try:
+                function(*args)
+            finally:
+                db.session.rollback()
+
+        return case
+
+    def new_finished_session():
+        session_id = _new_session(user_id, completed_at=datetime.utcnow())
+        return db.session.get(WorkoutSession, session_id)
+
+    return {
+        "weekly_progress": rollback_after(lambda: weekly_progress(user_id)),
+        "evaluate_achievements": rollback_after(
+            lambda: evaluate_achievements(user_id, backfilled=True)
+        ),
+        "build_session_summary": rollback_after(lambda: build_session_summary(latest_session())),
+        "rebuild_week_counts": rollback_after(lambda: rebuild_week_counts(user_id)),
+        "process_session_personal_records": (
+            rollback_after(process_session_personal_records),
+            new_finished_session,
+        ),
+    }
+
+
+def run_size(database_url, sessions, repeat, seed):
+    app = create_app(_config(database_url))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        user_id = seed_user(f"bench-{sessions}", sessions, seed=seed, process_history=False)
+        seed_ms = (time.perf_counter() - started) * 1000
+
+        backfill = _measure(lambda: backfill_personal_records(user_id, commit=True), 1)
+        process_user_history(user_id)
+
+        results = {
+            "sessions": sessions,
+            "seed_ms": round(seed_ms, 3),
+            "services": {"backfill_personal_records (cold)": backfill},
+            "endpoints": {},
+        }
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["user_id"] = user_id
+        # Endpoints run first: the service cases leave sessions without stored summaries.
+        for name, case in _endpoint_cases(client, user_id).items():
+            results["endpoints"][name] = _measure(case, repeat)
+        for name, case in _service_cases(user_id).items():
+            results["services"][name] = _measure(case, repeat)
+        db.session.remove()
+        db.drop_all()
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    """Return one line per case with the median change against ``previous``."""
+    before = {item["sessions"]: item for item in previous["results"]}
+    lines = []
+    for result in current["results"]:
+        old = before.get(result["sessions"])
+        if old is None:
+            continue
+        for group in ("services", "endpoints"):
+            for name, stats in result[group].items():
+                reference = old[group].get(name)
+                if not reference or not reference["median_ms"]:
+                    continue
+                ratio = stats["median_ms"] / reference["median_ms"]
+                lines.append(
+                    f"{result['sessions']:>6} {name:<45} "
+                    f"{reference['median_ms']:>10.2f} -> {stats['median_ms']:>10.2f} ms "
+                    f"({ratio:>5.2f}x) queries {reference['queries']} -> {stats['queries']}"
+                )
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES))
+    parser.add_argument(
+        "--database-url",
+        help="Database to benchmark against; its tables are dropped. Defaults to a temporary SQLite file.",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the JSON results to this file.")
+    parser.add_argument("--compare", type=Path, help="Print median changes against a previous JSON file.")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = args.database_url or f"sqlite:///{Path(directory) / 'benchmark.db'}"
+        results = []
+        for sessions in args.sizes:
+            print(f"Benchmarking {sessions} sessions...", file=sys.stderr)
+            results.append(run_size(database_url, sessions, args.repeat, args.seed))
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.utcnow().isoformat(),
+        "database": database_url.split(":", 1)[0] if args.database_url else "sqlite",
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "results": results,
+    }
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(payload + "\n", encoding="utf-8")
+    else:
+        print(payload)
+    if args.compare:
+        for line in compare(json.loads(args.compare.read_text(encoding="utf-8")), report):
+            print(line, file=sys.stderr)
+    return report
+
+
+if __name__ == "__main__":
+    main()
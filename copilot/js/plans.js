@@ -223,7 +223,9 @@
 
         let response;
         try {
-            response = await fetch(`${API_BASE}${path}`, fetchOptions);
+            response = options.aiJob
+                ? await runAIJob(path, options.body)
+                : await fetch(`${API_BASE}${path}`, fetchOptions);
         } catch (error) {
             const connectionError = new Error("Não foi possível conectar ao servidor. Tente novamente.");
             connectionError.cause = error;
@@ -743,7 +745,8 @@
                 : `/${type === "diet" ? "diet_plans" : "workout_plans"}/generate`;
             result = await apiRequest(path, {
                 method: "POST",
-                body: buildWizardPayload(type)
+                body: buildWizardPayload(type),
+                aiJob: true
             });
         } catch (error) {
             state.generating = false;
@@ -17,7 +17,7 @@
     const segment = (value) => encodeURIComponent(String(value));
 
     async function api(path, options = {}) {
-        const response = await fetch(`${API_BASE}${path}`, {
+        const response = options.aiJob ? await runAIJob(path, options.body) : await fetch(`${API_BASE}${path}`, {
             method: options.method || "GET",
             credentials: "include",
             headers: options.body === undefined ? {} : { "Content-Type": "application/json" },
@@ -414,7 +414,7 @@
         try {
             showToast("Gerando uma sugestão que preserva metas e restrições...", "info");
             const base = `/professional/students/${segment(state.student.id)}/diet-plans/${segment(planId)}`;
-            const suggestion = await api(`${base}/suggest`, { method: "POST", body: { day, feedback } });
+            const suggestion = await api(`${base}/suggest`, { method: "POST", body: { day, feedback }, aiJob: true });
             const preview = suggestion.meals.map((meal) => `${meal.meal_type}: ${asArray(meal.items).join(", ")} (${meal.calories} kcal)`).join("\n\n");
             if (!window.confirm(`Sugestão para o Dia ${day}:\n\n${preview}\n\nAplicar esta mudança ao rascunho?`)) return;
             await api(`${base}/days/${day}`, { method: "PUT", body: { meals: suggestion.meals } });
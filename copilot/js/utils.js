@@ -12,3 +12,32 @@ function localDateInputValue(date = new Date()) {
     const offsetDate = new Date(date.getTime() - date.getTimezoneOffset() * 60_000);
     return offsetDate.toISOString().slice(0, 10);
 }
+
+// AI generations run as background jobs: submit with `Prefer: respond-async`, then poll
+// the job until it finishes. Resolves to a Response carrying the job's JSON and status,
+// as the synchronous endpoint would have answered.
+async function runAIJob(path, body, { interval = 2000, timeout = 15 * 60_000 } = {}) {
+    const response = await fetch(`${API_BASE}${path}`, {
+        method: "POST",
+        credentials: "include",
+        headers: { "Content-Type": "application/json", "Prefer": "respond-async" },
+        body: JSON.stringify(body)
+    });
+    if (response.status !== 202) return response;
+    let job = (await response.json()).job;
+    const deadline = Date.now() + timeout;
+    while (job.status === "queued" || job.status === "running") {
+        if (Date.now() > deadline) {
+            return new Response(JSON.stringify({ error: "A geração demorou demais. Tente novamente." }), { status: 504 });
+        }
+        await new Promise((resolve) => setTimeout(resolve, interval));
+        const poll = await fetch(`${API_BASE}/ai-jobs/${encodeURIComponent(job.id)}`, { credentials: "include" });
+        if (!poll.ok) return poll;
+        job = (await poll.json()).job;
+    }
+    const status = job.status_code || (job.status === "succeeded" ? 200 : 500);
+    return new Response(JSON.stringify(job.result || {}), {
+        status,
+        headers: { "Content-Type": "application/json" }
+    });
+}
@@ -853,25 +853,10 @@ async function sendChatMessage() {
     showTypingIndicator();
     
     try {
-        const response = await fetch(`${API_BASE}/chat`, {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json"
-            },
-            credentials: "include",
-            body: JSON.stringify({ message: message })
-        });
-        
-        if (response.ok) {
-            const data = await response.json();
-            hideTypingIndicator();
+        const data = await streamChatReply({ message: message });
+        if (data) {
             lastAIResponse = data.response; // Salva para reprodução de áudio
-            addMessageToChat(data.response, "bot");
             if (window.handlePlanChatAction) window.handlePlanChatAction(data.action);
-        } else {
-            hideTypingIndicator();
-            const errorData = await response.json();
-            addMessageToChat(errorData.error || "Desculpe, ocorreu um erro. Tente novamente.", "bot");
         }
     } catch (error) {
         console.error("Chat error:", error);
@@ -880,6 +865,69 @@ async function sendChatMessage() {
     }
 }
 
+/**
+ * Envia a mensagem para /chat/stream e mostra a resposta enquanto a IA escreve
+ * @param {object} body - Corpo da requisição ({ message, intent })
+ * @returns {Promise<object|null>} Dados do evento "done" ou null em caso de erro
+ */
+async function streamChatReply(body) {
+    const response = await fetch(`${API_BASE}/chat/stream`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        credentials: "include",
+        body: JSON.stringify(body)
+    });
+    if (!response.ok) {
+        hideTypingIndicator();
+        const errorData = await response.json().catch(() => ({}));
+        addMessageToChat(errorData.error || "Desculpe, ocorreu um erro. Tente novamente.", "bot");
+        return null;
+    }
+
+    const chatMessages = getElement("chatMessages");
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let text = "";
+    let content = null;
+    const showText = (value) => {
+        if (!content) {
+            hideTypingIndicator();
+            content = addMessageToChat("", "bot");
+        }
+        if (content) content.textContent = value;
+        if (chatMessages) chatMessages.scrollTop = chatMessages.scrollHeight;
+    };
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            const event = /^event: (.*)$/m.exec(block)?.[1];
+            const payload = /^data: (.*)$/m.exec(block)?.[1];
+            if (!event || !payload) continue;
+            const data = JSON.parse(payload);
+            if (event === "delta") {
+                text += data.text;
+                showText(text);
+            } else if (event === "done") {
+                showText(data.response);
+                return data;
+            } else if (event === "error") {
+                hideTypingIndicator();
+                addMessageToChat(data.error || "Desculpe, ocorreu um erro. Tente novamente.", "bot");
+                return null;
+            }
+        }
+    }
+    hideTypingIndicator();
+    return null;
+}
+
 /**
  * Envia mensagem para a IA com o perfil do usuário (usado pelos botões rápidos)
  */
@@ -890,16 +938,8 @@ async function sendChatMessageWithProfile(message, intent) {
     showTypingIndicator();
     
     try {
-        const response = await fetch(`${API_BASE}/chat`, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            credentials: "include",
-            body: JSON.stringify({ message, intent })
-        });
-        const data = await response.json();
-        hideTypingIndicator();
-        if (response.ok && data.response) {
-            addMessageToChat(data.response, "bot");
+        const data = await streamChatReply({ message, intent });
+        if (data) {
             lastAIResponse = data.response;
             if (window.handlePlanChatAction) window.handlePlanChatAction(data.action);
         }
@@ -924,6 +964,7 @@ function addMessageToChat(message, sender) {
     `;
     chatMessages.appendChild(messageDiv);
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    return messageDiv.querySelector(".message-content");
 }
 
 /**
@@ -2130,12 +2171,7 @@ async function generateDietDaySuggestion() {
     generateBtn.disabled = true;
     generateBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Gerando...';
     try {
-        const response = await fetch(`${API_BASE}/diet_plans/${cardapioActivePlan.id}/suggest`, {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            credentials: "include",
-            body: JSON.stringify({ day: cardapioDay, feedback })
-        });
+        const response = await runAIJob(`/diet_plans/${cardapioActivePlan.id}/suggest`, { day: cardapioDay, feedback });
         if (response.ok) {
             const data = await response.json();
             pendingDietDaySuggestion = data.meals;
@@ -1,5 +1,6 @@
 import os
 import sqlite3
+import time
 
 import click
 from dotenv import load_dotenv
@@ -16,6 +17,12 @@ from src.models.user import db
 from src.models.user import User
 from src.routes.user_routes import user_bp
 from src.routes.professional_routes import professional_bp
+from src.services.ai_usage import init_ai_usage
+from src.services.db_metrics import init_db_metrics
+from src.services.history_jobs import process_dirty_histories, process_user_history
+from src.services.personal_records import backfill_personal_records, users_with_unprocessed_sessions
+from src.services.workout_plans import exercise_catalog
+from src.services.workoutx import warm_media
 
 
 @event.listens_for(Engine, "connect")
@@ -43,6 +50,8 @@ def create_app(config_class=Config):
 
     db.init_app(app)
     Migrate(app, db)
+    init_db_metrics(app)
+    init_ai_usage(app)
 
     app.register_blueprint(user_bp, url_prefix="/api")
     app.register_blueprint(professional_bp, url_prefix="/api")
@@ -101,6 +110,69 @@ def create_app(config_class=Config):
         db.session.commit()
         click.echo(f"Owner ready: {username}")
 
+    @app.cli.command("backfill-prs")
+    @click.option("--user", "username", help="Backfill a single user.")
+    @click.option("--all", "all_users", is_flag=True, help="Backfill every user with pending sessions.")
+    @click.option("--chunk-size", default=500, show_default=True, type=click.IntRange(min=1))
+    def backfill_prs(username, all_users, chunk_size):
+        """Bulk-process personal records for sessions that were never analysed."""
+        if bool(username) == all_users:
+            raise click.ClickException("Use exactly one of --user or --all")
+        if username:
+            user = User.query.filter_by(username=username).first()
+            if user is None:
+                raise click.ClickException(f"Unknown user: {username}")
+            user_ids = [user.id]
+        else:
+            user_ids = users_with_unprocessed_sessions()
+        started = time.perf_counter()
+        sessions = events = 0
+        for user_id in user_ids:
+            totals = backfill_personal_records(user_id, chunk_size=chunk_size, commit=True)
+            sessions += totals["sessions"]
+            events += totals["events"]
+            click.echo(f"{user_id}: {totals['sessions']} sessions, {totals['events']} records")
+        elapsed = time.perf_counter() - started
+        rate = sessions / elapsed if elapsed else 0
+        click.echo(
+            f"Backfilled {sessions} sessions and {events} records for {len(user_ids)} users "
+            f"in {elapsed:.2f}s ({rate:.1f} sessions/s)"
+        )
+
+    @app.cli.command("process-workout-history")
+    @click.option("--user", "username", help="Process a single user regardless of the marker.")
+    @click.option("--limit", type=click.IntRange(min=1), help="Maximum users per pass.")
+    @click.option("--watch", is_flag=True, help="Keep polling for dirty users.")
+    @click.option("--interval", default=5.0, show_default=True, help="Seconds between polls.")
+    def process_workout_history(username, limit, watch, interval):
+        """Run the deferred PR, weekly and achievement backfill for dirty users."""
+        if username:
+            user = User.query.filter_by(username=username).first()
+            if user is None:
+                raise click.ClickException(f"Unknown user: {username}")
+            process_user_history(user.id)
+            click.echo(f"Workout history processed: {username}")
+            return
+        while True:
+            processed = process_dirty_histories(limit)
+            click.echo(f"Workout histories processed: {processed}")
+            if not watch:
+                return
+            db.session.remove()
+            time.sleep(interval)
+
+    @app.cli.command("warm-media")
+    @click.option("--workers", default=4, show_default=True, type=click.IntRange(min=1, max=16))
+    def warm_media_command(workers):
+        """Download the GIF of every approved exercise mapping into the local cache."""
+        totals = warm_media([exercise["key"] for exercise in exercise_catalog()], workers)
+        for catalog_key, message in sorted(totals["failures"].items()):
+            click.echo(f"{catalog_key}: {message}", err=True)
+        click.echo(
+            f"Exercise media ready: {totals['ready']}, failed: {totals['failed']}, "
+            f"without approved media: {totals['unmapped']}"
+        )
+
     @app.route("/admin")
     def serve_admin():
         return send_from_directory(app.static_folder, "admin.html")
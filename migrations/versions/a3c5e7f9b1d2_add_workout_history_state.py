@@ -0,0 +1,42 @@
+"""add workout history state
+
+Revision ID: a3c5e7f9b1d2
+Revises: e4f6a8b0c2d4
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy_utils import UUIDType
+
+
+revision = "a3c5e7f9b1d2"
+down_revision = "e4f6a8b0c2d4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "workout_history_state",
+        sa.Column("user_id", UUIDType(binary=False), nullable=False),
+        sa.Column("dirty_at", sa.DateTime(), nullable=True),
+        sa.Column("processed_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    op.create_index(
+        "ix_workout_history_state_dirty",
+        "workout_history_state",
+        ["dirty_at"],
+    )
+    op.execute(sa.text("""
+        INSERT INTO workout_history_state (user_id, dirty_at)
+        SELECT DISTINCT user_id, CURRENT_TIMESTAMP
+        FROM workout_session
+        WHERE completed_at IS NOT NULL
+    """))
+
+
+def downgrade():
+    op.drop_index("ix_workout_history_state_dirty", table_name="workout_history_state")
+    op.drop_table("workout_history_state")
@@ -0,0 +1,33 @@
+"""add nutrition estimates
+
+Revision ID: a4c6e8f0b2d5
+Revises: f3a5c7e9b1d3
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "a4c6e8f0b2d5"
+down_revision = "f3a5c7e9b1d3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "nutrition_estimate",
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("macros", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+    op.create_index(
+        "ix_nutrition_estimate_expires_at", "nutrition_estimate", ["expires_at"]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_nutrition_estimate_expires_at", table_name="nutrition_estimate")
+    op.drop_table("nutrition_estimate")
@@ -0,0 +1,34 @@
+"""add achievement progress
+
+Revision ID: b5d7f9a1c3e4
+Revises: a3c5e7f9b1d2
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy_utils import UUIDType
+
+
+revision = "b5d7f9a1c3e4"
+down_revision = "a3c5e7f9b1d2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "achievement_progress",
+        sa.Column("user_id", UUIDType(binary=False), nullable=False),
+        sa.Column("session_count", sa.Integer(), nullable=False),
+        sa.Column("highlighted_pr_count", sa.Integer(), nullable=False),
+        sa.Column("streak_weeks", sa.Integer(), nullable=False),
+        sa.Column("streak_week_start", sa.Date(), nullable=True),
+        sa.Column("rebuilt_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("achievement_progress")
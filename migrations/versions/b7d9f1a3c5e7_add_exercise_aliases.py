@@ -0,0 +1,29 @@
+"""add exercise aliases
+
+Revision ID: b7d9f1a3c5e7
+Revises: a4c6e8f0b2d5
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "b7d9f1a3c5e7"
+down_revision = "a4c6e8f0b2d5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "exercise_alias",
+        sa.Column("name", sa.String(length=160), nullable=False),
+        sa.Column("catalog_key", sa.String(length=80), nullable=False),
+        sa.Column("source", sa.String(length=20), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade():
+    op.drop_table("exercise_alias")
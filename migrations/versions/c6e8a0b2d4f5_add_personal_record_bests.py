@@ -0,0 +1,47 @@
+"""add personal record bests
+
+Revision ID: c6e8a0b2d4f5
+Revises: b5d7f9a1c3e4
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy_utils import UUIDType
+
+
+revision = "c6e8a0b2d4f5"
+down_revision = "b5d7f9a1c3e4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "personal_record_best",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", UUIDType(binary=False), nullable=False),
+        sa.Column("exercise_key", sa.String(length=80), nullable=False),
+        sa.Column("metric_type", sa.String(length=24), nullable=False),
+        sa.Column("metric_key", sa.String(length=80), nullable=False),
+        sa.Column("best_event_id", sa.Integer(), nullable=False),
+        sa.Column("best_value", sa.Numeric(14, 4), nullable=False),
+        sa.Column("latest_event_id", sa.Integer(), nullable=False),
+        sa.Column("latest_achieved_at", sa.DateTime(), nullable=False),
+        sa.Column("latest_session_id", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["best_event_id"], ["personal_record_event.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["latest_event_id"], ["personal_record_event.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "user_id",
+            "exercise_key",
+            "metric_type",
+            "metric_key",
+            name="uq_pr_best_user_exercise_metric",
+        ),
+    )
+
+
+def downgrade():
+    op.drop_table("personal_record_best")
@@ -0,0 +1,41 @@
+"""add ai usage ledger
+
+Revision ID: c9e1a3b5d7f9
+Revises: b7d9f1a3c5e7
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy_utils import UUIDType
+
+
+revision = "c9e1a3b5d7f9"
+down_revision = "b7d9f1a3c5e7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ai_usage",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("feature", sa.String(length=40), nullable=False),
+        sa.Column("model", sa.String(length=80), nullable=False),
+        sa.Column("user_id", UUIDType(binary=False), nullable=True),
+        sa.Column("attempt", sa.Integer(), nullable=False),
+        sa.Column("latency_ms", sa.Float(), nullable=False),
+        sa.Column("prompt_tokens", sa.Integer(), nullable=False),
+        sa.Column("cached_tokens", sa.Integer(), nullable=False),
+        sa.Column("output_tokens", sa.Integer(), nullable=False),
+        sa.Column("finish_reason", sa.String(length=40), nullable=True),
+        sa.Column("outcome", sa.String(length=20), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_ai_usage_created_at", "ai_usage", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_ai_usage_created_at", table_name="ai_usage")
+    op.drop_table("ai_usage")
@@ -0,0 +1,30 @@
+"""add rate limit buckets
+
+Revision ID: d1f3b5c7e9a1
+Revises: c9e1a3b5d7f9
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "d1f3b5c7e9a1"
+down_revision = "c9e1a3b5d7f9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "rate_limit_bucket",
+        sa.Column("key", sa.String(length=255), nullable=False),
+        sa.Column("tokens", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+    op.create_index("ix_rate_limit_bucket_updated_at", "rate_limit_bucket", ["updated_at"])
+
+
+def downgrade():
+    op.drop_index("ix_rate_limit_bucket_updated_at", table_name="rate_limit_bucket")
+    op.drop_table("rate_limit_bucket")
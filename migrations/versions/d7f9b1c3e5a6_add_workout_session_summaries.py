@@ -0,0 +1,53 @@
+"""add workout session summaries
+
+Revision ID: d7f9b1c3e5a6
+Revises: c6e8a0b2d4f5
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy_utils import UUIDType
+
+
+revision = "d7f9b1c3e5a6"
+down_revision = "c6e8a0b2d4f5"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "workout_session_summary",
+        sa.Column("workout_session_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", UUIDType(binary=False), nullable=False),
+        sa.Column("completed_at", sa.DateTime(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("data", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["workout_session_id"], ["workout_session.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("workout_session_id"),
+    )
+    op.create_index(
+        "ix_workout_session_summary_user_completed",
+        "workout_session_summary",
+        ["user_id", "completed_at", "workout_session_id"],
+    )
+    op.execute(sa.text("""
+        UPDATE workout_history_state SET dirty_at = CURRENT_TIMESTAMP
+        WHERE user_id IN (
+            SELECT DISTINCT user_id FROM workout_session WHERE completed_at IS NOT NULL
+        )
+    """))
+    op.execute(sa.text("""
+        INSERT INTO workout_history_state (user_id, dirty_at)
+        SELECT DISTINCT user_id, CURRENT_TIMESTAMP
+        FROM workout_session
+        WHERE completed_at IS NOT NULL
+        AND user_id NOT IN (SELECT user_id FROM workout_history_state)
+    """))
+
+
+def downgrade():
+    op.drop_index("ix_workout_session_summary_user_completed", table_name="workout_session_summary")
+    op.drop_table("workout_session_summary")
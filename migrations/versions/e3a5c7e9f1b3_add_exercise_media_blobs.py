@@ -0,0 +1,29 @@
+"""add exercise media blobs
+
+Revision ID: e3a5c7e9f1b3
+Revises: d1f3b5c7e9a1
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "e3a5c7e9f1b3"
+down_revision = "d1f3b5c7e9a1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "exercise_media_blob",
+        sa.Column("name", sa.String(length=200), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade():
+    op.drop_table("exercise_media_blob")
@@ -0,0 +1,42 @@
+"""add workout week counts
+
+Revision ID: e8a0c2d4f6b7
+Revises: d7f9b1c3e5a6
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy_utils import UUIDType
+
+
+revision = "e8a0c2d4f6b7"
+down_revision = "d7f9b1c3e5a6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "workout_week_count",
+        sa.Column("user_id", UUIDType(binary=False), nullable=False),
+        sa.Column("week_start", sa.Date(), nullable=False),
+        sa.Column("completed_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "week_start"),
+    )
+    op.execute(sa.text("""
+        INSERT INTO workout_week_count (user_id, week_start, completed_count)
+        SELECT user_id, completed_week_start, COUNT(id)
+        FROM workout_session
+        WHERE completed_at IS NOT NULL
+        AND completed_week_start IS NOT NULL
+        AND EXISTS (
+            SELECT 1 FROM workout_session_exercise_completion
+            WHERE workout_session_exercise_completion.workout_session_id = workout_session.id
+        )
+        GROUP BY user_id, completed_week_start
+    """))
+
+
+def downgrade():
+    op.drop_table("workout_week_count")
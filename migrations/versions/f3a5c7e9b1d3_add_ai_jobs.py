@@ -0,0 +1,42 @@
+"""add ai jobs
+
+Revision ID: f3a5c7e9b1d3
+Revises: e8a0c2d4f6b7
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy_utils import UUIDType
+
+
+revision = "f3a5c7e9b1d3"
+down_revision = "e8a0c2d4f6b7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ai_job",
+        sa.Column("id", UUIDType(binary=False), nullable=False),
+        sa.Column("user_id", UUIDType(binary=False), nullable=False),
+        sa.Column("kind", sa.String(length=40), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("status_code", sa.Integer(), nullable=True),
+        sa.Column("result", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.CheckConstraint(
+            "status IN ('queued', 'running', 'succeeded', 'failed')",
+            name="ck_ai_job_status",
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_ai_job_user_created", "ai_job", ["user_id", "created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_ai_job_user_created", table_name="ai_job")
+    op.drop_table("ai_job")
@@ -40,14 +40,36 @@ class Config:
     GEMINI_DIET_VALIDATION_ATTEMPTS = int(
         os.getenv("GEMINI_DIET_VALIDATION_ATTEMPTS", "3")
     )
+    GEMINI_DIET_PARALLEL_DAYS = os.getenv("GEMINI_DIET_PARALLEL_DAYS", "false").lower() == "true"
+    GEMINI_DIET_DAY_WORKERS = int(os.getenv("GEMINI_DIET_DAY_WORKERS", "3"))
     GEMINI_TIMEOUT = int(os.getenv("GEMINI_TIMEOUT", "90"))
+    GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") or None
+    GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "false").lower() == "true"
+    GEMINI_CONTEXT_CACHE_TTL = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "1024"))
     WORKOUTX_API_KEY = os.getenv("WORKOUTX_API_KEY")
     WORKOUTX_TIMEOUT = int(os.getenv("WORKOUTX_TIMEOUT", "15"))
     WORKOUTX_MAX_RESPONSE_BYTES = int(
         os.getenv("WORKOUTX_MAX_RESPONSE_BYTES", str(15 * 1024 * 1024))
     )
     WORKOUTX_CACHE_DIR = BASE_DIR / "instance" / "workoutx-gifs"
+    WORKOUTX_NEGATIVE_CACHE_TTL = int(os.getenv("WORKOUTX_NEGATIVE_CACHE_TTL", "300"))
+    WORKOUTX_MEDIA_REVIEWS_TTL = int(os.getenv("WORKOUTX_MEDIA_REVIEWS_TTL", "60"))
+    WORKOUTX_CACHE_MAX_BYTES = int(os.getenv("WORKOUTX_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    WORKOUTX_DURABLE_STORE = os.getenv("WORKOUTX_DURABLE_STORE", "none")
+    WORKOUTX_DURABLE_DIR = os.getenv("WORKOUTX_DURABLE_DIR")
     WORKOUTX_MEDIA_MAPPING_PATH = BASE_DIR / "src" / "data" / "workoutx_media.json"
+    WORKOUT_HISTORY_JOBS = os.getenv("WORKOUT_HISTORY_JOBS", "thread")
+    AI_JOBS = os.getenv("AI_JOBS", "thread")
+    AI_JOB_WORKERS = int(os.getenv("AI_JOB_WORKERS", "2"))
+    AI_JOB_TIMEOUT = int(os.getenv("AI_JOB_TIMEOUT", "900"))
+    NUTRITION_CACHE_SIZE = int(os.getenv("NUTRITION_CACHE_SIZE", "2048"))
+    NUTRITION_CACHE_TTL = int(os.getenv("NUTRITION_CACHE_TTL", str(30 * 24 * 3600)))
+    NUTRITION_CACHE_SHARED = os.getenv("NUTRITION_CACHE_SHARED", "true").lower() == "true"
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+    RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+    DB_METRICS_HEADERS = os.getenv("DB_METRICS_HEADERS", "false").lower() == "true"
 
 
 class TestConfig(Config):
@@ -58,6 +80,8 @@ class TestConfig(Config):
     GEMINI_API_KEY = None
     WORKOUTX_API_KEY = None
     RATE_LIMITS = {"login": (100, 60), "register": (100, 60), "ai": (100, 60)}
+    WORKOUT_HISTORY_JOBS = "worker"
+    AI_JOBS = "inline"
 
 
 class ProductionConfig(Config):
@@ -546,6 +546,40 @@ class PersonalRecordEvent(db.Model):
     performed_set = db.relationship("WorkoutSetPerformance")
 
 
+class PersonalRecordBest(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint(
+            "user_id",
+            "exercise_key",
+            "metric_type",
+            "metric_key",
+            name="uq_pr_best_user_exercise_metric",
+        ),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(UUIDType(binary=False), db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    exercise_key = db.Column(db.String(80), nullable=False)
+    metric_type = db.Column(db.String(24), nullable=False)
+    metric_key = db.Column(db.String(80), nullable=False)
+    best_event_id = db.Column(
+        db.Integer,
+        db.ForeignKey("personal_record_event.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    best_value = db.Column(db.Numeric(14, 4), nullable=False)
+    latest_event_id = db.Column(
+        db.Integer,
+        db.ForeignKey("personal_record_event.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    latest_achieved_at = db.Column(db.DateTime, nullable=False)
+    latest_session_id = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    best_event = db.relationship("PersonalRecordEvent", foreign_keys=[best_event_id])
+    latest_event = db.relationship("PersonalRecordEvent", foreign_keys=[latest_event_id])
+
+
 class WorkoutWeeklyGoal(db.Model):
     __table_args__ = (
         db.UniqueConstraint("user_id", "effective_week_start", name="uq_weekly_goal_user_week"),
@@ -560,6 +594,16 @@ class WorkoutWeeklyGoal(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
 
+class WorkoutWeekCount(db.Model):
+    user_id = db.Column(
+        UUIDType(binary=False),
+        db.ForeignKey("user.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    week_start = db.Column(db.Date, primary_key=True)
+    completed_count = db.Column(db.Integer, default=0, nullable=False)
+
+
 class ExerciseGoal(db.Model):
     __table_args__ = (
         db.CheckConstraint("status IN ('active', 'achieved', 'cancelled')", name="ck_exercise_goal_status"),
@@ -609,6 +653,129 @@ class AchievementUnlock(db.Model):
     is_backfilled = db.Column(db.Boolean, default=False, nullable=False)
 
 
+class WorkoutSessionSummary(db.Model):
+    __table_args__ = (
+        db.Index(
+            "ix_workout_session_summary_user_completed",
+            "user_id",
+            "completed_at",
+            "workout_session_id",
+        ),
+    )
+    workout_session_id = db.Column(
+        db.Integer,
+        db.ForeignKey("workout_session.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    user_id = db.Column(UUIDType(binary=False), db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    completed_at = db.Column(db.DateTime, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class AchievementProgress(db.Model):
+    user_id = db.Column(
+        UUIDType(binary=False),
+        db.ForeignKey("user.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    session_count = db.Column(db.Integer, default=0, nullable=False)
+    highlighted_pr_count = db.Column(db.Integer, default=0, nullable=False)
+    streak_weeks = db.Column(db.Integer, default=0, nullable=False)
+    streak_week_start = db.Column(db.Date, nullable=True)
+    rebuilt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class WorkoutHistoryState(db.Model):
+    __table_args__ = (db.Index("ix_workout_history_state_dirty", "dirty_at"),)
+    user_id = db.Column(
+        UUIDType(binary=False),
+        db.ForeignKey("user.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    dirty_at = db.Column(db.DateTime, nullable=True)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+
+class AIJob(db.Model):
+    __table_args__ = (
+        db.CheckConstraint(
+            "status IN ('queued', 'running', 'succeeded', 'failed')",
+            name="ck_ai_job_status",
+        ),
+        db.Index("ix_ai_job_user_created", "user_id", "created_at"),
+    )
+    id = db.Column(UUIDType(binary=False), primary_key=True, default=uuid.uuid4)
+    user_id = db.Column(UUIDType(binary=False), db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    kind = db.Column(db.String(40), nullable=False)
+    status = db.Column(db.String(20), default="queued", nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "status_code": self.status_code,
+            "result": self.result,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class AIUsage(db.Model):
+    """Ledger of Gemini calls: one row per call, written when the request or job ends."""
+
+    __table_args__ = (db.Index("ix_ai_usage_created_at", "created_at"),)
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    feature = db.Column(db.String(40), nullable=False)
+    model = db.Column(db.String(80), nullable=False)
+    user_id = db.Column(UUIDType(binary=False), db.ForeignKey("user.id", ondelete="SET NULL"), nullable=True)
+    attempt = db.Column(db.Integer, nullable=False, default=1)
+    latency_ms = db.Column(db.Float, nullable=False)
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)
+    cached_tokens = db.Column(db.Integer, nullable=False, default=0)
+    output_tokens = db.Column(db.Integer, nullable=False, default=0)
+    finish_reason = db.Column(db.String(40), nullable=True)
+    outcome = db.Column(db.String(20), nullable=False)
+
+
+class RateLimitBucket(db.Model):
+    """Token bucket of one rate limit key for the ``sql`` rate limit backend."""
+
+    __table_args__ = (db.Index("ix_rate_limit_bucket_updated_at", "updated_at"),)
+    key = db.Column(db.String(255), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)
+
+
+class NutritionEstimate(db.Model):
+    """Shared tier of the AI nutrition cache, keyed by ``nutrition_cache_key``."""
+
+    __table_args__ = (db.Index("ix_nutrition_estimate_expires_at", "expires_at"),)
+    key = db.Column(db.String(64), primary_key=True)
+    macros = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class ExerciseAlias(db.Model):
+    """Exercise name (normalized) resolved to a catalog key outside the static catalog aliases."""
+
+    name = db.Column(db.String(160), primary_key=True)
+    catalog_key = db.Column(db.String(80), nullable=False)
+    source = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
 class ExerciseMediaReview(db.Model):
     catalog_key = db.Column(db.String(80), primary_key=True)
     provider_id = db.Column(db.String(32), nullable=False)
@@ -617,6 +784,15 @@ class ExerciseMediaReview(db.Model):
     status = db.Column(db.String(20), nullable=False, default="approved")
     reviewed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
+
+class ExerciseMediaBlob(db.Model):
+    """Cached GIF bytes kept in the database, so a fresh disk is refilled without WorkoutX."""
+
+    name = db.Column(db.String(200), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
 class DietPlan(db.Model):
     __table_args__ = (
         db.CheckConstraint("status IN ('draft', 'published', 'archived')", name="ck_diet_plan_status"),
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from functools import wraps
 
 from flask import Blueprint, abort, current_app, g, jsonify
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
 
@@ -20,6 +21,7 @@ from src.models.user import (
     db,
 )
 from src.routes.user_routes import json_body, login_required, page_query
+from src.services.ai_jobs import ai_job_response
 from src.services.ai import (
     AIQuotaExceededError,
     AIResponseError,
@@ -27,6 +29,8 @@ from src.services.ai import (
     generate_diet_day,
     generate_diet_plan,
     generate_workout_plan,
+    repair_diet_plan,
+    repair_workout_plan,
 )
 from src.services.diet_plans import (
     calculate_nutrition_targets,
@@ -47,6 +51,8 @@ from src.services.plan_management import (
     update_diet_draft,
     update_workout_draft,
 )
+from src.services.diet_days import generate_diet_days
+from src.services.plan_repair import build_plan
 from src.services.rate_limit import rate_limit
 from src.services.workout_plans import (
     PlanValidationError,
@@ -122,6 +128,15 @@ def _student_context(student_id, lock=False):
     return student, relationship
 
 
+def _job_context(student_id, actor_id, relationship_id):
+    """Reload the rows a generation job needs inside the job's own session."""
+    return (
+        db.session.get(User, student_id),
+        db.session.get(User, actor_id),
+        db.session.get(ProfessionalStudentRelationship, relationship_id),
+    )
+
+
 def _workout_plan_for(student, plan_id, editable=False):
     plan = WorkoutPlan.query.filter_by(id=plan_id, user_id=student.id).options(
         selectinload(WorkoutPlan.days).selectinload(WorkoutDay.exercises),
@@ -272,32 +287,73 @@ def list_students():
         status="active",
     ).order_by(ProfessionalStudentRelationship.accepted_at.desc())
     query, limit, offset = page_query(query, default_limit=30)
-    relationships = query.all()
+    relationships = query.options(
+        selectinload(ProfessionalStudentRelationship.student).selectinload(User.profile),
+        selectinload(ProfessionalStudentRelationship.professional),
+    ).all()
     return jsonify({
-        "items": [_student_summary(item.student, item) for item in relationships],
+        "items": _student_summaries([(item.student, item) for item in relationships]),
         "limit": limit,
         "offset": offset,
     }), 200
 
 
+def _latest_by_user(model, criteria, order_by, options=()):
+    """Return the first row per user under ``order_by`` in one ranked query."""
+    position = func.row_number().over(partition_by=model.user_id, order_by=order_by)
+    ranked = db.session.query(model.id.label("id"), position.label("position")).filter(
+        *criteria
+    ).subquery()
+    rows = (
+        model.query.join(ranked, ranked.c.id == model.id)
+        .filter(ranked.c.position == 1)
+        .options(*options)
+        .all()
+    )
+    return {row.user_id: row for row in rows}
+
+
+def _student_summaries(pairs):
+    student_ids = [student.id for student, _ in pairs]
+    if not student_ids:
+        return []
+    measurements = _latest_by_user(
+        Measurement,
+        [Measurement.user_id.in_(student_ids)],
+        [Measurement.date.desc(), Measurement.id.desc()],
+    )
+    workouts = _latest_by_user(
+        WorkoutPlan,
+        [WorkoutPlan.user_id.in_(student_ids), WorkoutPlan.status == "published"],
+        [WorkoutPlan.published_at.desc(), WorkoutPlan.created_at.desc(), WorkoutPlan.id.desc()],
+        (selectinload(WorkoutPlan.days), selectinload(WorkoutPlan.exercises)),
+    )
+    diets = _latest_by_user(
+        DietPlan,
+        [DietPlan.user_id.in_(student_ids), DietPlan.status == "published"],
+        [DietPlan.published_at.desc(), DietPlan.created_at.desc(), DietPlan.id.desc()],
+        (selectinload(DietPlan.meals),),
+    )
+    summaries = []
+    for student, relationship in pairs:
+        latest_measurement = measurements.get(student.id)
+        latest_workout = workouts.get(student.id)
+        latest_diet = diets.get(student.id)
+        summaries.append({
+            "id": student.id,
+            "username": student.username,
+            "has_profile": student.profile is not None,
+            "profile": student.profile.to_dict() if student.profile else None,
+            "latest_measurement": latest_measurement.to_dict() if latest_measurement else None,
+            "latest_workout_plan": latest_workout.to_dict() if latest_workout else None,
+            "latest_diet_plan": latest_diet.to_dict() if latest_diet else None,
+            "relationship": relationship.to_dict(),
+        })
+    return summaries
+
+
 def _student_summary(student, relationship):
-    latest_measurement = Measurement.query.filter_by(user_id=student.id).order_by(Measurement.date.desc()).first()
-    latest_workout = WorkoutPlan.query.filter_by(user_id=student.id, status="published").order_by(
-        WorkoutPlan.published_at.desc(), WorkoutPlan.created_at.desc()
-    ).first()
-    latest_diet = DietPlan.query.filter_by(user_id=student.id, status="published").order_by(
-        DietPlan.published_at.desc(), DietPlan.created_at.desc()
-    ).first()
-    return {
-        "id": student.id,
-        "username": student.username,
-        "has_profile": student.profile is not None,
-        "profile": student.profile.to_dict() if student.profile else None,
-        "latest_measurement": latest_measurement.to_dict() if latest_measurement else None,
-        "latest_workout_plan": latest_workout.to_dict() if latest_workout else None,
-        "latest_diet_plan": latest_diet.to_dict() if latest_diet else None,
-        "relationship": relationship.to_dict(),
-    }
+    return _student_summaries([(student, relationship)])[0]
 
 
 @professional_bp.route("/professional/students/<uuid:student_id>", methods=["GET"])
@@ -438,34 +494,43 @@ def generate_professional_workout(student_id):
         questionnaire = validate_workout_questionnaire(json_body())
     except PlanValidationError as error:
         return jsonify({"error": "Revise as preferências do treino.", "fields": error.errors}), 400
-    profile = UserProfile.query.filter_by(user_id=student.id).first()
-    for attempt in range(1, 4):
+    actor_id, relationship_id = g.user.id, relationship.id
+
+    def work():
+        student, actor, relationship = _job_context(student_id, actor_id, relationship_id)
+        profile = UserProfile.query.filter_by(user_id=student.id).first()
         try:
-            plan_data = normalize_workout_output(generate_workout_plan(questionnaire, profile), questionnaire)
-            break
+            plan_data = build_plan(
+                "workout",
+                lambda draft, error: generate_workout_plan(questionnaire, profile),
+                lambda draft, days, errors: repair_workout_plan(questionnaire, profile, draft, days, errors),
+                lambda draft: normalize_workout_output(draft, questionnaire),
+                3,
+            )
         except (PlanValidationError, AIResponseError):
-            if attempt == 3:
-                return jsonify({"error": "O treino gerado ficou incompleto. Tente novamente."}), 502
+            return {"error": "O treino gerado ficou incompleto. Tente novamente."}, 502
         except AIQuotaExceededError as error:
-            return jsonify({"error": str(error)}), 429
+            return {"error": str(error)}, 429
         except AIServiceError:
             current_app.logger.exception("Professional workout generation failed")
-            return jsonify({"error": "A IA não conseguiu gerar o treino agora."}), 503
-    try:
-        plan = create_workout_plan(
-            student,
-            g.user,
-            questionnaire,
-            plan_data,
-            status="draft",
-            source="ai",
-            relationship=relationship,
-        )
-        db.session.commit()
-    except (IntegrityError, TypeError, ValueError):
-        db.session.rollback()
-        return jsonify({"error": "Não foi possível salvar o treino gerado."}), 422
-    return jsonify({"message": "Treino gerado como rascunho.", "plan": plan.to_dict_full()}), 201
+            return {"error": "A IA não conseguiu gerar o treino agora."}, 503
+        try:
+            plan = create_workout_plan(
+                student,
+                actor,
+                questionnaire,
+                plan_data,
+                status="draft",
+                source="ai",
+                relationship=relationship,
+            )
+            db.session.commit()
+        except (IntegrityError, TypeError, ValueError):
+            db.session.rollback()
+            return {"error": "Não foi possível salvar o treino gerado."}, 422
+        return {"message": "Treino gerado como rascunho.", "plan": plan.to_dict_full()}, 201
+
+    return ai_job_response("professional_workout_plan", actor_id, work)
 
 
 @professional_bp.route("/professional/students/<uuid:student_id>/workout-plans/<int:plan_id>", methods=["PUT"])
@@ -578,42 +643,54 @@ def generate_professional_diet(student_id):
         questionnaire, profile, targets = _validated_diet_context(student, json_body())
     except PlanValidationError as error:
         return jsonify({"error": "Revise o perfil e as preferências alimentares.", "fields": error.errors}), 400
-    correction = None
-    max_attempts = current_app.config["GEMINI_DIET_VALIDATION_ATTEMPTS"]
-    for attempt in range(1, max_attempts + 1):
+    actor_id, relationship_id = g.user.id, relationship.id
+
+    def work():
+        student, actor, relationship = _job_context(student_id, actor_id, relationship_id)
+        profile = UserProfile.query.filter_by(user_id=student.id).first()
+
+        def generate(draft, error):
+            if current_app.config["GEMINI_DIET_PARALLEL_DAYS"]:
+                return generate_diet_days(questionnaire, profile, targets, generate_diet_day)
+            correction = correction_feedback(error, draft, targets) if error else None
+            return generate_diet_plan(questionnaire, profile, targets, correction)
+
         try:
-            generated = generate_diet_plan(questionnaire, profile, targets, correction)
-            plan_data = normalize_diet_output(generated, questionnaire, targets)
-            break
-        except PlanValidationError as error:
-            if attempt == max_attempts:
-                return jsonify({"error": "A dieta não atingiu as metas nutricionais."}), 502
-            correction = correction_feedback(error, generated, targets)
+            plan_data = build_plan(
+                "diet",
+                generate,
+                lambda draft, days, errors: repair_diet_plan(questionnaire, profile, targets, draft, days, errors),
+                lambda draft: normalize_diet_output(draft, questionnaire, targets),
+                current_app.config["GEMINI_DIET_VALIDATION_ATTEMPTS"],
+            )
+        except PlanValidationError:
+            return {"error": "A dieta não atingiu as metas nutricionais."}, 502
         except AIResponseError:
-            if attempt == max_attempts:
-                return jsonify({"error": "A dieta gerada ficou incompleta."}), 502
+            return {"error": "A dieta gerada ficou incompleta."}, 502
         except AIQuotaExceededError as error:
-            return jsonify({"error": str(error)}), 429
+            return {"error": str(error)}, 429
         except AIServiceError:
             current_app.logger.exception("Professional diet generation failed")
-            return jsonify({"error": "A IA não conseguiu gerar a dieta agora."}), 503
-    try:
-        plan = create_diet_plan(
-            student,
-            g.user,
-            questionnaire,
-            targets,
-            plan_data,
-            profile_snapshot(profile),
-            status="draft",
-            source="ai",
-            relationship=relationship,
-        )
-        db.session.commit()
-    except (IntegrityError, TypeError, ValueError):
-        db.session.rollback()
-        return jsonify({"error": "Não foi possível salvar a dieta gerada."}), 422
-    return jsonify({"message": "Dieta gerada como rascunho.", "plan": plan.to_dict_full()}), 201
+            return {"error": "A IA não conseguiu gerar a dieta agora."}, 503
+        try:
+            plan = create_diet_plan(
+                student,
+                actor,
+                questionnaire,
+                targets,
+                plan_data,
+                profile_snapshot(profile),
+                status="draft",
+                source="ai",
+                relationship=relationship,
+            )
+            db.session.commit()
+        except (IntegrityError, TypeError, ValueError):
+            db.session.rollback()
+            return {"error": "Não foi possível salvar a dieta gerada."}, 422
+        return {"message": "Dieta gerada como rascunho.", "plan": plan.to_dict_full()}, 201
+
+    return ai_job_response("professional_diet_plan", actor_id, work)
 
 
 @professional_bp.route("/professional/students/<uuid:student_id>/diet-plans/<int:plan_id>", methods=["PUT"])
@@ -656,28 +733,33 @@ def suggest_professional_diet_day(student_id, plan_id):
         {"meal_type": meal.meal_type, "items": meal.items or [], "description": meal.description}
         for meal in plan.meals if meal.day_of_week == f"Dia {day_index}"
     ]
-    profile = UserProfile.query.filter_by(user_id=student.id).first()
-    correction = None
-    max_attempts = current_app.config["GEMINI_DIET_VALIDATION_ATTEMPTS"]
-    for attempt in range(1, max_attempts + 1):
-        try:
-            generated = generate_diet_day(
-                questionnaire, profile, existing_meals, feedback, targets, correction
-            )
-            day_data = normalize_diet_day(generated, questionnaire, targets)
-            break
-        except PlanValidationError as error:
-            if attempt == max_attempts:
-                return jsonify({"error": "A sugestão não atingiu as metas nutricionais."}), 502
-            correction = correction_feedback(error, generated, targets)
-        except AIResponseError:
-            if attempt == max_attempts:
-                return jsonify({"error": "A sugestão ficou incompleta."}), 502
-        except AIQuotaExceededError as error:
-            return jsonify({"error": str(error)}), 429
-        except AIServiceError:
-            return jsonify({"error": "A IA não conseguiu sugerir mudanças agora."}), 503
-    return jsonify({"day": day_index, "meals": day_data["meals"]}), 200
+    actor_id = g.user.id
+
+    def work():
+        profile = UserProfile.query.filter_by(user_id=student_id).first()
+        correction = None
+        max_attempts = current_app.config["GEMINI_DIET_VALIDATION_ATTEMPTS"]
+        for attempt in range(1, max_attempts + 1):
+            try:
+                generated = generate_diet_day(
+                    questionnaire, profile, existing_meals, feedback, targets, correction
+                )
+                day_data = normalize_diet_day(generated, questionnaire, targets)
+                break
+            except PlanValidationError as error:
+                if attempt == max_attempts:
+                    return {"error": "A sugestão não atingiu as metas nutricionais."}, 502
+                correction = correction_feedback(error, generated, targets)
+            except AIResponseError:
+                if attempt == max_attempts:
+                    return {"error": "A sugestão ficou incompleta."}, 502
+            except AIQuotaExceededError as error:
+                return {"error": str(error)}, 429
+            except AIServiceError:
+                return {"error": "A IA não conseguiu sugerir mudanças agora."}, 503
+        return {"day": day_index, "meals": day_data["meals"]}, 200
+
+    return ai_job_response("professional_diet_day", actor_id, work)
 
 
 @professional_bp.route("/professional/students/<uuid:student_id>/diet-plans/<int:plan_id>/days/<int:day_index>", methods=["PUT"])
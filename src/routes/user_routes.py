@@ -1,5 +1,6 @@
-from flask import Blueprint, jsonify, request, session, abort, g, current_app, send_file
+from flask import Blueprint, jsonify, request, session, abort, g, current_app, send_file, stream_with_context
 from src.models.user import (
+    AIJob,
     AchievementUnlock,
     ChatMessage,
     DietEntry,
@@ -19,7 +20,6 @@ from src.models.user import (
     WorkoutSessionExerciseCompletion,
     WorkoutSessionExerciseOverride,
     WorkoutSetPerformance,
-    WorkoutWeeklyGoal,
     db,
 )
 from src.services.ai import (
@@ -27,12 +27,16 @@ from src.services.ai import (
     AIResponseError,
     AIServiceError,
     AIServiceUnavailableError,
+    cached_nutrition,
     calculate_nutrition,
     classify_exercise_catalog_key,
     generate_diet_day,
     generate_diet_plan,
     generate_response,
     generate_workout_plan,
+    repair_diet_plan,
+    repair_workout_plan,
+    stream_response,
 )
 from src.services.diet_plans import (
     calculate_nutrition_targets,
@@ -43,8 +47,31 @@ from src.services.diet_plans import (
     profile_snapshot,
     validate_diet_questionnaire,
 )
-from src.services.rate_limit import rate_limit
-from src.services.achievements import ACHIEVEMENTS, evaluate_achievements, serialize_unlock
+from src.services.rate_limit import check_rate_limit, rate_limit
+from src.services.ai_jobs import ai_job_response, expire_stale_job
+from src.services.ai_usage import ai_usage_summary
+from src.services.db_metrics import metrics_snapshot
+from src.services.food_lookup import combine_nutrition, local_nutrition
+from src.services.gemini_client import connection_metrics
+from src.services.nutrition_cache import nutrition_cache_stats
+from src.services.diet_days import generate_diet_days
+from src.services.exercise_aliases import remember_exercise_alias, resolve_exercise_name
+from src.services.plan_management import create_diet_plan, create_workout_plan
+from src.services.plan_repair import build_plan, plan_repair_stats
+from src.services.prompt_context import prompt_stats
+from src.services.history_jobs import mark_history_dirty, schedule_history_backfill
+from src.services.activities import (
+    activity_list_items,
+    session_summary,
+    store_session_summary,
+)
+from src.services.achievements import (
+    ACHIEVEMENTS,
+    ensure_achievement_progress,
+    evaluate_achievements,
+    record_finished_session,
+    serialize_unlock,
+)
 from src.services.personal_records import (
     current_max_load,
     ensure_personal_record_history,
@@ -52,6 +79,7 @@ from src.services.personal_records import (
     process_session_personal_records,
     serialize_personal_record,
 )
+from src.services.user_context import invalidate_user_context, start_user_context, user_context
 from src.services.workout_progress import (
     backfill_session_weeks,
     complete_exercise_goal,
@@ -61,7 +89,6 @@ from src.services.workout_progress import (
     serialize_exercise_goal,
     serialize_weekly_goal,
     snapshot_session_week,
-    suggested_days_per_week,
     validate_timezone,
     week_start_for,
     weekly_progress,
@@ -72,7 +99,10 @@ from src.services.workoutx import (
     WorkoutXServiceError,
     get_cached_gif,
     get_exercise,
+    gif_cache_stats,
     approved_media,
+    approved_media_many,
+    invalidate_media,
     search_exercises,
 )
 from src.services.workout_plans import (
@@ -85,16 +115,19 @@ from src.services.workout_plans import (
     validate_workout_questionnaire,
 )
 import base64
+import binascii
+import json
 import math
 import uuid
 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from decimal import Decimal, InvalidOperation
 from functools import wraps
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func
+from sqlalchemy import Date, DateTime, func, tuple_
 from sqlalchemy.orm import joinedload, selectinload
 import unicodedata
+from urllib.parse import quote
 
 # Decorador para exigir login
 def login_required(f):
@@ -114,6 +147,7 @@ def login_required(f):
         if g.user.is_banned:
             session.clear()
             return jsonify({"error": "Sua conta foi banida."}), 403
+        start_user_context(g.user)
             
         return f(*args, **kwargs)
     return decorated_function
@@ -173,6 +207,69 @@ def page_query(query, default_limit=100):
     return query.limit(limit).offset(offset), limit, offset
 
 
+def _cursor_value(column, value):
+    if isinstance(column.type, (Date, DateTime)):
+        return value.isoformat()
+    return value
+
+
+def _parse_cursor_value(column, value):
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value)
+    return int(value)
+
+
+def encode_cursor(keys, values):
+    payload = json.dumps([_cursor_value(column, value) for column, value in zip(keys, values)])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(keys, token):
+    try:
+        payload = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(payload)
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError
+        return [_parse_cursor_value(column, value) for column, value in zip(keys, values)]
+    except (binascii.Error, TypeError, ValueError):
+        abort(400, description="Cursor de paginação inválido")
+
+
+def cursor_requested():
+    return "cursor" in request.args
+
+
+def keyset_query(query, keys, descending=True, default_limit=100, max_limit=100):
+    """Order ``query`` by ``keys`` (ending in a unique column) and resume after ``cursor``.
+
+    Seeks past the last row seen instead of using OFFSET, so deep pages stay on the
+    index and rows inserted meanwhile do not shift the pages.
+    """
+    try:
+        limit = min(max(int(request.args.get("limit", default_limit)), 1), max_limit)
+    except ValueError:
+        abort(400, description="Paginação inválida")
+    token = request.args.get("cursor")
+    if token:
+        position = tuple_(*keys)
+        values = tuple_(*decode_cursor(keys, token))
+        query = query.filter(position < values if descending else position > values)
+    ordering = [key.desc() if descending else key.asc() for key in keys]
+    return query.order_by(*ordering), limit
+
+
+def keyset_page(query, keys, descending=True, default_limit=100):
+    query, limit = keyset_query(query, keys, descending, default_limit)
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(keys, [getattr(last, key.key) for key in keys])
+    return rows[:limit], next_cursor
+
+
 def _text_or_none(value):
     text = str(value or "").strip()
     return text or None
@@ -299,7 +396,7 @@ def check_session():
 @login_required
 def get_profile():
     user = g.user
-    profile = UserProfile.query.filter_by(user_id=user.id).first()
+    profile = user_context(user.id).profile
     if profile:
         return jsonify({"profile": profile.to_dict()}), 200
     return jsonify({"profile": None}), 200
@@ -331,7 +428,7 @@ def update_profile():
         except ValueError:
             return jsonify({"error": "Timezone inválido"}), 400
 
-    profile = UserProfile.query.filter_by(user_id=user.id).first()
+    profile = user_context(user.id).profile
     if not profile:
         profile = UserProfile(user_id=user.id)
         db.session.add(profile)
@@ -344,8 +441,10 @@ def update_profile():
     profile.weight = data.get("weight", profile.weight)
     profile.height = data.get("height", profile.height)
     profile.timezone = data.get("timezone", profile.timezone)
+    invalidate_user_context(user.id, "profile")
     if "timezone" in data and profile.timezone:
         backfill_session_weeks(user.id, profile.timezone)
+        mark_history_dirty(user.id)
     
     db.session.commit()
     return jsonify({"message": "Perfil atualizado com sucesso", "profile": profile.to_dict()}), 200
@@ -411,6 +510,12 @@ def get_diet_entries():
         except ValueError:
             return jsonify({"error": "Formato de data final inválido"}), 400
             
+    if cursor_requested():
+        entries, next_cursor = keyset_page(query, (DietEntry.date, DietEntry.id))
+        return jsonify({
+            "items": [entry.to_dict() for entry in entries],
+            "next_cursor": next_cursor,
+        }), 200
     entries, _, _ = page_query(query.order_by(DietEntry.date.desc(), DietEntry.created_at.desc()))
     entries = entries.all()
     return jsonify([entry.to_dict() for entry in entries]), 200
@@ -455,7 +560,6 @@ def delete_diet_entry(entry_id):
     return jsonify({"message": "Registro de dieta excluído"}), 200
 
 @user_bp.route("/diet/ai_macros", methods=["POST"])
-@rate_limit("ai", 8, 60)
 @login_required
 def get_ai_macros():
     data = json_body()
@@ -481,8 +585,22 @@ def get_ai_macros():
     if not description and not image_bytes:
         return jsonify({"error": "Descreva o alimento ou envie uma foto"}), 400
 
+    # Quantified foods from the local table need no AI; a photo always goes to the AI.
+    local, remainder = (None, description) if image_bytes else local_nutrition(description)
+    if local is not None and not remainder:
+        return jsonify({**local, "source": "local"}), 200
+
+    # Repeated foods are answered from the cache without spending the AI rate limit.
+    estimate = cached_nutrition(remainder, image_bytes, mime_type)
+    if estimate is not None:
+        return jsonify(combine_nutrition(local, estimate)), 200
+    limited = check_rate_limit("ai", 8, 60)
+    if limited is not None:
+        return limited
+
     try:
-        return jsonify(calculate_nutrition(description, image_bytes, mime_type)), 200
+        estimate = calculate_nutrition(remainder, image_bytes, mime_type)
+        return jsonify(combine_nutrition(local, estimate)), 200
     except AIResponseError:
         current_app.logger.warning("Gemini returned invalid nutrition JSON")
         return jsonify({"error": "A IA retornou macros incompletos. Tente novamente."}), 422
@@ -494,6 +612,24 @@ def get_ai_macros():
         return jsonify({"error": "Não foi possível calcular macros no momento"}), 503
 
 
+@user_bp.route("/exercise-media", methods=["GET"])
+@login_required
+def get_exercise_media_batch():
+    keys = list(dict.fromkeys(key.strip() for key in request.args.get("keys", "").split(",") if key.strip()))
+    if not 1 <= len(keys) <= 50:
+        return jsonify({"error": "Informe entre 1 e 50 exercícios em keys."}), 400
+    items = []
+    for catalog_key, media in approved_media_many(keys).items():
+        items.append({
+            "catalog_key": catalog_key,
+            "available": media is not None,
+            "provider_name": media.get("provider_name") if media else None,
+            "provider_equipment": media.get("provider_equipment") if media else None,
+            "url": f"/api/exercise-media/{quote(catalog_key)}" if media else None,
+        })
+    return jsonify({"items": items}), 200
+
+
 @user_bp.route("/exercise-media/<catalog_key>", methods=["GET"])
 @login_required
 def get_exercise_media(catalog_key):
@@ -561,6 +697,12 @@ def get_measurements():
         except ValueError:
             return jsonify({"error": "Formato de data final inválido"}), 400
             
+    if cursor_requested():
+        measurements, next_cursor = keyset_page(query, (Measurement.date, Measurement.id))
+        return jsonify({
+            "items": [m.to_dict() for m in measurements],
+            "next_cursor": next_cursor,
+        }), 200
     measurements, _, _ = page_query(query.order_by(Measurement.date.desc(), Measurement.created_at.desc()))
     measurements = measurements.all()
     return jsonify([m.to_dict() for m in measurements]), 200
@@ -620,12 +762,39 @@ def get_stats():
     }), 200
 
 # --- Rotas de Chat ---
+PLAN_INTENT_REPLIES = {
+    "diet_plan": (
+        "Vamos personalizar sua dieta. Responda ao questionário rápido para eu montar três dias rotativos.",
+        {"type": "open_diet_plan_questionnaire"},
+    ),
+    "workout_plan": (
+        "Vamos montar seu treino. Informe sua frequência, experiência e equipamentos no questionário rápido.",
+        {"type": "open_workout_questionnaire"},
+    ),
+}
+
+
+def chat_ai_error(error):
+    if isinstance(error, AIResponseError):
+        current_app.logger.warning("Chat AI response was unusable: %s", error)
+        return jsonify({"error": str(error)}), 422
+    if isinstance(error, AIQuotaExceededError):
+        current_app.logger.warning("Chat AI quota exceeded: %s", error)
+        return jsonify({"error": str(error)}), 429
+    current_app.logger.error("Chat AI request failed", exc_info=error)
+    return jsonify({"error": "A IA está indisponível no momento"}), 503
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
 @user_bp.route("/chat", methods=["POST"])
 @rate_limit("ai", 8, 60)
 @premium_required
 def chat():
     user = g.user 
-    profile = UserProfile.query.filter_by(user_id=user.id).first()
+    profile = user_context(user.id).profile
     data = json_body()
     message = str(data.get("message", "")).strip()
 
@@ -634,25 +803,14 @@ def chat():
     try:
         plan_intent = chat_plan_intent(data, message)
         action = None
-        if plan_intent == "diet_plan":
-            response_text = "Vamos personalizar sua dieta. Responda ao questionário rápido para eu montar três dias rotativos."
-            action = {"type": "open_diet_plan_questionnaire"}
-        elif plan_intent == "workout_plan":
-            response_text = "Vamos montar seu treino. Informe sua frequência, experiência e equipamentos no questionário rápido."
-            action = {"type": "open_workout_questionnaire"}
+        if plan_intent:
+            response_text, action = PLAN_INTENT_REPLIES[plan_intent]
         else:
             response_text = generate_response(message, user, profile)
         db.session.add(ChatMessage(user_id=user.id, message=message, response=response_text))
         db.session.commit()
-    except AIResponseError as error:
-        current_app.logger.warning("Chat AI response was unusable: %s", error)
-        return jsonify({"error": str(error)}), 422
-    except AIQuotaExceededError as error:
-        current_app.logger.warning("Chat AI quota exceeded: %s", error)
-        return jsonify({"error": str(error)}), 429
-    except AIServiceError:
-        current_app.logger.exception("Chat AI request failed")
-        return jsonify({"error": "A IA está indisponível no momento"}), 503
+    except AIServiceError as error:
+        return chat_ai_error(error)
     except (IntegrityError, TypeError, ValueError):
         db.session.rollback()
         current_app.logger.exception("Unable to persist AI response")
@@ -663,10 +821,95 @@ def chat():
         "action": action,
     }), 200
 
+@user_bp.route("/chat/stream", methods=["POST"])
+@rate_limit("ai", 8, 60)
+@premium_required
+def chat_stream():
+    """Same contract as ``/chat`` but sent as Server-Sent Events.
+
+    Emits ``delta`` events with text as Gemini produces it, then ``done`` with the
+    full response once it is saved (or ``error`` if the stream breaks midway).
+    Errors before the first token are plain JSON responses, as in ``/chat``.
+    """
+    user = g.user
+    data = json_body()
+    message = str(data.get("message", "")).strip()
+
+    if not message or len(message) > 2_000:
+        return jsonify({"error": "Mensagem vazia"}), 400
+    plan_intent = chat_plan_intent(data, message)
+    action, stream = None, None
+    if plan_intent:
+        response_text, action = PLAN_INTENT_REPLIES[plan_intent]
+        chunks = iter((response_text,))
+    else:
+        stream = stream_response(message, user, user_context(user.id).profile)
+        chunks = iter(stream)
+    try:
+        first = next(chunks, "")
+    except AIServiceError as error:
+        return chat_ai_error(error)
+    user_id = user.id
+
+    @stream_with_context
+    def events():
+        parts = [first]
+        if first:
+            yield sse_event("delta", {"text": first})
+        try:
+            for text in chunks:
+                parts.append(text)
+                yield sse_event("delta", {"text": text})
+        except AIServiceError:
+            current_app.logger.exception("Chat AI stream failed")
+            yield sse_event("error", {"error": "A resposta foi interrompida. Tente novamente."})
+            return
+        finally:
+            # On a client disconnect, close the Gemini stream while the request context
+            # is still here, so its usage is recorded as "cancelled".
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+        response_text = "".join(parts).strip()
+        if not response_text:
+            yield sse_event("error", {"error": "Gemini returned an empty response"})
+            return
+        chat_message = ChatMessage(user_id=user_id, message=message, response=response_text)
+        try:
+            db.session.add(chat_message)
+            db.session.commit()
+        except (IntegrityError, TypeError, ValueError):
+            db.session.rollback()
+            current_app.logger.exception("Unable to persist AI response")
+            yield sse_event("error", {"error": "Não foi possível salvar o resultado gerado"})
+            return
+        yield sse_event("done", {
+            "response": response_text,
+            "action": action,
+            "truncated": bool(stream and stream.truncated),
+            "message": chat_message.to_dict(),
+        })
+
+    return current_app.response_class(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @user_bp.route("/chat/history", methods=["GET"])
 @premium_required
 def chat_history():
     user = g.user
+    if cursor_requested():
+        messages, next_cursor = keyset_page(
+            ChatMessage.query.filter_by(user_id=user.id),
+            (ChatMessage.created_at, ChatMessage.id),
+            descending=False,
+        )
+        return jsonify({
+            "items": [msg.to_dict() for msg in messages],
+            "next_cursor": next_cursor,
+        }), 200
     messages, _, _ = page_query(ChatMessage.query.filter_by(user_id=user.id).order_by(ChatMessage.created_at.asc()))
     messages = messages.all()
     return jsonify([msg.to_dict() for msg in messages]), 200
@@ -681,83 +924,64 @@ def create_guided_diet_plan():
         questionnaire = validate_diet_questionnaire(json_body())
     except PlanValidationError as error:
         return jsonify({"error": "Revise as preferências da dieta.", "fields": error.errors}), 400
-    profile = UserProfile.query.filter_by(user_id=user.id).first()
+    profile = user_context(user.id).profile
     try:
         questionnaire = merge_profile_restrictions(questionnaire, profile)
         nutrition_targets = calculate_nutrition_targets(profile, questionnaire)
     except PlanValidationError as error:
         return jsonify({"error": "Revise seu perfil e as metas nutricionais.", "fields": error.errors}), 400
 
-    correction = None
-    max_attempts = current_app.config["GEMINI_DIET_VALIDATION_ATTEMPTS"]
-    for attempt in range(1, max_attempts + 1):
+    user_id = user.id
+
+    def work():
+        profile = user_context(user_id).profile
+
+        def generate(draft, error):
+            if current_app.config["GEMINI_DIET_PARALLEL_DAYS"]:
+                return generate_diet_days(questionnaire, profile, nutrition_targets, generate_diet_day)
+            correction = correction_feedback(error, draft, nutrition_targets) if error else None
+            return generate_diet_plan(questionnaire, profile, nutrition_targets, correction)
+
         try:
-            generated = generate_diet_plan(questionnaire, profile, nutrition_targets, correction)
-            plan_data = normalize_diet_output(generated, questionnaire, nutrition_targets)
-            break
-        except PlanValidationError as error:
-            current_app.logger.warning(
-                "Invalid generated diet plan (attempt %s/%s): %s",
-                attempt,
-                max_attempts,
-                list(error.errors)[:8],
+            plan_data = build_plan(
+                "diet",
+                generate,
+                lambda draft, days, errors: repair_diet_plan(
+                    questionnaire, profile, nutrition_targets, draft, days, errors
+                ),
+                lambda draft: normalize_diet_output(draft, questionnaire, nutrition_targets),
+                current_app.config["GEMINI_DIET_VALIDATION_ATTEMPTS"],
             )
-            if attempt == max_attempts:
-                return jsonify({"error": "A dieta não atingiu as metas nutricionais. Tente novamente."}), 502
-            correction = correction_feedback(error, generated, nutrition_targets)
+        except PlanValidationError:
+            return {"error": "A dieta não atingiu as metas nutricionais. Tente novamente."}, 502
         except AIResponseError:
-            current_app.logger.warning("Diet plan AI returned invalid output (attempt %s/%s)", attempt, max_attempts)
-            if attempt == max_attempts:
-                return jsonify({"error": "A dieta gerada ficou incompleta. Tente novamente."}), 502
+            return {"error": "A dieta gerada ficou incompleta. Tente novamente."}, 502
         except AIQuotaExceededError as error:
-            return jsonify({"error": str(error)}), 429
+            return {"error": str(error)}, 429
         except AIServiceUnavailableError:
             current_app.logger.warning("Diet plan generation unavailable after retries")
-            return jsonify({"error": "A IA está com alta demanda. Tente gerar sua dieta novamente em alguns instantes."}), 503
+            return {"error": "A IA está com alta demanda. Tente gerar sua dieta novamente em alguns instantes."}, 503
         except AIServiceError:
             current_app.logger.exception("Diet plan generation failed")
-            return jsonify({"error": "A IA não conseguiu gerar a dieta agora."}), 503
+            return {"error": "A IA não conseguiu gerar a dieta agora."}, 503
 
-    try:
-        plan = DietPlan(
-            user_id=user.id,
-            author_user_id=user.id,
-            published_by_user_id=user.id,
-            status="published",
-            source="ai",
-            published_at=datetime.utcnow(),
-            title=plan_data["title"],
-            description=plan_data["description"],
-            schema_version=3,
-            plan_mode="rotation_3_day",
-            goal_code=questionnaire["goal"],
-            meals_per_day=questionnaire["meals_per_day"],
-            generation_context={
-                "questionnaire": questionnaire,
-                "profile_snapshot": profile_snapshot(profile),
-                "nutrition_targets": nutrition_targets,
-            },
+        try:
+            owner = db.session.get(User, user_id)
+            plan = create_diet_plan(
+                owner, owner, questionnaire, nutrition_targets, plan_data, profile_snapshot(profile), source="ai"
+            )
+            db.session.commit()
+        except (IntegrityError, TypeError, ValueError):
+            db.session.rollback()
+            current_app.logger.exception("Unable to save guided diet plan")
+            return {"error": "Não foi possível salvar a dieta gerada."}, 422
+        return (
+            {"message": "Plano alimentar criado.", "plan_id": plan.id, "plan": plan.to_dict_full()},
+            201,
+            {"Location": f"/api/diet_plans/{plan.id}"},
         )
-        db.session.add(plan)
-        db.session.flush()
-        allowed = {
-            "day_of_week", "meal_type", "description", "calories", "protein", "carbs", "fat",
-            "notes", "items", "prep_instructions", "prep_minutes", "substitutions", "order",
-        }
-        for meal in plan_data["meals"]:
-            db.session.add(DietPlanMeal(
-                diet_plan_id=plan.id,
-                **{key: meal[key] for key in allowed if key in meal},
-            ))
-        db.session.commit()
-    except (IntegrityError, TypeError, ValueError):
-        db.session.rollback()
-        current_app.logger.exception("Unable to save guided diet plan")
-        return jsonify({"error": "Não foi possível salvar a dieta gerada."}), 422
-    response = jsonify({"message": "Plano alimentar criado.", "plan_id": plan.id, "plan": plan.to_dict_full()})
-    response.status_code = 201
-    response.headers["Location"] = f"/api/diet_plans/{plan.id}"
-    return response
+
+    return ai_job_response("diet_plan", user_id, work)
 
 
 @user_bp.route("/workout_plans/generate", methods=["POST"])
@@ -769,86 +993,49 @@ def create_guided_workout_plan():
         questionnaire = validate_workout_questionnaire(json_body())
     except PlanValidationError as error:
         return jsonify({"error": "Revise as preferências do treino.", "fields": error.errors}), 400
-    profile = UserProfile.query.filter_by(user_id=user.id).first()
-    max_attempts = current_app.config["GEMINI_WORKOUT_VALIDATION_ATTEMPTS"]
-    for attempt in range(1, max_attempts + 1):
+
+    user_id = user.id
+
+    def work():
+        profile = user_context(user_id).profile
         try:
-            generated = generate_workout_plan(questionnaire, profile)
-            plan_data = normalize_workout_output(generated, questionnaire)
-            break
-        except PlanValidationError as error:
-            current_app.logger.warning(
-                "Invalid generated workout plan (attempt %s/%s): %s",
-                attempt,
-                max_attempts,
-                list(error.errors)[:5],
+            plan_data = build_plan(
+                "workout",
+                lambda draft, error: generate_workout_plan(questionnaire, profile),
+                lambda draft, days, errors: repair_workout_plan(questionnaire, profile, draft, days, errors),
+                lambda draft: normalize_workout_output(draft, questionnaire),
+                current_app.config["GEMINI_WORKOUT_VALIDATION_ATTEMPTS"],
             )
-            if attempt < max_attempts:
-                continue
-            return jsonify({"error": "O treino gerado ficou incompleto. Tente novamente."}), 502
-        except AIResponseError:
-            current_app.logger.warning(
-                "Workout plan AI returned invalid/truncated output (attempt %s/%s)",
-                attempt,
-                max_attempts,
-            )
-            if attempt < max_attempts:
-                continue
-            return jsonify({"error": "O treino gerado ficou incompleto. Tente novamente."}), 502
+        except (PlanValidationError, AIResponseError):
+            return {"error": "O treino gerado ficou incompleto. Tente novamente."}, 502
         except AIQuotaExceededError as error:
-            return jsonify({"error": str(error)}), 429
+            return {"error": str(error)}, 429
         except AIServiceError:
             current_app.logger.exception("Workout plan generation failed")
-            return jsonify({"error": "A IA não conseguiu gerar o treino agora."}), 503
+            return {"error": "A IA não conseguiu gerar o treino agora."}, 503
 
-    try:
-        plan = WorkoutPlan(
-            user_id=user.id,
-            author_user_id=user.id,
-            published_by_user_id=user.id,
-            status="published",
-            source="ai",
-            published_at=datetime.utcnow(),
-            title=plan_data["title"],
-            description=plan_data["description"],
-            split_type=questionnaire["split_type"],
-            days_per_week=questionnaire["days_per_week"],
-            goal=questionnaire["goal"],
-            experience_level=questionnaire["experience_level"],
-            session_duration=questionnaire["session_duration"],
-            questionnaire_data=questionnaire,
+        try:
+            owner = db.session.get(User, user_id)
+            plan = create_workout_plan(owner, owner, questionnaire, plan_data, source="ai")
+            db.session.commit()
+        except (IntegrityError, TypeError, ValueError):
+            db.session.rollback()
+            current_app.logger.exception("Unable to save guided workout plan")
+            return {"error": "Não foi possível salvar o treino gerado."}, 422
+        return (
+            {"message": "Plano de treino criado.", "plan_id": plan.id, "plan": plan.to_dict_full()},
+            201,
+            {"Location": f"/api/workout_plans/{plan.id}"},
         )
-        db.session.add(plan)
-        db.session.flush()
-        exercise_fields = {
-            "catalog_key", "name", "movement_pattern", "primary_muscle", "equipment", "difficulty",
-            "sets", "reps", "weight", "rest_seconds", "effort_guidance", "notes", "order",
-        }
-        for day_data in plan_data["days"]:
-            day = WorkoutDay(
-                workout_plan_id=plan.id,
-                code=day_data["code"],
-                title=day_data["title"],
-                focus=day_data["focus"],
-                order=day_data["order"],
-            )
-            db.session.add(day)
-            db.session.flush()
-            for exercise in day_data["exercises"]:
-                db.session.add(WorkoutExercise(
-                    workout_plan_id=plan.id,
-                    workout_day_id=day.id,
-                    **{key: exercise[key] for key in exercise_fields if key in exercise},
-                ))
-        db.session.commit()
-    except (IntegrityError, TypeError, ValueError):
-        db.session.rollback()
-        current_app.logger.exception("Unable to save guided workout plan")
-        return jsonify({"error": "Não foi possível salvar o treino gerado."}), 422
-    response = jsonify({"message": "Plano de treino criado.", "plan_id": plan.id, "plan": plan.to_dict_full()})
-    response.status_code = 201
-    response.headers["Location"] = f"/api/workout_plans/{plan.id}"
-    return response
+
+    return ai_job_response("workout_plan", user_id, work)
+
+
+@user_bp.route("/ai-jobs/<uuid:job_id>", methods=["GET"])
+@login_required
+def get_ai_job(job_id):
+    job = AIJob.query.filter_by(id=job_id, user_id=g.user.id).first_or_404()
+    return jsonify({"job": expire_stale_job(job).to_dict()}), 200
 
 
 @user_bp.route("/diet_plans", methods=["GET"])
@@ -947,35 +1134,40 @@ def suggest_diet_day(plan_id):
     if not feedback:
         return jsonify({"error": "Descreva a mudança desejada."}), 400
 
-    profile = UserProfile.query.filter_by(user_id=user.id).first()
-    correction = None
-    max_attempts = current_app.config["GEMINI_DIET_VALIDATION_ATTEMPTS"]
-    for attempt in range(1, max_attempts + 1):
-        try:
-            generated = generate_diet_day(
-                questionnaire,
-                profile,
-                existing_meals,
-                feedback,
-                nutrition_targets,
-                correction,
-            )
-            day_data = normalize_diet_day(generated, questionnaire, nutrition_targets)
-            break
-        except PlanValidationError as error:
-            current_app.logger.warning("Invalid generated diet day (attempt %s/%s): %s", attempt, max_attempts, list(error.errors)[:8])
-            if attempt == max_attempts:
-                return jsonify({"error": "A sugestão não atingiu as metas nutricionais."}), 502
-            correction = correction_feedback(error, generated, nutrition_targets)
-        except AIResponseError:
-            if attempt == max_attempts:
-                return jsonify({"error": "A sugestão ficou incompleta. Tente novamente."}), 502
-        except AIQuotaExceededError as error:
-            return jsonify({"error": str(error)}), 429
-        except AIServiceError:
-            current_app.logger.exception("Diet day generation failed")
-            return jsonify({"error": "A IA não conseguiu sugerir mudanças agora."}), 503
-    return jsonify({"day": day_index, "meals": day_data["meals"]}), 200
+    user_id = user.id
+
+    def work():
+        profile = user_context(user_id).profile
+        correction = None
+        max_attempts = current_app.config["GEMINI_DIET_VALIDATION_ATTEMPTS"]
+        for attempt in range(1, max_attempts + 1):
+            try:
+                generated = generate_diet_day(
+                    questionnaire,
+                    profile,
+                    existing_meals,
+                    feedback,
+                    nutrition_targets,
+                    correction,
+                )
+                day_data = normalize_diet_day(generated, questionnaire, nutrition_targets)
+                break
+            except PlanValidationError as error:
+                current_app.logger.warning("Invalid generated diet day (attempt %s/%s): %s", attempt, max_attempts, list(error.errors)[:8])
+                if attempt == max_attempts:
+                    return {"error": "A sugestão não atingiu as metas nutricionais."}, 502
+                correction = correction_feedback(error, generated, nutrition_targets)
+            except AIResponseError:
+                if attempt == max_attempts:
+                    return {"error": "A sugestão ficou incompleta. Tente novamente."}, 502
+            except AIQuotaExceededError as error:
+                return {"error": str(error)}, 429
+            except AIServiceError:
+                current_app.logger.exception("Diet day generation failed")
+                return {"error": "A IA não conseguiu sugerir mudanças agora."}, 503
+        return {"day": day_index, "meals": day_data["meals"]}, 200
+
+    return ai_job_response("diet_day", user_id, work)
 
 
 @user_bp.route("/diet_plans/<int:plan_id>/days/<int:day_index>", methods=["PUT"])
@@ -1334,108 +1526,6 @@ def _performed_sets_payload(data):
     return performed_sets
 
 
-def _workout_session_summary(session_record):
-    overrides = {override.workout_exercise_id: override for override in session_record.overrides}
-    exercises = []
-    total_sets = 0
-    volume_total = 0.0
-    has_performed_sets = False
-    all_sets_have_load = True
-    record_events = PersonalRecordEvent.query.filter_by(
-        workout_session_id=session_record.id,
-    ).order_by(PersonalRecordEvent.id).all()
-    records_by_set = {}
-    records_by_completion = {}
-    for event in record_events:
-        records_by_set.setdefault(event.set_id, []).append(event)
-        records_by_completion.setdefault(event.completion_id, []).append(event)
-
-    for completion in session_record.completions:
-        override = overrides.get(completion.workout_exercise_id)
-        exercise = completion.exercise
-        performed_sets = [
-            {
-                "set_order": item.set_order,
-                "repetitions": item.repetitions,
-                "load_kg": float(item.load_kg) if item.load_kg is not None else None,
-                "is_warmup": item.is_warmup,
-                "personal_records": [
-                    serialize_personal_record(event)
-                    for event in records_by_set.get(item.id, [])
-                    if event.is_highlighted and not event.is_initial
-                ],
-            }
-            for item in completion.performed_sets
-        ]
-        total_sets += len(performed_sets)
-        if performed_sets:
-            has_performed_sets = True
-        if performed_sets and all(item["load_kg"] is not None for item in performed_sets):
-            volume_total += sum(item["load_kg"] * item["repetitions"] for item in performed_sets)
-        elif performed_sets:
-            all_sets_have_load = False
-
-        effective_sets = [item for item in performed_sets if not item["is_warmup"]]
-        best_set_item = max(
-            effective_sets,
-            key=lambda item: (
-                item["load_kg"] if item["load_kg"] is not None else -1,
-                item["repetitions"],
-            ),
-            default=None,
-        )
-        best_set = ({
-            "set_order": best_set_item["set_order"],
-            "repetitions": best_set_item["repetitions"],
-            "load_kg": best_set_item["load_kg"],
-        } if best_set_item else None)
-        exercises.append({
-            "exercise_id": completion.workout_exercise_id,
-            "name": completion.exercise_name or (override.name if override else exercise.name),
-            "catalog_key": completion.exercise_catalog_key or (
-                override.catalog_key if override else exercise.catalog_key
-            ),
-            "sets_performed": len(performed_sets),
-            "sets": performed_sets,
-            "best_set": best_set,
-            "personal_records": [
-                serialize_personal_record(event)
-                for event in records_by_completion.get(completion.id, [])
-                if event.is_highlighted and not event.is_initial
-            ],
-        })
-
-    completed_at = session_record.completed_at or datetime.utcnow()
-    duration_seconds = max(0, int((completed_at - session_record.started_at).total_seconds()))
-    total_exercises = WorkoutExercise.query.filter_by(
-        workout_plan_id=session_record.workout_plan_id,
-        workout_day_id=session_record.workout_day_id,
-    ).count()
-    return {
-        "id": session_record.id,
-        "session_id": session_record.id,
-        "user_id": str(session_record.user_id),
-        "workout_name": session_record.day.title or session_record.plan.title,
-        "plan_name": session_record.plan.title,
-        "started_at": session_record.started_at.isoformat(),
-        "completed_at": session_record.completed_at.isoformat() if session_record.completed_at else None,
-        "duration_seconds": duration_seconds,
-        "exercises_performed": len(exercises),
-        "total_exercises": total_exercises,
-        "sets_performed": total_sets,
-        "volume_total_kg": round(volume_total, 2) if has_performed_sets and all_sets_have_load else None,
-        "workout_plan_id": session_record.workout_plan_id,
-        "workout_day_id": session_record.workout_day_id,
-        "privacy": "private",
-        "personal_records": [
-            serialize_personal_record(event)
-            for event in record_events
-            if event.is_highlighted and not event.is_initial
-        ],
-        "exercises": exercises,
-    }
-
-
 @user_bp.route("/workout_sessions/active", methods=["GET"])
 @login_required
 def get_user_active_workout_session():
@@ -1520,13 +1610,17 @@ def get_exercise_replacement_options(session_id, exercise_id):
 
     catalog_item = resolve_catalog_exercise(exercise.catalog_key, exercise.name)
     if not catalog_item and exercise.catalog_key != "__unresolved__":
-        try:
-            catalog_key = classify_exercise_catalog_key(exercise.name)
-        except AIQuotaExceededError as error:
-            return jsonify({"error": str(error)}), 429
-        except AIServiceError:
-            return jsonify({"error": "Não foi possível classificar este exercício agora."}), 503
-        catalog_item = catalog_by_key().get(catalog_key)
+        catalog_item = resolve_exercise_name(exercise.name)
+        classified = False
+        if not catalog_item:
+            try:
+                catalog_key = classify_exercise_catalog_key(exercise.name)
+            except AIQuotaExceededError as error:
+                return jsonify({"error": str(error)}), 429
+            except AIServiceError:
+                return jsonify({"error": "Não foi possível classificar este exercício agora."}), 503
+            catalog_item = catalog_by_key().get(catalog_key)
+            classified = catalog_item is not None
         if catalog_item:
             exercise.catalog_key = catalog_item["key"]
             exercise.movement_pattern = catalog_item["movement_pattern"]
@@ -1536,6 +1630,8 @@ def get_exercise_replacement_options(session_id, exercise_id):
         else:
             exercise.catalog_key = "__unresolved__"
         db.session.commit()
+        if classified:
+            remember_exercise_alias(exercise.name, catalog_item["key"], "ai")
     options = replacement_options(exercise, unavailable, available)
     return jsonify({
         "exercise_id": exercise.id,
@@ -1654,117 +1750,86 @@ def finish_workout_session(session_id):
     new_unlocks = []
     reached_goal = None
     if session_record.completed_at is None:
-        ensure_personal_record_history(g.user.id, exclude_session_id=session_record.id)
-        evaluate_achievements(g.user.id, backfilled=True)
+        if ensure_personal_record_history(g.user.id, exclude_session_id=session_record.id):
+            evaluate_achievements(g.user.id, backfilled=True)
+        else:
+            ensure_achievement_progress(g.user.id)
         session_record.completed_at = datetime.utcnow()
         timezone_name = confirmed_user_timezone(g.user.id)
         if timezone_name:
             snapshot_session_week(session_record, timezone=timezone_name)
-        process_session_personal_records(session_record)
+        records = process_session_personal_records(session_record)
         reached_goal = complete_exercise_goal(session_record)
         db.session.flush()
-        new_unlocks = evaluate_achievements(g.user.id, related_session=session_record)
+        new_unlocks = record_finished_session(session_record, records, reached_goal)
+        summary = store_session_summary(session_record)
     else:
-        ensure_personal_record_history(g.user.id)
+        backfilled_records = ensure_personal_record_history(g.user.id)
         timezone_name = confirmed_user_timezone(g.user.id)
         if timezone_name:
             snapshot_session_week(session_record, timezone=timezone_name)
-        evaluate_achievements(g.user.id, backfilled=True)
-    progress = weekly_progress(g.user.id)
+        if backfilled_records:
+            evaluate_achievements(g.user.id, backfilled=True)
+        else:
+            ensure_achievement_progress(g.user.id)
+        summary = session_summary(session_record)
+    progress = weekly_progress(g.user.id, timezone=timezone_name)
     db.session.commit()
     return jsonify({
         "message": "Treino finalizado.",
         "session": session_record.to_dict(),
-        "summary": _workout_session_summary(session_record),
+        "summary": summary,
         "weekly_progress": progress,
         "exercise_goals_reached": [serialize_exercise_goal(reached_goal)] if reached_goal else [],
         "achievements_unlocked": [serialize_unlock(item) for item in new_unlocks],
     }), 200
 
 
-def _ensure_user_workout_history(user_id):
-    User.query.filter_by(id=user_id).with_for_update().first()
-    ensure_personal_record_history(user_id)
-    timezone_name = confirmed_user_timezone(user_id)
-    if timezone_name:
-        backfill_session_weeks(user_id, timezone_name)
-    evaluate_achievements(user_id, backfilled=True)
-    db.session.commit()
-
-
-def _activity_list_item(session_record):
-    summary = _workout_session_summary(session_record)
-    return {
-        "id": session_record.id,
-        "workout_name": summary["workout_name"],
-        "plan_name": summary["plan_name"],
-        "started_at": summary["started_at"],
-        "completed_at": summary["completed_at"],
-        "duration_seconds": summary["duration_seconds"],
-        "exercises_performed": summary["exercises_performed"],
-        "total_exercises": summary["total_exercises"],
-        "sets_performed": summary["sets_performed"],
-        "volume_total_kg": summary["volume_total_kg"],
-        "personal_record_count": len(summary["personal_records"]),
-        "privacy": "private",
-    }
-
-
 @user_bp.route("/activities", methods=["GET"])
 @login_required
 def list_activities():
-    _ensure_user_workout_history(g.user.id)
-    try:
-        limit = min(max(int(request.args.get("limit", 20)), 1), 50)
-        offset = max(int(request.args.get("offset", 0)), 0)
-    except ValueError:
-        abort(400, description="Paginação inválida")
-    sessions = (
-        WorkoutSession.query.filter(
-            WorkoutSession.user_id == g.user.id,
-            WorkoutSession.completed_at.isnot(None),
-        )
-        .options(
-            joinedload(WorkoutSession.plan),
-            joinedload(WorkoutSession.day),
-            selectinload(WorkoutSession.overrides),
-            selectinload(WorkoutSession.completions)
-            .joinedload(WorkoutSessionExerciseCompletion.exercise),
-            selectinload(WorkoutSession.completions)
-            .selectinload(WorkoutSessionExerciseCompletion.performed_sets),
-        )
-        .order_by(WorkoutSession.completed_at.desc(), WorkoutSession.id.desc())
-        .offset(offset)
-        .limit(limit + 1)
-        .all()
+    schedule_history_backfill(g.user.id)
+    keys = (WorkoutSession.completed_at, WorkoutSession.id)
+    query = WorkoutSession.query.filter(
+        WorkoutSession.user_id == g.user.id,
+        WorkoutSession.completed_at.isnot(None),
     )
+    if cursor_requested():
+        query, limit = keyset_query(query, keys, default_limit=20, max_limit=50)
+        offset = 0
+    else:
+        try:
+            limit = min(max(int(request.args.get("limit", 20)), 1), 50)
+            offset = max(int(request.args.get("offset", 0)), 0)
+        except ValueError:
+            abort(400, description="Paginação inválida")
+        query = query.order_by(WorkoutSession.completed_at.desc(), WorkoutSession.id.desc())
+    items = activity_list_items(query, limit + 1, offset)
+    has_more = len(items) > limit
+    items = items[:limit]
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        next_cursor = encode_cursor(keys, (datetime.fromisoformat(last["completed_at"]), last["id"]))
     return jsonify({
-        "items": [_activity_list_item(item) for item in sessions[:limit]],
+        "items": items,
         "limit": limit,
         "offset": offset,
-        "has_more": len(sessions) > limit,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
     }), 200
 
 
 @user_bp.route("/activities/<int:activity_id>", methods=["GET"])
 @login_required
 def get_activity(activity_id):
-    _ensure_user_workout_history(g.user.id)
+    schedule_history_backfill(g.user.id)
     session_record = (
         WorkoutSession.query.filter(
             WorkoutSession.id == activity_id,
             WorkoutSession.user_id == g.user.id,
             WorkoutSession.completed_at.isnot(None),
         )
-        .options(
-            joinedload(WorkoutSession.plan),
-            joinedload(WorkoutSession.day),
-            selectinload(WorkoutSession.overrides),
-            selectinload(WorkoutSession.completions)
-            .joinedload(WorkoutSessionExerciseCompletion.exercise),
-            selectinload(WorkoutSession.completions)
-            .selectinload(WorkoutSessionExerciseCompletion.performed_sets),
-        )
         .first_or_404()
     )
     activity_unlocks = AchievementUnlock.query.filter_by(
@@ -1772,7 +1837,7 @@ def get_activity(activity_id):
         workout_session_id=session_record.id,
     ).order_by(AchievementUnlock.id).all()
     return jsonify({
-        "activity": _workout_session_summary(session_record),
+        "activity": session_summary(session_record),
         "achievements": [serialize_unlock(item) for item in activity_unlocks],
     }), 200
 
@@ -1781,7 +1846,7 @@ def get_activity(activity_id):
 @login_required
 def weekly_goal_progress():
     if request.method == "GET":
-        _ensure_user_workout_history(g.user.id)
+        schedule_history_backfill(g.user.id)
         return jsonify(weekly_progress(g.user.id)), 200
 
     data = json_body()
@@ -1789,13 +1854,14 @@ def weekly_goal_progress():
         timezone_name = validate_timezone(data.get("timezone"))
     except ValueError:
         return jsonify({"error": "Confirme um timezone válido."}), 400
-    profile = UserProfile.query.filter_by(user_id=g.user.id).first()
+    profile = user_context(g.user.id).profile
     if not profile:
         profile = UserProfile(user_id=g.user.id)
         db.session.add(profile)
     profile.timezone = timezone_name
+    invalidate_user_context(g.user.id, "profile")
     current_week = week_start_for(None, timezone_name)
-    has_goal = WorkoutWeeklyGoal.query.filter_by(user_id=g.user.id).first() is not None
+    has_goal = bool(user_context(g.user.id).weekly_goals)
     effective_week = current_week + timedelta(days=7) if has_goal else current_week
     try:
         goal = create_weekly_goal(
@@ -1807,18 +1873,19 @@ def weekly_goal_progress():
     except ValueError as error:
         return jsonify({"error": str(error)}), 400
     backfill_session_weeks(g.user.id, timezone_name)
+    mark_history_dirty(g.user.id)
     db.session.commit()
     return jsonify({
         "message": "Meta semanal salva.",
         "goal": serialize_weekly_goal(goal),
-        "progress": weekly_progress(g.user.id),
+        "progress": weekly_progress(g.user.id, timezone=timezone_name),
     }), 200
 
 
 @user_bp.route("/progress/exercise-goals", methods=["GET", "POST"])
 @login_required
 def exercise_goals():
-    _ensure_user_workout_history(g.user.id)
+    schedule_history_backfill(g.user.id)
     if request.method == "GET":
         goals = ExerciseGoal.query.filter_by(user_id=g.user.id).order_by(
             ExerciseGoal.created_at.desc()
@@ -1862,6 +1929,7 @@ def exercise_goals():
     )
     db.session.add(goal)
     db.session.commit()
+    invalidate_user_context(g.user.id, "exercise_goal")
     return jsonify({"message": "Meta de exercício criada.", "goal": serialize_exercise_goal(goal)}), 201
 
 
@@ -1877,40 +1945,40 @@ def cancel_exercise_goal(goal_id):
         return jsonify({"error": "Esta meta não está mais ativa."}), 409
     goal.status = "cancelled"
     db.session.commit()
+    invalidate_user_context(g.user.id, "exercise_goal")
     return jsonify({"message": "Meta cancelada.", "goal": serialize_exercise_goal(goal)}), 200
 
 
 @user_bp.route("/progress/exercises/<path:exercise_key>", methods=["GET"])
 @login_required
 def get_exercise_progress(exercise_key):
-    _ensure_user_workout_history(g.user.id)
+    schedule_history_backfill(g.user.id)
     records = exercise_progress(g.user.id, exercise_key)
     if not records:
         return jsonify({"error": "Histórico do exercício não encontrado."}), 404
-    activities = (
+    activities = activity_list_items(
         WorkoutSession.query.join(WorkoutSessionExerciseCompletion)
         .filter(
             WorkoutSession.user_id == g.user.id,
             WorkoutSession.completed_at.isnot(None),
             WorkoutSessionExerciseCompletion.exercise_catalog_key == exercise_key,
         )
-        .order_by(WorkoutSession.completed_at.desc(), WorkoutSession.id.desc())
-        .limit(20)
-        .all()
+        .order_by(WorkoutSession.completed_at.desc(), WorkoutSession.id.desc()),
+        20,
     )
     return jsonify({
         "exercise_key": exercise_key,
         "exercise_name": records[-1]["exercise_name"],
         "max_load_kg": float(current_max_load(g.user.id, exercise_key) or 0),
         "records": records,
-        "recent_activities": [_activity_list_item(item) for item in activities],
+        "recent_activities": activities,
     }), 200
 
 
 @user_bp.route("/progress/achievements", methods=["GET"])
 @login_required
 def get_achievements():
-    _ensure_user_workout_history(g.user.id)
+    schedule_history_backfill(g.user.id)
     unlocked = {
         item.achievement_code: serialize_unlock(item)
         for item in AchievementUnlock.query.filter_by(user_id=g.user.id).all()
@@ -1926,15 +1994,14 @@ def get_achievements():
 @user_bp.route("/progress/overview", methods=["GET"])
 @login_required
 def progress_overview():
-    _ensure_user_workout_history(g.user.id)
-    recent_sessions = (
+    schedule_history_backfill(g.user.id)
+    recent_activities = activity_list_items(
         WorkoutSession.query.filter(
             WorkoutSession.user_id == g.user.id,
             WorkoutSession.completed_at.isnot(None),
         )
-        .order_by(WorkoutSession.completed_at.desc(), WorkoutSession.id.desc())
-        .limit(5)
-        .all()
+        .order_by(WorkoutSession.completed_at.desc(), WorkoutSession.id.desc()),
+        5,
     )
     recent_records = PersonalRecordEvent.query.filter(
         PersonalRecordEvent.user_id == g.user.id,
@@ -1944,13 +2011,15 @@ def progress_overview():
     recent_unlocks = AchievementUnlock.query.filter_by(user_id=g.user.id).order_by(
         AchievementUnlock.unlocked_at.desc(), AchievementUnlock.id.desc()
     ).limit(5).all()
+    weekly = weekly_progress(g.user.id)
+    suggestion = weekly["suggestion"]
     return jsonify({
-        "weekly": weekly_progress(g.user.id),
+        "weekly": weekly,
         "exercise_goal": serialize_exercise_goal(current_exercise_goal(g.user.id)),
         "recent_personal_records": [serialize_personal_record(item) for item in recent_records],
         "recent_achievements": [serialize_unlock(item) for item in recent_unlocks],
-        "recent_activities": [_activity_list_item(item) for item in recent_sessions],
-        "suggested_weekly_target": suggested_days_per_week(g.user.id),
+        "recent_activities": recent_activities,
+        "suggested_weekly_target": suggestion["days_per_week"] if suggestion else None,
     }), 200
 
 # --- Rotas de Admin ---
@@ -1967,6 +2036,26 @@ def admin_dashboard():
     }
     return jsonify(stats), 200
 
+@user_bp.route("/admin/metrics", methods=["GET"])
+@admin_required
+def admin_metrics():
+    return jsonify({
+        "endpoints": metrics_snapshot(),
+        "exercise_media": gif_cache_stats(),
+        "gemini": connection_metrics(),
+        "nutrition_cache": nutrition_cache_stats(),
+        "plan_repairs": plan_repair_stats(),
+        "prompts": prompt_stats(),
+    }), 200
+
+@user_bp.route("/admin/ai-usage", methods=["GET"])
+@admin_required
+def admin_ai_usage():
+    days = request.args.get("days", 7, type=int)
+    if not 1 <= days <= 90:
+        return jsonify({"error": "Escolha um período entre 1 e 90 dias."}), 400
+    return jsonify(ai_usage_summary(days)), 200
+
 @user_bp.route("/admin/users", methods=["GET"])
 @admin_required
 def list_users():
@@ -2041,7 +2130,7 @@ def search_exercise_media():
 @admin_required
 def exercise_media_candidate(provider_id):
     try:
-        gif_path = get_cached_gif(f"review-{provider_id}", provider_id)
+        gif_path = get_cached_gif(f"review-{provider_id}", provider_id, durable=False)
     except WorkoutXServiceError:
         abort(404)
     return send_file(gif_path, mimetype="image/gif", conditional=True, max_age=86_400)
@@ -2069,6 +2158,7 @@ def approve_exercise_media(catalog_key):
     review.status = "approved"
     review.reviewed_at = datetime.utcnow()
     db.session.commit()
+    invalidate_media()
     return jsonify({"message": "GIF aprovado.", "review": {
         "provider_id": review.provider_id,
         "provider_name": review.provider_name,
@@ -3,14 +3,20 @@ from dataclasses import dataclass
 from datetime import datetime, timedelta
 
 from src.models.user import (
+    AchievementProgress,
     AchievementUnlock,
     ExerciseGoal,
     PersonalRecordEvent,
     WorkoutSession,
-    WorkoutWeeklyGoal,
     db,
 )
-from src.services.workout_progress import backfill_session_weeks, user_timezone
+from src.services.user_context import user_context
+from src.services.workout_progress import (
+    backfill_session_weeks,
+    current_weekly_goal,
+    user_timezone,
+    week_count,
+)
 
 
 ACHIEVEMENTS = {
@@ -52,6 +58,15 @@ ACHIEVEMENTS = {
     },
 }
 ACHIEVEMENT_CATALOG = ACHIEVEMENTS
+SESSION_THRESHOLDS = {
+    "first_step": 1,
+    "workout_10": 10,
+    "workout_50": 50,
+    "workout_100": 100,
+}
+EVOLVING_RECORDS = 10
+BIG_DAY_RECORDS = 3
+CONSISTENT_WEEKS = 4
 
 
 @dataclass(frozen=True)
@@ -85,18 +100,11 @@ def _highlighted_events(user_id):
     )
 
 
-def _consistent_candidate(user_id):
-    goals = (
-        WorkoutWeeklyGoal.query.filter_by(user_id=user_id)
-        .order_by(
-            WorkoutWeeklyGoal.effective_week_start.asc(),
-            WorkoutWeeklyGoal.created_at.asc(),
-            WorkoutWeeklyGoal.id.asc(),
-        )
-        .all()
-    )
+def _weekly_streak(user_id):
+    """Return the ``consistent`` candidate, the latest streak length and its week."""
+    goals = user_context(user_id).weekly_goals
     if not goals:
-        return None
+        return None, 0, None
 
     backfill_session_weeks(user_id, user_timezone(user_id))
     sessions = (
@@ -114,7 +122,7 @@ def _consistent_candidate(user_id):
         .all()
     )
     if not sessions:
-        return None
+        return None, 0, None
 
     sessions_by_week = defaultdict(list)
     for session in sessions:
@@ -125,6 +133,9 @@ def _consistent_candidate(user_id):
     goal_index = 0
     active_goal = None
     streak = 0
+    candidate = None
+    fulfilled_streak = 0
+    fulfilled_week = None
     while week <= last_session_week:
         while goal_index < len(goals) and goals[goal_index].effective_week_start <= week:
             active_goal = goals[goal_index]
@@ -133,28 +144,24 @@ def _consistent_candidate(user_id):
         week_sessions = sessions_by_week.get(week, [])
         if active_goal and len(week_sessions) >= active_goal.target_sessions:
             streak += 1
-            if streak == 4:
+            fulfilled_streak = streak
+            fulfilled_week = week
+            if streak == CONSISTENT_WEEKS and candidate is None:
                 milestone_session = week_sessions[active_goal.target_sessions - 1]
-                return _UnlockCandidate(
+                candidate = _UnlockCandidate(
                     unlocked_at=milestone_session.completed_at,
                     workout_session_id=milestone_session.id,
                 )
         else:
             streak = 0
         week += timedelta(days=7)
-    return None
+    return candidate, fulfilled_streak, fulfilled_week
 
 
-def _candidates(user_id):
+def _candidates(user_id, progress=None):
     candidates = {}
     sessions = _qualifying_sessions(user_id)
-    session_thresholds = {
-        "first_step": 1,
-        "workout_10": 10,
-        "workout_50": 50,
-        "workout_100": 100,
-    }
-    for code, threshold in session_thresholds.items():
+    for code, threshold in SESSION_THRESHOLDS.items():
         if len(sessions) >= threshold:
             session = sessions[threshold - 1]
             candidates[code] = _UnlockCandidate(
@@ -169,8 +176,8 @@ def _candidates(user_id):
             unlocked_at=event.achieved_at,
             workout_session_id=event.workout_session_id,
         )
-    if len(events) >= 10:
-        event = events[9]
+    if len(events) >= EVOLVING_RECORDS:
+        event = events[EVOLVING_RECORDS - 1]
         candidates["evolving"] = _UnlockCandidate(
             unlocked_at=event.achieved_at,
             workout_session_id=event.workout_session_id,
@@ -180,9 +187,9 @@ def _candidates(user_id):
     for event in events:
         events_by_session[event.workout_session_id].append(event)
     third_events = [
-        session_events[2]
+        session_events[BIG_DAY_RECORDS - 1]
         for session_events in events_by_session.values()
-        if len(session_events) >= 3
+        if len(session_events) >= BIG_DAY_RECORDS
     ]
     if third_events:
         event = min(third_events, key=lambda item: (item.achieved_at, item.id))
@@ -207,24 +214,34 @@ def _candidates(user_id):
             exercise_goal_id=achieved_goal.id,
         )
 
-    consistent = _consistent_candidate(user_id)
+    consistent, streak_weeks, streak_week_start = _weekly_streak(user_id)
     if consistent:
         candidates["consistent"] = consistent
+
+    if progress is not None:
+        progress.session_count = len(sessions)
+        progress.highlighted_pr_count = len(events)
+        progress.streak_weeks = streak_weeks
+        progress.streak_week_start = streak_week_start
+        progress.rebuilt_at = datetime.utcnow()
     return candidates
 
 
-def evaluate_achievements(user_id, related_session=None, backfilled=False):
-    candidates = _candidates(user_id)
+def _progress_row(user_id):
+    progress = db.session.get(AchievementProgress, user_id)
+    if progress is None:
+        progress = AchievementProgress(user_id=user_id)
+        db.session.add(progress)
+    return progress
+
+
+def _unlock(user_id, candidates, fallback_at=None, backfilled=False):
     existing_codes = {
         code
         for code, in db.session.query(AchievementUnlock.achievement_code).filter_by(
             user_id=user_id
         )
     }
-    fallback_at = None
-    if related_session is not None and related_session.user_id == user_id:
-        fallback_at = related_session.completed_at
-
     created = []
     for code in ACHIEVEMENTS:
         candidate = candidates.get(code)
@@ -245,6 +262,89 @@ def evaluate_achievements(user_id, related_session=None, backfilled=False):
     return created
 
 
+def evaluate_achievements(user_id, related_session=None, backfilled=False):
+    """Recompute every achievement from history and rebuild the progress counters.
+
+    This is O(history); the finish path uses ``record_finished_session`` instead and
+    only falls back here for repair and backfill.
+    """
+    candidates = _candidates(user_id, progress=_progress_row(user_id))
+    fallback_at = None
+    if related_session is not None and related_session.user_id == user_id:
+        fallback_at = related_session.completed_at
+    return _unlock(user_id, candidates, fallback_at=fallback_at, backfilled=backfilled)
+
+
+def ensure_achievement_progress(user_id):
+    if db.session.get(AchievementProgress, user_id) is not None:
+        return []
+    return evaluate_achievements(user_id, backfilled=True)
+
+
+def _advance_weekly_streak(progress, session_record):
+    week = session_record.completed_week_start
+    if week is None or progress.streak_week_start == week:
+        return
+    goal = current_weekly_goal(session_record.user_id, week)
+    if goal is None:
+        return
+    if week_count(session_record.user_id, week) < goal.target_sessions:
+        return
+    if progress.streak_week_start == week - timedelta(days=7):
+        progress.streak_weeks += 1
+    else:
+        progress.streak_weeks = 1
+    progress.streak_week_start = week
+
+
+def record_finished_session(session_record, personal_records=(), reached_goal=None):
+    """Apply one newly finished session to the counters and unlock what it crosses."""
+    user_id = session_record.user_id
+    progress = db.session.get(AchievementProgress, user_id)
+    if progress is None:
+        return evaluate_achievements(user_id, related_session=session_record)
+
+    candidates = {}
+    milestone = _UnlockCandidate(
+        unlocked_at=session_record.completed_at,
+        workout_session_id=session_record.id,
+    )
+    qualifying = bool(session_record.completions)
+    if qualifying:
+        progress.session_count += 1
+        for code, threshold in SESSION_THRESHOLDS.items():
+            if progress.session_count >= threshold:
+                candidates[code] = milestone
+
+    highlighted = [
+        event for event in personal_records if event.is_highlighted and not event.is_initial
+    ]
+    if highlighted:
+        progress.highlighted_pr_count += len(highlighted)
+        candidates["first_pr"] = milestone
+        if progress.highlighted_pr_count >= EVOLVING_RECORDS:
+            candidates["evolving"] = milestone
+        if len(highlighted) >= BIG_DAY_RECORDS:
+            candidates["big_day"] = milestone
+
+    if reached_goal is not None:
+        candidates["first_goal"] = _UnlockCandidate(
+            unlocked_at=reached_goal.achieved_at,
+            workout_session_id=reached_goal.achieved_session_id,
+            exercise_goal_id=reached_goal.id,
+        )
+
+    if qualifying:
+        _advance_weekly_streak(progress, session_record)
+        if progress.streak_weeks >= CONSISTENT_WEEKS:
+            candidates["consistent"] = milestone
+
+    if not candidates:
+        db.session.flush()
+        return []
+    return _unlock(user_id, candidates, fallback_at=session_record.completed_at)
+
+
 def serialize_unlock(unlock):
     definition = ACHIEVEMENTS.get(unlock.achievement_code, {})
     return {
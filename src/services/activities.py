@@ -0,0 +1,216 @@
+from datetime import datetime
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from src.models.user import (
+    PersonalRecordEvent,
+    WorkoutExercise,
+    WorkoutSession,
+    WorkoutSessionExerciseCompletion,
+    WorkoutSessionSummary,
+    db,
+)
+from src.services.personal_records import serialize_personal_record
+
+
+SUMMARY_VERSION = 1
+
+
+def summary_load_options():
+    return (
+        joinedload(WorkoutSession.plan),
+        joinedload(WorkoutSession.day),
+        selectinload(WorkoutSession.overrides),
+        selectinload(WorkoutSession.completions)
+        .joinedload(WorkoutSessionExerciseCompletion.exercise),
+        selectinload(WorkoutSession.completions)
+        .selectinload(WorkoutSessionExerciseCompletion.performed_sets),
+    )
+
+
+def build_session_summary(session_record):
+    """Compute the activity summary from the session's completions and PR events."""
+    overrides = {override.workout_exercise_id: override for override in session_record.overrides}
+    exercises = []
+    total_sets = 0
+    volume_total = 0.0
+    has_performed_sets = False
+    all_sets_have_load = True
+    record_events = PersonalRecordEvent.query.filter_by(
+        workout_session_id=session_record.id,
+    ).order_by(PersonalRecordEvent.id).all()
+    records_by_set = {}
+    records_by_completion = {}
+    for event in record_events:
+        records_by_set.setdefault(event.set_id, []).append(event)
+        records_by_completion.setdefault(event.completion_id, []).append(event)
+
+    for completion in session_record.completions:
+        override = overrides.get(completion.workout_exercise_id)
+        exercise = completion.exercise
+        performed_sets = [
+            {
+                "set_order": item.set_order,
+                "repetitions": item.repetitions,
+                "load_kg": float(item.load_kg) if item.load_kg is not None else None,
+                "is_warmup": item.is_warmup,
+                "personal_records": [
+                    serialize_personal_record(event)
+                    for event in records_by_set.get(item.id, [])
+                    if event.is_highlighted and not event.is_initial
+                ],
+            }
+            for item in completion.performed_sets
+        ]
+        total_sets += len(performed_sets)
+        if performed_sets:
+            has_performed_sets = True
+        if performed_sets and all(item["load_kg"] is not None for item in performed_sets):
+            volume_total += sum(item["load_kg"] * item["repetitions"] for item in performed_sets)
+        elif performed_sets:
+            all_sets_have_load = False
+
+        effective_sets = [item for item in performed_sets if not item["is_warmup"]]
+        best_set_item = max(
+            effective_sets,
+            key=lambda item: (
+                item["load_kg"] if item["load_kg"] is not None else -1,
+                item["repetitions"],
+            ),
+            default=None,
+        )
+        best_set = ({
+            "set_order": best_set_item["set_order"],
+            "repetitions": best_set_item["repetitions"],
+            "load_kg": best_set_item["load_kg"],
+        } if best_set_item else None)
+        exercises.append({
+            "exercise_id": completion.workout_exercise_id,
+            "name": completion.exercise_name or (override.name if override else exercise.name),
+            "catalog_key": completion.exercise_catalog_key or (
+                override.catalog_key if override else exercise.catalog_key
+            ),
+            "sets_performed": len(performed_sets),
+            "sets": performed_sets,
+            "best_set": best_set,
+            "personal_records": [
+                serialize_personal_record(event)
+                for event in records_by_completion.get(completion.id, [])
+                if event.is_highlighted and not event.is_initial
+            ],
+        })
+
+    completed_at = session_record.completed_at or datetime.utcnow()
+    duration_seconds = max(0, int((completed_at - session_record.started_at).total_seconds()))
+    total_exercises = WorkoutExercise.query.filter_by(
+        workout_plan_id=session_record.workout_plan_id,
+        workout_day_id=session_record.workout_day_id,
+    ).count()
+    return {
+        "id": session_record.id,
+        "session_id": session_record.id,
+        "user_id": str(session_record.user_id),
+        "workout_name": session_record.day.title or session_record.plan.title,
+        "plan_name": session_record.plan.title,
+        "started_at": session_record.started_at.isoformat(),
+        "completed_at": session_record.completed_at.isoformat() if session_record.completed_at else None,
+        "duration_seconds": duration_seconds,
+        "exercises_performed": len(exercises),
+        "total_exercises": total_exercises,
+        "sets_performed": total_sets,
+        "volume_total_kg": round(volume_total, 2) if has_performed_sets and all_sets_have_load else None,
+        "workout_plan_id": session_record.workout_plan_id,
+        "workout_day_id": session_record.workout_day_id,
+        "privacy": "private",
+        "personal_records": [
+            serialize_personal_record(event)
+            for event in record_events
+            if event.is_highlighted and not event.is_initial
+        ],
+        "exercises": exercises,
+    }
+
+
+def store_session_summary(session_record):
+    """Persist the summary of a finished session so listings never recompute it."""
+    data = build_session_summary(session_record)
+    stored = db.session.get(WorkoutSessionSummary, session_record.id)
+    if stored is None:
+        stored = WorkoutSessionSummary(workout_session_id=session_record.id)
+        db.session.add(stored)
+    stored.user_id = session_record.user_id
+    stored.completed_at = session_record.completed_at
+    stored.version = SUMMARY_VERSION
+    stored.data = data
+    return data
+
+
+def _summary_or_build(session_record, stored):
+    if stored is not None and stored.version == SUMMARY_VERSION:
+        return stored.data
+    return build_session_summary(session_record)
+
+
+def session_summary(session_record):
+    """Stored snapshot when current, otherwise a read-only recomputation."""
+    return _summary_or_build(
+        session_record,
+        db.session.get(WorkoutSessionSummary, session_record.id),
+    )
+
+
+def activity_list_item(summary):
+    return {
+        "id": summary["id"],
+        "workout_name": summary["workout_name"],
+        "plan_name": summary["plan_name"],
+        "started_at": summary["started_at"],
+        "completed_at": summary["completed_at"],
+        "duration_seconds": summary["duration_seconds"],
+        "exercises_performed": summary["exercises_performed"],
+        "total_exercises": summary["total_exercises"],
+        "sets_performed": summary["sets_performed"],
+        "volume_total_kg": summary["volume_total_kg"],
+        "personal_record_count": len(summary["personal_records"]),
+        "privacy": "private",
+    }
+
+
+def activity_list_items(query, limit, offset=0):
+    """List items for an ordered query of completed sessions, joined to their snapshots."""
+    rows = (
+        query.outerjoin(
+            WorkoutSessionSummary,
+            WorkoutSessionSummary.workout_session_id == WorkoutSession.id,
+        )
+        .add_entity(WorkoutSessionSummary)
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+    return [
+        activity_list_item(_summary_or_build(session_record, stored))
+        for session_record, stored in rows
+    ]
+
+
+def store_missing_summaries(user_id):
+    sessions = (
+        WorkoutSession.query.outerjoin(
+            WorkoutSessionSummary,
+            WorkoutSessionSummary.workout_session_id == WorkoutSession.id,
+        )
+        .filter(
+            WorkoutSession.user_id == user_id,
+            WorkoutSession.completed_at.isnot(None),
+            db.or_(
+                WorkoutSessionSummary.workout_session_id.is_(None),
+                WorkoutSessionSummary.version != SUMMARY_VERSION,
+            ),
+        )
+        .options(*summary_load_options())
+        .all()
+    )
+    for session_record in sessions:
+        store_session_summary(session_record)
+    return len(sessions)
@@ -3,14 +3,24 @@ import re
 import time
 
 from flask import current_app
-from google import genai
 from google.genai import types
 
-from src.services.diet_plans import diet_restriction_policy
+from src.services.ai_usage import record_ai_call
+from src.services.diet_plans import correction_feedback, diet_restriction_policy
+from src.services.gemini_client import cached_context, gemini_client
+from src.services.nutrition_cache import nutrition_cache, nutrition_cache_key
+from src.services.prompt_context import (
+    classification_catalog_context,
+    compact_json,
+    estimate_tokens,
+    meter_usage,
+    record_prompt,
+    workout_catalog_context,
+)
 from src.services.workout_plans import (
+    PlanValidationError,
     allowed_groups_for_day,
     catalog_by_key,
-    catalog_for_prompt,
     required_training_roles_for_day,
     workout_day_specs,
 )
@@ -52,6 +62,78 @@ def _json_object(content: str) -> dict:
     return data
 
 
+def _generation_config(
+    system_instruction, max_tokens, temperature, json_response=False, json_schema=None, cached_content=None
+):
+    config_options = {
+        "temperature": temperature,
+        "max_output_tokens": max_tokens,
+        "response_mime_type": "application/json" if json_response else "text/plain",
+    }
+    # A cached content already carries the system instruction; Gemini rejects both.
+    if cached_content:
+        config_options["cached_content"] = cached_content
+    else:
+        config_options["system_instruction"] = system_instruction
+    if json_schema:
+        config_options["response_json_schema"] = json_schema
+    return types.GenerateContentConfig(**config_options)
+
+
+def _instruction_cache(client, model, system_instruction):
+    config = current_app.config
+    if not config.get("GEMINI_CONTEXT_CACHE"):
+        return None
+    if estimate_tokens(system_instruction) < config.get("GEMINI_CONTEXT_CACHE_MIN_TOKENS", 1024):
+        return None
+    return cached_context(client, model, system_instruction, config.get("GEMINI_CONTEXT_CACHE_TTL", 3600))
+
+
+def _client():
+    api_key = current_app.config["GEMINI_API_KEY"]
+    if not api_key:
+        raise AIServiceError("GEMINI_API_KEY is not configured")
+    timeout = current_app.config.get("GEMINI_TIMEOUT", 90)
+    return gemini_client(api_key, timeout * 1000, current_app.config.get("GEMINI_BASE_URL"))
+
+
+def _provider_error(error):
+    error_text = str(error)
+    status_code = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status_code == 429 or "RESOURCE_EXHAUSTED" in error_text:
+        delay_match = re.search(r"retry in\s+(\d+)", error_text, re.IGNORECASE)
+        delay = f" em cerca de {delay_match.group(1)} segundos" if delay_match else " mais tarde"
+        return AIQuotaExceededError(f"A cota da IA foi atingida. Tente novamente{delay}.")
+    if status_code == 503 or "UNAVAILABLE" in error_text:
+        return AIServiceUnavailableError("A IA está temporariamente com alta demanda.")
+    return AIServiceError("Gemini provider request failed")
+
+
+def _usage_outcome(error):
+    for error_type, outcome in (
+        (AITruncatedResponseError, "truncated"),
+        (AIResponseError, "invalid"),
+        (AIQuotaExceededError, "quota"),
+        (AIServiceUnavailableError, "unavailable"),
+    ):
+        if isinstance(error, error_type):
+            return outcome
+    return "error"
+
+
+def _finish_reason(candidate):
+    finish_reason = getattr(candidate, "finish_reason", None)
+    return getattr(finish_reason, "name", str(finish_reason))
+
+
+def _candidate_text(candidate):
+    return "".join(
+        part.text
+        for part in getattr(getattr(candidate, "content", None), "parts", []) or []
+        if part.text and not getattr(part, "thought", False)
+    )
+
+
 def _completion(
     system_instruction: str,
     prompt: str,
@@ -62,71 +144,150 @@ def _completion(
     json_schema=None,
     image_bytes=None,
     mime_type=None,
+    prompt_kind=None,
+    tokens_saved=0,
+    cache_instruction=False,
 ) -> str:
-    api_key = current_app.config["GEMINI_API_KEY"]
-    if not api_key:
-        raise AIServiceError("GEMINI_API_KEY is not configured")
-
-    config_options = {
-        "system_instruction": system_instruction,
-        "temperature": temperature,
-        "max_output_tokens": max_tokens,
-        "response_mime_type": "application/json" if json_response else "text/plain",
-    }
-    if json_schema:
-        config_options["response_json_schema"] = json_schema
-    config = types.GenerateContentConfig(**config_options)
-    timeout = current_app.config.get("GEMINI_TIMEOUT", 90)
-    timeout_ms = timeout * 1000
+    """One Gemini generation; ``cache_instruction`` serves a long static system
+    instruction from Gemini's context cache when ``GEMINI_CONTEXT_CACHE`` is on.
+
+    ``prompt_kind`` records input tokens (and ``tokens_saved`` by prompt slimming)
+    in the prompt stats of ``/api/admin/metrics``.
+    """
+    client = _client()
+    model = model or current_app.config["GEMINI_MODEL"]
+    started = time.perf_counter()
+    usage = finish_reason_name = None
+    outcome = "ok"
     try:
-        # Keep the HTTP client alive until the synchronous request has completed.
-        with genai.Client(api_key=api_key, http_options=types.HttpOptions(timeout=timeout_ms)) as client:
-            if image_bytes and mime_type:
-                contents = [
-                    types.Part.from_bytes(data=image_bytes, mime_type=mime_type),
-                    types.Part.from_text(text=prompt),
-                ]
-            else:
-                contents = prompt
-            response = client.models.generate_content(
-                model=model or current_app.config["GEMINI_MODEL"],
-                contents=contents,
-                config=config,
-            )
+        cached_content = _instruction_cache(client, model, system_instruction) if cache_instruction else None
+        config = _generation_config(
+            system_instruction, max_tokens, temperature, json_response, json_schema, cached_content
+        )
+        if image_bytes and mime_type:
+            contents = [
+                types.Part.from_bytes(data=image_bytes, mime_type=mime_type),
+                types.Part.from_text(text=prompt),
+            ]
+        else:
+            contents = prompt
+        started = time.perf_counter()
+        response = client.models.generate_content(model=model, contents=contents, config=config)
         candidate = next(iter(response.candidates or []), None)
-        finish_reason = getattr(candidate, "finish_reason", None)
-        finish_reason_name = getattr(finish_reason, "name", str(finish_reason))
+        finish_reason_name = _finish_reason(candidate)
         usage = getattr(response, "usage_metadata", None)
         current_app.logger.info(
             "Gemini response model=%s finish_reason=%s usage=%s",
-            model or current_app.config["GEMINI_MODEL"],
+            model,
             finish_reason_name,
             usage,
         )
+        meter_usage(usage)
+        if prompt_kind:
+            current_app.logger.info(
+                "Gemini prompt kind=%s tokens=%s", prompt_kind, record_prompt(prompt_kind, usage, tokens_saved)
+            )
         if "MAX_TOKENS" in finish_reason_name:
             raise AITruncatedResponseError("Gemini response reached the output token limit")
 
-        text_parts = [
-            part.text
-            for part in getattr(getattr(candidate, "content", None), "parts", []) or []
-            if part.text and not getattr(part, "thought", False)
-        ]
-        text = "".join(text_parts).strip()
+        text = _candidate_text(candidate).strip()
         if not text:
             raise AIResponseError("Gemini returned an empty response")
         return text
-    except AIServiceError:
+    except AIServiceError as error:
+        outcome = _usage_outcome(error)
         raise
     except Exception as error:
-        error_text = str(error)
-        status_code = getattr(error, "status_code", None) or getattr(error, "code", None)
-        if status_code == 429 or "RESOURCE_EXHAUSTED" in error_text:
-            delay_match = re.search(r"retry in\s+(\d+)", error_text, re.IGNORECASE)
-            delay = f" em cerca de {delay_match.group(1)} segundos" if delay_match else " mais tarde"
-            raise AIQuotaExceededError(f"A cota da IA foi atingida. Tente novamente{delay}.") from error
-        if status_code == 503 or "UNAVAILABLE" in error_text:
-            raise AIServiceUnavailableError("A IA está temporariamente com alta demanda.") from error
-        raise AIServiceError("Gemini provider request failed") from error
+        provider_error = _provider_error(error)
+        outcome = _usage_outcome(provider_error)
+        raise provider_error from error
+    finally:
+        record_ai_call(
+            prompt_kind or "other",
+            model,
+            (time.perf_counter() - started) * 1000,
+            usage,
+            finish_reason_name,
+            outcome,
+        )
+
+
+class CompletionStream:
+    """Text chunks of a streamed completion, as Gemini produces them.
+
+    ``truncated`` becomes true as soon as a chunk reports the output token limit,
+    so callers can tell the user without a second request.
+    """
+
+    def __init__(self, system_instruction, prompt, max_tokens, temperature, model, feature="chat"):
+        self.model = model
+        self.feature = feature
+        self.truncated = False
+        self._client = _client()
+        self._request = {
+            "model": model,
+            "contents": prompt,
+            "config": _generation_config(system_instruction, max_tokens, temperature),
+        }
+
+    def __iter__(self):
+        finish_reason_name = usage = None
+        started = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            for chunk in self._client.models.generate_content_stream(**self._request):
+                candidate = next(iter(chunk.candidates or []), None)
+                text = _candidate_text(candidate)
+                if text:
+                    yield text
+                if getattr(candidate, "finish_reason", None) is not None:
+                    finish_reason_name = _finish_reason(candidate)
+                    self.truncated = "MAX_TOKENS" in finish_reason_name
+                usage = getattr(chunk, "usage_metadata", None) or usage
+            outcome = "truncated" if self.truncated else "ok"
+        except AIServiceError as error:
+            outcome = _usage_outcome(error)
+            raise
+        except Exception as error:
+            provider_error = _provider_error(error)
+            outcome = _usage_outcome(provider_error)
+            raise provider_error from error
+        finally:
+            # "cancelled": the client went away and the generator was closed mid-stream.
+            record_ai_call(
+                self.feature,
+                self.model,
+                (time.perf_counter() - started) * 1000,
+                usage,
+                finish_reason_name,
+                outcome,
+            )
+        current_app.logger.info(
+            "Gemini stream model=%s finish_reason=%s usage=%s", self.model, finish_reason_name, usage
+        )
+
+
+# Bump when the nutrition prompt or parsing changes so cached estimates are not reused.
+NUTRITION_PROMPT_VERSION = 1
+
+
+def _nutrition_key(food_description, image_bytes, mime_type):
+    return nutrition_cache_key(
+        food_description,
+        image_bytes,
+        mime_type,
+        current_app.config["GEMINI_STRUCTURED_MODEL"],
+        NUTRITION_PROMPT_VERSION,
+    )
+
+
+def cached_nutrition(
+    food_description: str,
+    image_bytes: bytes | None = None,
+    mime_type: str | None = None,
+) -> dict | None:
+    """Return a previously computed estimate for the same food, photo, model and prompt."""
+    return nutrition_cache().get(_nutrition_key(food_description, image_bytes, mime_type))
 
 
 def calculate_nutrition(
@@ -134,6 +295,7 @@ def calculate_nutrition(
     image_bytes: bytes | None = None,
     mime_type: str | None = None,
 ) -> dict:
+    """Ask Gemini for the macros and cache them; callers check ``cached_nutrition`` first."""
     has_image = bool(image_bytes and mime_type)
     is_vague = not re.search(
         r"\d|grama|colher|concha|fatia|ml|xícara|porção|unidade",
@@ -163,10 +325,11 @@ Assuma porções médias brasileiras se não houver referência de tamanho."""
             model=current_app.config["GEMINI_STRUCTURED_MODEL"],
             image_bytes=image_bytes,
             mime_type=mime_type,
+            prompt_kind="nutrition",
         )
     )
     try:
-        return {
+        macros = {
             "calories": float(data["calories"]),
             "protein": float(data["protein"]),
             "carbs": float(data["carbs"]),
@@ -175,9 +338,11 @@ Assuma porções médias brasileiras se não houver referência de tamanho."""
         }
     except (KeyError, TypeError, ValueError) as error:
         raise AIResponseError("Gemini nutrition response had invalid values") from error
+    nutrition_cache().put(_nutrition_key(food_description, image_bytes, mime_type), macros)
+    return macros
 
 
-def generate_response(message: str, user, profile) -> str:
+def _chat_context(user, profile):
     context = f"Você é um assistente fitness especializado em nutrição e treino. O usuário se chama {user.username}. "
     if profile:
         for label, value, suffix in (
@@ -194,6 +359,11 @@ def generate_response(message: str, user, profile) -> str:
     context += """Responda de forma amigável, útil e personalizada em português.
 Seja objetivo: use no máximo 120 palavras, priorize uma ação prática e use no máximo 4 tópicos curtos quando necessário.
 Não repita o perfil, não gere planos completos sem pedido explícito e faça uma pergunta curta quando faltar informação essencial."""
+    return context
+
+
+def generate_response(message: str, user, profile) -> str:
+    context = _chat_context(user, profile)
     try:
         return _completion(
             context,
@@ -201,6 +371,7 @@ Não repita o perfil, não gere planos completos sem pedido explícito e faça u
             current_app.config["GEMINI_CHAT_MAX_TOKENS"],
             0.5,
             model=current_app.config["GEMINI_CHAT_MODEL"],
+            prompt_kind="chat",
         )
     except AITruncatedResponseError:
         concise_context = context + "\nA resposta anterior excedeu o limite. Responda agora em no máximo 60 palavras e uma única ação principal."
@@ -211,14 +382,29 @@ Não repita o perfil, não gere planos completos sem pedido explícito e faça u
                 1024,
                 0.3,
                 model=current_app.config["GEMINI_CHAT_MODEL"],
+                prompt_kind="chat",
             )
         except AITruncatedResponseError:
             return "Diga seu objetivo principal e eu envio uma orientação curta e prática."
 
 
-def _profile_context(profile):
+def stream_response(message: str, user, profile) -> CompletionStream:
+    """Streamed variant of ``generate_response``; a truncated answer is kept as streamed."""
+    return CompletionStream(
+        _chat_context(user, profile),
+        message,
+        current_app.config["GEMINI_CHAT_MAX_TOKENS"],
+        0.5,
+        current_app.config["GEMINI_CHAT_MODEL"],
+    )
+
+
+def profile_context(profile):
+    """The profile fields sent to Gemini; a dict is taken as an already extracted context."""
     if not profile:
         return {}
+    if isinstance(profile, dict):
+        return dict(profile)
     return {
         "age": profile.age,
         "gender": profile.gender,
@@ -230,61 +416,37 @@ def _profile_context(profile):
     }
 
 
-def generate_workout_plan(questionnaire: dict, profile) -> dict:
-    day_specs = workout_day_specs(questionnaire["split_type"], questionnaire["days_per_week"])
-    for spec in day_specs:
-        spec["allowed_groups"] = sorted(allowed_groups_for_day(questionnaire["split_type"], spec["code"]))
-        spec["required_training_roles"] = [
-            sorted(alternatives)
-            for alternatives in required_training_roles_for_day(questionnaire["split_type"], spec["code"])
-        ]
-    payload = {
-        "questionnaire": questionnaire,
-        "profile": _profile_context(profile),
-        "required_days": day_specs,
-        "exercise_catalog": catalog_for_prompt(questionnaire),
-        "programming_constraints": {
-            "20_30_minutes": "3 a 5 exercícios",
-            "45_60_minutes": "4 a 7 exercícios",
-            "75_90_minutes": "6 a 8 exercícios",
-        },
-    }
-    schema = {
-        "type": "object",
-        "required": ["type", "title", "description", "days"],
-        "properties": {
-            "type": {"type": "string", "enum": ["workout_plan"]},
-            "title": {"type": "string"},
-            "description": {"type": "string"},
-            "days": {
-                "type": "array",
-                "items": {
-                    "type": "object",
-                    "required": ["focus", "exercises"],
-                    "properties": {
-                        "focus": {"type": "string"},
-                        "exercises": {
-                            "type": "array",
-                            "items": {
-                                "type": "object",
-                                "required": ["catalog_key", "sets", "reps", "rest_seconds"],
-                                "properties": {
-                                    "catalog_key": {"type": "string"},
-                                    "sets": {"type": "integer"},
-                                    "reps": {"type": "string"},
-                                    "weight": {"type": "string"},
-                                    "rest_seconds": {"type": "integer"},
-                                    "effort_guidance": {"type": "string"},
-                                    "notes": {"type": "string"},
-                                },
-                            },
-                        },
-                    },
+_WORKOUT_PROGRAMMING_CONSTRAINTS = {
+    "20_30_minutes": "3 a 5 exercícios",
+    "45_60_minutes": "4 a 7 exercícios",
+    "75_90_minutes": "6 a 8 exercícios",
+}
+
+_WORKOUT_DAY_SCHEMA = {
+    "type": "object",
+    "required": ["focus", "exercises"],
+    "properties": {
+        "focus": {"type": "string"},
+        "exercises": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["catalog_key", "sets", "reps", "rest_seconds"],
+                "properties": {
+                    "catalog_key": {"type": "string"},
+                    "sets": {"type": "integer"},
+                    "reps": {"type": "string"},
+                    "weight": {"type": "string"},
+                    "rest_seconds": {"type": "integer"},
+                    "effort_guidance": {"type": "string"},
+                    "notes": {"type": "string"},
                 },
             },
         },
-    }
-    system_instruction = """Você monta programas individualizados de musculação em português com base em treinamento resistido e anatomia funcional.
+    },
+}
+
+_WORKOUT_INSTRUCTION = """Você monta programas individualizados de musculação em português com base em treinamento resistido e anatomia funcional.
 Use SOMENTE catalog_key presente em exercise_catalog. Siga exatamente required_days, focus_guidance, required_groups, allowed_groups e a ordem dos dias. Nunca invente exercício, ID ou equipamento.
 
 RACIOCÍNIO SILENCIOSO OBRIGATÓRIO:
@@ -328,7 +490,28 @@ NÍVEL E SEGURANÇA:
 
 AUDITORIA SILENCIOSA FINAL:
 Confirme objetivo, volume direto e indireto, frequência, cobertura regional, redundância, recuperação, prioridades, nível, duração, equipamentos e limitações. Corrija qualquer falha antes de retornar somente o JSON do schema."""
-    contents = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def _workout_day_specs(questionnaire):
+    day_specs = workout_day_specs(questionnaire["split_type"], questionnaire["days_per_week"])
+    for spec in day_specs:
+        spec["allowed_groups"] = sorted(allowed_groups_for_day(questionnaire["split_type"], spec["code"]))
+        spec["required_training_roles"] = [
+            sorted(alternatives)
+            for alternatives in required_training_roles_for_day(questionnaire["split_type"], spec["code"])
+        ]
+    return day_specs
+
+
+def _workout_completion(questionnaire, payload, schema, prompt_kind):
+    """Run a workout prompt with the shared (cacheable) instruction and model fallback."""
+    catalog, tokens_saved = workout_catalog_context(questionnaire)
+    system_instruction = _WORKOUT_INSTRUCTION + """
+
+exercise_catalog (tabela: cada linha segue columns; secondary_muscles separados por |):
+""" + catalog
+    contents = compact_json(payload)
+    prompt_options = {"prompt_kind": prompt_kind, "tokens_saved": tokens_saved, "cache_instruction": True}
     primary_model = current_app.config["GEMINI_WORKOUT_MODEL"]
     fallback_model = current_app.config["GEMINI_WORKOUT_FALLBACK_MODEL"]
     try:
@@ -340,6 +523,7 @@ Confirme objetivo, volume direto e indireto, frequência, cobertura regional, re
             json_response=True,
             model=primary_model,
             json_schema=schema,
+            **prompt_options,
         )
     except AIServiceUnavailableError:
         if not fallback_model or fallback_model == primary_model:
@@ -357,10 +541,84 @@ Confirme objetivo, volume direto e indireto, frequência, cobertura regional, re
             json_response=True,
             model=fallback_model,
             json_schema=schema,
+            **prompt_options,
         )
     return _json_object(response)
 
 
+def generate_workout_plan(questionnaire: dict, profile) -> dict:
+    payload = {
+        "questionnaire": questionnaire,
+        "profile": profile_context(profile),
+        "required_days": _workout_day_specs(questionnaire),
+        "programming_constraints": _WORKOUT_PROGRAMMING_CONSTRAINTS,
+    }
+    schema = {
+        "type": "object",
+        "required": ["type", "title", "description", "days"],
+        "properties": {
+            "type": {"type": "string", "enum": ["workout_plan"]},
+            "title": {"type": "string"},
+            "description": {"type": "string"},
+            "days": {"type": "array", "items": _WORKOUT_DAY_SCHEMA},
+        },
+    }
+    return _workout_completion(questionnaire, payload, schema, "workout_plan")
+
+
+def _day_errors(errors, day):
+    return {
+        field: message
+        for field, message in errors.items()
+        if field == f"days.{day}" or field.startswith(f"days.{day}.")
+    }
+
+
+def _merge_repaired_days(draft, days, repaired):
+    """Put regenerated days back into a copy of ``draft``; the model must return each one."""
+    by_day = {}
+    for item in repaired.get("days") or []:
+        if isinstance(item, dict) and item.get("day") in days:
+            by_day[item["day"]] = {key: value for key, value in item.items() if key != "day"}
+    if set(by_day) != set(days):
+        raise AIResponseError("Gemini did not return every day to repair")
+    merged = dict(draft, days=list(draft["days"]))
+    for day, content in by_day.items():
+        merged["days"][day - 1] = content
+    return merged
+
+
+def repair_workout_plan(questionnaire: dict, profile, draft: dict, days: list, errors: dict) -> dict:
+    """Regenerate only ``days`` (1-based) of ``draft`` and merge them back into it."""
+    specs = _workout_day_specs(questionnaire)
+    payload = {
+        "questionnaire": questionnaire,
+        "profile": profile_context(profile),
+        "repair": "Reescreva somente os dias de days_to_rewrite, corrigindo validation_errors e seguindo spec; os demais dias já foram aprovados.",
+        "days_to_rewrite": [
+            {
+                "day": day,
+                "spec": specs[day - 1],
+                "previous": draft["days"][day - 1],
+                "validation_errors": _day_errors(errors, day),
+            }
+            for day in days
+        ],
+        "programming_constraints": _WORKOUT_PROGRAMMING_CONSTRAINTS,
+    }
+    day_schema = dict(
+        _WORKOUT_DAY_SCHEMA,
+        required=["day", *_WORKOUT_DAY_SCHEMA["required"]],
+        properties={"day": {"type": "integer"}, **_WORKOUT_DAY_SCHEMA["properties"]},
+    )
+    schema = {
+        "type": "object",
+        "required": ["days"],
+        "properties": {"days": {"type": "array", "items": day_schema}},
+    }
+    return _merge_repaired_days(draft, days, _workout_completion(questionnaire, payload, schema, "workout_repair"))
+
+
 def _diet_meal_schema(include_optional=True):
     properties = {
         "meal_type": {"type": "string"},
@@ -394,7 +652,7 @@ def _diet_meal_schema(include_optional=True):
     }
 
 
-def _generate_diet_json(system_instruction, payload, schema):
+def _generate_diet_json(system_instruction, payload, schema, prompt_kind):
     attempts = max(1, current_app.config["GEMINI_DIET_RETRY_ATTEMPTS"])
     for attempt in range(1, attempts + 1):
         try:
@@ -406,6 +664,7 @@ def _generate_diet_json(system_instruction, payload, schema):
                 json_response=True,
                 model=current_app.config["GEMINI_DIET_PLAN_MODEL"],
                 json_schema=schema,
+                prompt_kind=prompt_kind,
             ))
         except AIServiceUnavailableError:
             if attempt == attempts:
@@ -418,7 +677,7 @@ def _generate_diet_json(system_instruction, payload, schema):
 def generate_diet_plan(questionnaire: dict, profile, nutrition_targets: dict, correction=None) -> dict:
     payload = {
         "questionnaire": questionnaire,
-        "profile": _profile_context(profile),
+        "profile": profile_context(profile),
         "nutritionTargets": nutrition_targets,
         "restrictionPolicy": diet_restriction_policy(questionnaire),
     }
@@ -448,13 +707,59 @@ Use porções claras, alimentos realistas e os macros solicitados. Some calorias
 Nunca use itens de restrictionPolicy.prohibited. Produtos explicitamente sem lactose e alternativas vegetais são permitidos.
 Evite restrictionPolicy.avoid_when_possible, mas eles são preferências, não alergias. Retorne somente campos do schema.
 Se correction existir, use correction.previous_plan como rascunho, corrija todos os validation_errors e mantenha cada total dentro de correction.allowed_daily_ranges."""
-    return _generate_diet_json(system_instruction, payload, schema)
+    return _generate_diet_json(system_instruction, payload, schema, "diet_plan")
+
+
+def repair_diet_plan(questionnaire: dict, profile, nutrition_targets: dict, draft: dict, days: list, errors: dict) -> dict:
+    """Rewrite only ``days`` (1-based) of a diet draft; the other days are kept as they are.
+
+    Meals share the daily macro targets, so the unit of repair is the whole day.
+    """
+    correction = correction_feedback(PlanValidationError(errors), targets=nutrition_targets)
+    payload = {
+        "questionnaire": questionnaire,
+        "profile": profile_context(profile),
+        "nutritionTargets": nutrition_targets,
+        "restrictionPolicy": diet_restriction_policy(questionnaire),
+        "allowed_daily_ranges": correction["allowed_daily_ranges"],
+        "days_to_rewrite": [
+            {
+                "day": day,
+                "previous": draft["days"][day - 1],
+                "validation_errors": _day_errors(errors, day),
+            }
+            for day in days
+        ],
+    }
+    schema = {
+        "type": "object",
+        "required": ["days"],
+        "properties": {
+            "days": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "required": ["day", "meals"],
+                    "properties": {
+                        "day": {"type": "integer"},
+                        "meals": {"type": "array", "items": _diet_meal_schema(False)},
+                    },
+                },
+            },
+        },
+    }
+    system_instruction = """Você corrige dias de um plano alimentar em português a partir de metas calculadas pelo sistema.
+Reescreva somente os dias de days_to_rewrite, partindo de previous e corrigindo todos os validation_errors; os demais dias já foram aprovados.
+Cada dia tem exatamente a quantidade de refeições do questionnaire e totais dentro de allowed_daily_ranges. Some os macros do dia antes de responder.
+Nunca use itens de restrictionPolicy.prohibited e evite restrictionPolicy.avoid_when_possible. Retorne somente campos do schema."""
+    repaired = _generate_diet_json(system_instruction, payload, schema, "diet_repair")
+    return _merge_repaired_days(draft, days, repaired)
 
 
 def generate_diet_day(questionnaire: dict, profile, existing_meals: list, feedback: str, nutrition_targets: dict, correction=None) -> dict:
     payload = {
         "questionnaire": questionnaire,
-        "profile": _profile_context(profile),
+        "profile": profile_context(profile),
         "existing_meals": existing_meals,
         "requested_change": feedback,
         "nutritionTargets": nutrition_targets,
@@ -476,24 +781,28 @@ Os valores de nutritionTargets são restrições do sistema, não sugestões. N
 Use porções claras e estime calorias e macros de cada refeição. Respeite restrições, preferências e tempo de preparo.
 As estimativas não precisam ser milimétricas, mas o total diário deve ficar próximo das metas.
 Se correction existir, corrija exatamente as diferenças informadas. Não prescreva tratamento, suplementos ou dietas extremas."""
-    return _generate_diet_json(system_instruction, payload, schema)
+    return _generate_diet_json(system_instruction, payload, schema, "diet_day")
 
 
 def classify_exercise_catalog_key(exercise_name: str) -> str | None:
-    catalog = [{"key": item["key"], "name": item["name"]} for item in catalog_by_key().values()]
+    catalog, tokens_saved = classification_catalog_context()
     schema = {
         "type": "object",
         "required": ["catalog_key"],
         "properties": {"catalog_key": {"type": "string"}},
     }
     result = _json_object(_completion(
-        "Associe o exercício informado a uma chave do catálogo. Retorne uma string vazia se não houver correspondência segura.",
-        json.dumps({"exercise": exercise_name, "catalog": catalog}, ensure_ascii=False, separators=(",", ":")),
+        "Associe o exercício informado a uma chave do catálogo (objeto chave: nome). "
+        "Retorne uma string vazia se não houver correspondência segura.\ncatalog: " + catalog,
+        compact_json({"exercise": exercise_name}),
         256,
         0.0,
         json_response=True,
         model=current_app.config["GEMINI_STRUCTURED_MODEL"],
         json_schema=schema,
+        prompt_kind="exercise_classification",
+        tokens_saved=tokens_saved,
+        cache_instruction=True,
     ))
     catalog_key = result.get("catalog_key")
     return catalog_key if catalog_key in catalog_by_key() else None
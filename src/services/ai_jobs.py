@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Lock
+
+from flask import current_app, g, jsonify, request
+
+from src.models.user import AIJob, db
+
+
+class _AIJobPool:
+    """Bounded thread pool that runs AI generations outside the request threads."""
+
+    def __init__(self):
+        self._executor = None
+        self._lock = Lock()
+
+    def submit(self, app, job_id, work):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=app.config.get("AI_JOB_WORKERS", 2),
+                    thread_name_prefix="ai-job",
+                )
+        return self._executor.submit(self._run, app, job_id, work)
+
+    @staticmethod
+    def _run(app, job_id, work):
+        with app.app_context():
+            try:
+                run_ai_job(job_id, work)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("AI job %s could not be recorded", job_id)
+            finally:
+                db.session.remove()
+
+
+ai_job_pool = _AIJobPool()
+
+
+def _split_result(result):
+    payload, status_code, *rest = result
+    return payload, status_code, rest[0] if rest else {}
+
+
+def run_ai_job(job_id, work):
+    """Run ``work`` for a queued job and store its JSON payload and HTTP status."""
+    job = db.session.get(AIJob, job_id)
+    g.ai_user_id = job.user_id
+    job.status = "running"
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+    try:
+        payload, status_code, _ = _split_result(work())
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("AI job %s failed", job_id)
+        payload, status_code = {"error": "Não foi possível concluir a geração."}, 500
+    job = db.session.get(AIJob, job_id)
+    job.status = "succeeded" if status_code < 400 else "failed"
+    job.status_code = status_code
+    # Same encoding as the synchronous response (UUIDs, dates), so polling returns identical JSON.
+    job.result = current_app.json.loads(current_app.json.dumps(payload))
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+def wants_async():
+    return "respond-async" in request.headers.get("Prefer", "").lower()
+
+
+def ai_job_response(kind, user_id, work):
+    """Answer with ``work()`` now, or queue it when the client sent ``Prefer: respond-async``.
+
+    ``work`` returns ``(payload, status_code[, headers])`` and must only use ids captured
+    from the request: in the pool it runs in its own app context and session.
+    """
+    if not wants_async():
+        payload, status_code, headers = _split_result(work())
+        response = jsonify(payload)
+        response.status_code = status_code
+        response.headers.update(headers)
+        return response
+
+    job = AIJob(user_id=user_id, kind=kind)
+    db.session.add(job)
+    db.session.commit()
+    if current_app.config.get("AI_JOBS", "thread") == "thread":
+        ai_job_pool.submit(current_app._get_current_object(), job.id, work)
+    else:
+        run_ai_job(job.id, work)
+    response = jsonify({"job": job.to_dict()})
+    response.status_code = 202
+    response.headers["Location"] = f"/api/ai-jobs/{job.id}"
+    response.headers["Preference-Applied"] = "respond-async"
+    return response
+
+
+def expire_stale_job(job):
+    """Fail jobs whose worker disappeared (restart or crash) instead of polling forever."""
+    if job.status not in ("queued", "running"):
+        return job
+    limit = timedelta(seconds=current_app.config.get("AI_JOB_TIMEOUT", 900))
+    if job.created_at and datetime.utcnow() - job.created_at > limit:
+        job.status = "failed"
+        job.status_code = 504
+        job.result = {"error": "A geração demorou demais. Tente novamente."}
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    return job
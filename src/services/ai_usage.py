@@ -0,0 +1,134 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from flask import current_app, g
+from sqlalchemy import case, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from src.models.user import AIUsage, db
+
+
+def current_ai_user_id():
+    """User the current Gemini call is made for: the job owner or the logged-in user."""
+    user_id = g.get("ai_user_id")
+    if user_id is None and g.get("user") is not None:
+        user_id = g.user.id
+    return user_id
+
+
+def record_ai_call(feature, model, latency_ms, usage, finish_reason, outcome):
+    """Buffer one ledger row; ``flush_ai_usage`` writes them when the request or job ends.
+
+    ``attempt`` numbers the calls of the same feature within the request or job, so
+    retries (validation, truncation, fallback model) show up as attempt > 1.
+    """
+    attempts = g.setdefault("ai_attempts", {})
+    attempts[feature] = attempts.get(feature, 0) + 1
+    g.setdefault("ai_usage", []).append({
+        "created_at": datetime.utcnow(),
+        "feature": feature,
+        "model": model or "",
+        "user_id": current_ai_user_id(),
+        "attempt": attempts[feature],
+        "latency_ms": round(latency_ms, 1),
+        "prompt_tokens": getattr(usage, "prompt_token_count", None) or 0,
+        "cached_tokens": getattr(usage, "cached_content_token_count", None) or 0,
+        "output_tokens": getattr(usage, "candidates_token_count", None) or 0,
+        "finish_reason": (finish_reason or None) and str(finish_reason)[:40],
+        "outcome": outcome,
+    })
+
+
+def flush_ai_usage(_error=None):
+    """Write the buffered rows in their own session, never committing the view's changes."""
+    rows = g.pop("ai_usage", None)
+    g.pop("ai_attempts", None)
+    if not rows:
+        return
+    try:
+        with Session(db.engine) as session:
+            session.add_all(AIUsage(**row) for row in rows)
+            session.commit()
+    except SQLAlchemyError:
+        current_app.logger.warning("Could not store %s AI usage rows", len(rows), exc_info=True)
+
+
+def init_ai_usage(app):
+    # Requests flush before their response is torn down; jobs and worker threads,
+    # which only have an app context, flush when it ends.
+    app.teardown_request(flush_ai_usage)
+    app.teardown_appcontext(flush_ai_usage)
+
+
+def _percentile(query, count, fraction):
+    """Nearest-rank percentile of ``AIUsage.latency_ms`` over ``query``, read from the database."""
+    if not count:
+        return 0.0
+    index = max(math.ceil(fraction * count) - 1, 0)
+    value = query.with_entities(AIUsage.latency_ms).order_by(AIUsage.latency_ms).offset(index).limit(1).scalar()
+    return round(value or 0.0, 1)
+
+
+def ai_usage_summary(days=7):
+    """Calls, retries, outcomes, latency percentiles and tokens per feature and model.
+
+    Aggregates in SQL per feature, model and day; only the percentiles need one
+    small ordered query per feature and model.
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    recent = AIUsage.query.filter(AIUsage.created_at >= since)
+    day = func.date(AIUsage.created_at)
+    daily = (
+        recent.with_entities(
+            AIUsage.feature,
+            AIUsage.model,
+            day,
+            func.count(),
+            func.sum(case((AIUsage.attempt > 1, 1), else_=0)),
+            func.sum(AIUsage.prompt_tokens),
+            func.sum(AIUsage.cached_tokens),
+            func.sum(AIUsage.output_tokens),
+        )
+        .group_by(AIUsage.feature, AIUsage.model, day)
+        .order_by(day)
+    )
+    groups = defaultdict(lambda: {
+        "calls": 0,
+        "retries": 0,
+        "prompt_tokens": 0,
+        "cached_tokens": 0,
+        "output_tokens": 0,
+        "outcomes": {},
+        "daily": [],
+    })
+    for feature, model, date, calls, retries, prompt_tokens, cached_tokens, output_tokens in daily:
+        group = groups[(feature, model)]
+        totals = {
+            "calls": calls,
+            "retries": int(retries or 0),
+            "prompt_tokens": int(prompt_tokens or 0),
+            "cached_tokens": int(cached_tokens or 0),
+            "output_tokens": int(output_tokens or 0),
+        }
+        for key, value in totals.items():
+            group[key] += value
+        group["daily"].append({"day": str(date), **totals})
+    outcomes = recent.with_entities(AIUsage.feature, AIUsage.model, AIUsage.outcome, func.count()).group_by(
+        AIUsage.feature, AIUsage.model, AIUsage.outcome
+    )
+    for feature, model, outcome, count in outcomes:
+        groups[(feature, model)]["outcomes"][outcome] = count
+    summary = []
+    for (feature, model), group in sorted(groups.items()):
+        latencies = recent.filter(AIUsage.feature == feature, AIUsage.model == model)
+        summary.append({
+            "feature": feature,
+            "model": model,
+            **group,
+            "latency_ms_p50": _percentile(latencies, group["calls"], 0.5),
+            "latency_ms_p95": _percentile(latencies, group["calls"], 0.95),
+            "avg_output_tokens": round(group["output_tokens"] / group["calls"], 1),
+        })
+    return {"days": days, "since": since.isoformat(), "features": summary}
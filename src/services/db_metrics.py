@@ -0,0 +1,151 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from threading import Lock
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class _EndpointStats:
+    def __init__(self):
+        self._stats = defaultdict(lambda: {
+            "requests": 0,
+            "queries": 0,
+            "max_queries": 0,
+            "db_ms": 0.0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+        })
+        self._lock = Lock()
+
+    def record(self, endpoint, queries, db_ms, total_ms):
+        with self._lock:
+            stats = self._stats[endpoint]
+            stats["requests"] += 1
+            stats["queries"] += queries
+            stats["max_queries"] = max(stats["max_queries"], queries)
+            stats["db_ms"] += db_ms
+            stats["total_ms"] += total_ms
+            stats["max_ms"] = max(stats["max_ms"], total_ms)
+
+    def snapshot(self):
+        with self._lock:
+            items = {endpoint: dict(stats) for endpoint, stats in self._stats.items()}
+        for stats in items.values():
+            count = stats["requests"]
+            stats["avg_queries"] = round(stats["queries"] / count, 2)
+            stats["avg_db_ms"] = round(stats["db_ms"] / count, 2)
+            stats["avg_ms"] = round(stats["total_ms"] / count, 2)
+            for key in ("db_ms", "total_ms", "max_ms"):
+                stats[key] = round(stats[key], 2)
+        return items
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+_state = _EndpointStats()
+
+
+class QueryCounter:
+    """Counts statements and database time for one request or ``count_queries`` block."""
+
+    def __init__(self):
+        self.count = 0
+        self.db_seconds = 0.0
+        self.statements = []
+
+    def add(self, statement, seconds):
+        self.count += 1
+        self.db_seconds += seconds
+        self.statements.append(statement)
+
+
+# Counters opened by ``count_queries``; they see every statement, in or out of a request.
+_listeners = []
+_listeners_lock = Lock()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, _cursor, _statement, _parameters, _context, _executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _record(conn, statement):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for counter in listeners:
+        counter.add(statement, seconds)
+    if has_request_context():
+        counter = g.get("db_metrics")
+        if counter is not None:
+            counter.add(statement, seconds)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _stop_timer(conn, _cursor, statement, _parameters, _context, _executemany):
+    _record(conn, statement)
+
+
+@event.listens_for(Engine, "handle_error")
+def _stop_failed_timer(context):
+    # A failing statement never reaches after_cursor_execute; still count it and
+    # drop its start time so the list does not grow on pooled connections.
+    if context.connection is not None and context.statement is not None:
+        _record(context.connection, context.statement)
+
+
+@contextmanager
+def count_queries():
+    """Collect every statement issued inside the block."""
+    counter = QueryCounter()
+    with _listeners_lock:
+        _listeners.append(counter)
+    try:
+        yield counter
+    finally:
+        with _listeners_lock:
+            _listeners.remove(counter)
+
+
+def init_db_metrics(app):
+    """Count queries per request, aggregate them per endpoint and optionally expose headers.
+
+    ``DB_METRICS_HEADERS`` adds ``X-DB-Queries``, ``X-DB-Time-Ms`` and ``X-Response-Time-Ms``
+    to every response; it is meant for development and is off by default.
+    """
+
+    @app.before_request
+    def start_request_metrics():
+        g.db_metrics = QueryCounter()
+        g.db_metrics_started = time.perf_counter()
+
+    @app.after_request
+    def finish_request_metrics(response):
+        counter = g.pop("db_metrics", None)
+        if counter is None:
+            return response
+        total_ms = (time.perf_counter() - g.pop("db_metrics_started")) * 1000
+        db_ms = counter.db_seconds * 1000
+        endpoint = request.endpoint or "unmatched"
+        _state.record(endpoint, counter.count, db_ms, total_ms)
+        if app.config.get("DB_METRICS_HEADERS"):
+            response.headers["X-DB-Queries"] = str(counter.count)
+            response.headers["X-DB-Time-Ms"] = f"{db_ms:.2f}"
+            response.headers["X-Response-Time-Ms"] = f"{total_ms:.2f}"
+        return response
+
+
+def metrics_snapshot():
+    return _state.snapshot()
+
+
+def reset_metrics():
+    _state.reset()
@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+from flask import current_app, g
+
+from src.services.ai import AIResponseError, profile_context
+from src.services.ai_usage import current_ai_user_id
+from src.services.diet_plans import correction_feedback, normalize_diet_day
+from src.services.workout_plans import PlanValidationError
+
+
+ROTATION_DAYS = 3
+
+# Each day is written without seeing the others, so a brief per day keeps the rotation varied.
+DAY_BRIEFS = (
+    "refeições clássicas do dia a dia",
+    "preparações práticas de forno ou panela única",
+    "combinações leves e frescas",
+)
+
+
+def _day_brief(day):
+    return (
+        f"Crie o dia {day} de {ROTATION_DAYS} de uma rotação alimentar, com foco em {DAY_BRIEFS[day - 1]}. "
+        "Use fontes de proteína e preparações diferentes das dos outros dias."
+    )
+
+
+def _generate_day(app, user_id, generate_day, questionnaire, profile, targets, day):
+    """One rotating day, validated on its own; the last draft is returned even if invalid."""
+    with app.app_context():
+        g.ai_user_id = user_id
+        attempts = max(1, app.config["GEMINI_DIET_VALIDATION_ATTEMPTS"])
+        generated = correction = None
+        for attempt in range(1, attempts + 1):
+            try:
+                generated = generate_day(questionnaire, profile, [], _day_brief(day), targets, correction)
+                normalize_diet_day(generated, questionnaire, targets)
+                break
+            except PlanValidationError as error:
+                app.logger.warning(
+                    "Invalid generated diet day %s (attempt %s/%s): %s",
+                    day,
+                    attempt,
+                    attempts,
+                    list(error.errors)[:8],
+                )
+                correction = correction_feedback(error, generated, targets)
+            except AIResponseError:
+                app.logger.warning("Diet day %s AI returned invalid output (attempt %s/%s)", day, attempt, attempts)
+                if attempt == attempts:
+                    raise
+        return {"meals": generated.get("meals")} if isinstance(generated, dict) else None
+
+
+def generate_diet_days(questionnaire, profile, nutrition_targets, generate_day):
+    """Write the rotating days concurrently with ``generate_day`` and merge them in day order.
+
+    Returns a ``diet_plan`` draft for ``normalize_diet_output``: a day still invalid
+    after its own attempts is reported there as ``days.N`` and can be repaired alone.
+    The worker threads get a plain copy of ``profile``, never the ORM instance.
+    """
+    app = current_app._get_current_object()
+    profile = profile_context(profile)
+    user_id = current_ai_user_id()
+    workers = max(1, min(ROTATION_DAYS, app.config["GEMINI_DIET_DAY_WORKERS"]))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="diet-day") as executor:
+        # copy_context keeps the caller's token meter counting the days' Gemini calls.
+        futures = [
+            executor.submit(
+                copy_context().run,
+                _generate_day,
+                app,
+                user_id,
+                generate_day,
+                questionnaire,
+                profile,
+                nutrition_targets,
+                day,
+            )
+            for day in range(1, ROTATION_DAYS + 1)
+        ]
+        days = [future.result() for future in futures]
+    return {"type": "diet_plan", "days": days}
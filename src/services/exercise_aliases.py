@@ -0,0 +1,161 @@
+from threading import Lock
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from src.models.user import ExerciseAlias, db
+from src.services.workout_plans import catalog_aliases, catalog_by_key, normalize_exercise_name
+
+
+_STOPWORDS = {"a", "o", "com", "de", "da", "do", "e", "em", "na", "no"}
+# A fuzzy match must be close and clearly ahead of the best other exercise.
+FUZZY_MIN_SCORE = 0.75
+FUZZY_MIN_MARGIN = 0.1
+# Length of ``exercise_alias.name``; memory and table use the same truncated key.
+ALIAS_NAME_LENGTH = 160
+
+
+def _tokens(name):
+    tokens = []
+    for word in name.split():
+        if word in _STOPWORDS:
+            continue
+        if word.endswith("es") and len(word) > 5:
+            word = word[:-2]
+        elif word.endswith("s") and len(word) > 3:
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _trigrams(tokens):
+    text = f" {' '.join(tokens)} "
+    return {text[index:index + 3] for index in range(len(text) - 2)}
+
+
+def _dice(left, right):
+    return 2 * len(left & right) / (len(left) + len(right)) if left and right else 0.0
+
+
+def name_similarity(left, right):
+    """Mean of trigram and token Dice similarity between two normalized names."""
+    left_tokens, right_tokens = _tokens(left), _tokens(right)
+    return (
+        _dice(_trigrams(left_tokens), _trigrams(right_tokens))
+        + _dice(set(left_tokens), set(right_tokens))
+    ) / 2
+
+
+def fuzzy_catalog_match(name, aliases=None):
+    """Catalog exercise whose name or alias is clearly the closest to ``name``, else None."""
+    name = normalize_exercise_name(name)
+    if not name:
+        return None
+    best = {}
+    for alias, exercise in (aliases if aliases is not None else catalog_aliases()).items():
+        score = name_similarity(name, alias)
+        if score > best.get(exercise["key"], (0.0, None))[0]:
+            best[exercise["key"]] = (score, exercise)
+    ranked = sorted(best.values(), key=lambda item: item[0], reverse=True)
+    if not ranked or ranked[0][0] < FUZZY_MIN_SCORE:
+        return None
+    if len(ranked) > 1 and ranked[0][0] - ranked[1][0] < FUZZY_MIN_MARGIN:
+        return None
+    return ranked[0][1]
+
+
+class ExerciseAliasStore:
+    """Learned name → catalog key mappings of one app, backed by ``exercise_alias``.
+
+    The table is read once per process and single rows are looked up on a miss, so
+    aliases learned by other workers are found without reloading everything.
+    """
+
+    def __init__(self):
+        self._aliases = {}
+        self._merged = None
+        self._loaded = False
+        self._lock = Lock()
+
+    def merged(self, static):
+        with self._lock:
+            if self._merged is None:
+                catalog = catalog_by_key()
+                self._merged = {
+                    **{name: catalog[key] for name, key in self._aliases.items() if key in catalog},
+                    **static,
+                }
+            return self._merged
+
+    def _add(self, name, catalog_key):
+        with self._lock:
+            self._aliases[name] = catalog_key
+            self._merged = None
+
+    def load(self):
+        if self._loaded:
+            return
+        rows = ExerciseAlias.query.all()
+        with self._lock:
+            self._aliases.update({row.name: row.catalog_key for row in rows})
+            self._merged = None
+            self._loaded = True
+
+    def lookup(self, name):
+        row = db.session.get(ExerciseAlias, name[:ALIAS_NAME_LENGTH])
+        if row is None:
+            return None
+        self._add(row.name, row.catalog_key)
+        return catalog_by_key().get(row.catalog_key)
+
+    def remember(self, name, catalog_key, source):
+        """Learn an alias in its own transaction, never committing the caller's session."""
+        name = (name or "")[:ALIAS_NAME_LENGTH]
+        if not name or name in catalog_aliases() or catalog_key not in catalog_by_key():
+            return
+        self._add(name, catalog_key)
+        try:
+            with Session(db.engine) as session:
+                session.merge(ExerciseAlias(name=name, catalog_key=catalog_key, source=source))
+                session.commit()
+        except SQLAlchemyError:
+            current_app.logger.warning("Could not store exercise alias %r", name, exc_info=True)
+
+
+_create_lock = Lock()
+
+
+def exercise_alias_store():
+    store = current_app.extensions.get("exercise_aliases")
+    if store is None:
+        with _create_lock:
+            store = current_app.extensions.get("exercise_aliases")
+            if store is None:
+                store = ExerciseAliasStore()
+                current_app.extensions["exercise_aliases"] = store
+    return store
+
+
+def resolve_exercise_name(name):
+    """Catalog exercise for a free-text name without asking the AI, or None.
+
+    Tries the catalog and learned aliases, the ``exercise_alias`` table and then the
+    fuzzy matcher; fuzzy matches are learned so the next lookup is exact.
+    """
+    store = exercise_alias_store()
+    store.load()
+    normalized = normalize_exercise_name(name)
+    if not normalized:
+        return None
+    exercise = catalog_aliases().get(normalized) or store.lookup(normalized)
+    if exercise is not None:
+        return exercise
+    exercise = fuzzy_catalog_match(normalized)
+    if exercise is not None:
+        store.remember(normalized, exercise["key"], "fuzzy")
+    return exercise
+
+
+def remember_exercise_alias(name, catalog_key, source):
+    exercise_alias_store().remember(normalize_exercise_name(name), catalog_key, source)
@@ -0,0 +1,247 @@
+import difflib
+import json
+import re
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+
+
+FOOD_TABLE_PATH = Path(__file__).resolve().parents[2] / "copilot" / "minha-pasta" / "alimentos.json"
+
+_STOPWORDS = {"a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "na", "no", "tipo"}
+# Preparation words a description may omit without changing the intended food.
+_NEUTRAL = {
+    "cozido", "cozida", "cru", "crua", "assado", "assada", "inteiro", "inteira", "natural", "fresco", "fresca",
+}
+_RAW = {"cru", "crua"}
+
+# Entries used when a generic name ("arroz", "peito de frango") matches several foods.
+PREFERRED_FOODS = (
+    "Arroz, tipo 1, cozido",
+    "Feijão, carioca, cozido",
+    "Frango, peito, sem pele, grelhado",
+    "Carne, bovina, patinho, sem gordura, grelhado",
+    "Ovo, de galinha, inteiro, cozido/10minutos",
+    "Pão, trigo, francês",
+    "Banana, prata, crua",
+    "Maçã, Fuji, com casca, crua",
+    "Laranja, pêra, crua",
+    "Batata, inglesa, cozida",
+    "Aveia, flocos, crua",
+    "Azeite, de oliva, extra virgem",
+    "Manteiga, com sal",
+    "Queijo, minas, frescal",
+)
+
+# Grams per household measure; "unit" measures depend on the food (see UNIT_WEIGHTS).
+MEASURES = (
+    (r"kg|quilos?", 1000),
+    (r"g|gr|gramas?", 1),
+    (r"ml", 1),
+    (r"l|litros?", 1000),
+    (r"colher(?:es)? de cha", 5),
+    (r"colher(?:es)? de sobremesa", 10),
+    (r"colher(?:es)?(?: de sopa)?", 15),
+    (r"fatias?", 25),
+    (r"conchas?", 100),
+    (r"xicaras?", 240),
+    (r"copos?", 200),
+    (r"unidades?|un", None),
+)
+
+# Edible grams of one unit, by prefix of the normalized food description (first match wins).
+UNIT_WEIGHTS = (
+    ("pao de queijo", 20),
+    ("pao trigo frances", 50),
+    ("ovo de codorna", 10),
+    ("ovo", 50),
+    ("banana", 80),
+    ("maca", 130),
+    ("laranja", 150),
+)
+
+_WORD_NUMBERS = {"um": 1, "uma": 1, "meio": 0.5, "meia": 0.5, "dois": 2, "duas": 2, "tres": 3,
+                 "quatro": 4, "cinco": 5, "seis": 6}
+_AMOUNT = r"\d+(?:[.,]\d+)?|" + "|".join(_WORD_NUMBERS)
+_UNIT = "|".join(f"(?:{pattern})" for pattern, _ in MEASURES)
+_LEADING = re.compile(rf"^(?P<amount>{_AMOUNT})\s*(?P<unit>{_UNIT})?\s+(?:(?:de|do|da)\s+)?(?P<food>.+)$")
+_TRAILING = re.compile(rf"^(?P<food>.+?)\s+(?P<amount>{_AMOUNT})\s*(?P<unit>{_UNIT})$")
+_SEPARATORS = re.compile(r"\s*(?:[;+\n]|,(?!\d)|\be\b)\s*")
+
+
+def _fold(value):
+    value = unicodedata.normalize("NFKD", str(value or ""))
+    return "".join(char for char in value if not unicodedata.combining(char)).lower()
+
+
+def _stem(token):
+    if token.endswith(("oes", "aes")):
+        return token[:-3] + "ao"
+    if token.endswith("s") and len(token) > 3:
+        return token[:-1]
+    return token
+
+
+def _tokens(text):
+    words = re.sub(r"[^a-z0-9]+", " ", _fold(text)).split()
+    return [_stem(word) for word in words if word not in _STOPWORDS]
+
+
+class _Food:
+    __slots__ = ("description", "key", "tokens", "head", "per_100g", "position")
+
+    def __init__(self, item, position):
+        self.description = item["descricao"]
+        self.key = " ".join(re.sub(r"[^a-z0-9]+", " ", _fold(self.description)).split())
+        words = _tokens(self.description)
+        self.tokens = set(words)
+        # The food itself ("Frango" in "Frango, peito, sem pele, grelhado"); the rest qualifies it.
+        self.head = words[0] if words else None
+        self.per_100g = {
+            "calories": float(item["calorias"]),
+            "protein": float(item["proteina"]),
+            "carbs": float(item["carboidrato"]),
+            "fat": float(item["gordura"]),
+        }
+        self.position = position
+
+    def unit_weight(self):
+        return next((grams for prefix, grams in UNIT_WEIGHTS if self.key.startswith(prefix)), None)
+
+
+class FoodIndex:
+    """Accent-insensitive token index over the per-100 g table, with typo tolerance."""
+
+    def __init__(self, items):
+        self.foods = []
+        self._postings = defaultdict(set)
+        for item in items:
+            try:
+                food = _Food(item, len(self.foods))
+            except (KeyError, TypeError, ValueError):
+                continue
+            # Zeroed rows are gaps in the source table, not zero-calorie foods.
+            if food.per_100g["calories"] <= 0:
+                continue
+            self.foods.append(food)
+            for token in food.tokens:
+                self._postings[token].add(food.position)
+        self._vocabulary = sorted(self._postings)
+        self._preferred = {_fold(name) for name in PREFERRED_FOODS}
+
+    def _resolve_token(self, token):
+        if token in self._postings:
+            return token
+        if len(token) < 4 or token.isdigit():
+            return None
+        matches = difflib.get_close_matches(token, self._vocabulary, n=1, cutoff=0.8)
+        return matches[0] if matches else None
+
+    def match(self, text):
+        """Best food containing every word of ``text``, or None when it is ambiguous."""
+        query = []
+        for token in _tokens(text):
+            resolved = self._resolve_token(token)
+            if resolved is None:
+                return None
+            query.append(resolved)
+        if not query:
+            return None
+        positions = set.intersection(*(self._postings[token] for token in query))
+        wanted = set(query)
+        candidates = []
+        for position in positions:
+            food = self.foods[position]
+            extras = {token for token in food.tokens - wanted if not any(char.isdigit() for char in token)}
+            preferred = _fold(food.description) in self._preferred
+            # A preferred entry stands in for its food's unqualified name ("frango"), so its
+            # qualifiers are only implied when the query names that food, not one of them ("sal").
+            if extras - _NEUTRAL and not (preferred and food.head in wanted):
+                continue
+            raw_penalty = bool(food.tokens & _RAW) and not wanted & _RAW
+            candidates.append((not preferred, raw_penalty, len(extras), food.position, food))
+        return min(candidates, key=lambda candidate: candidate[:4])[-1] if candidates else None
+
+
+@lru_cache(maxsize=4)
+def food_index(path=FOOD_TABLE_PATH):
+    with Path(path).open(encoding="utf-8") as table_file:
+        return FoodIndex(json.load(table_file))
+
+
+def _amount(value):
+    value = _fold(value)
+    if value in _WORD_NUMBERS:
+        return _WORD_NUMBERS[value]
+    return float(value.replace(",", "."))
+
+
+def _grams(amount, unit, food):
+    if unit:
+        for pattern, grams in MEASURES:
+            if re.fullmatch(pattern, unit):
+                break
+        if grams is not None:
+            return amount * grams
+    weight = food.unit_weight()
+    return amount * weight if weight else None
+
+
+def parse_food_item(text, index=None):
+    """``(food, grams)`` for one quantified item such as "150 g de arroz", else None."""
+    index = index or food_index()
+    folded = " ".join(_fold(text).split())
+    quantity = _LEADING.match(folded) or _TRAILING.match(folded)
+    if quantity is None:
+        return None
+    food = index.match(quantity["food"])
+    if food is None:
+        return None
+    grams = _grams(_amount(quantity["amount"]), quantity["unit"], food)
+    if not grams or grams <= 0:
+        return None
+    return food, grams
+
+
+def local_nutrition(description, index=None):
+    """Macros for the items of ``description`` found in the food table.
+
+    Returns ``(estimate, remainder)``: ``estimate`` sums the resolved items (None when
+    none resolved) and ``remainder`` is the text of the items left for the AI.
+    """
+    index = index or food_index()
+    totals = dict.fromkeys(("calories", "protein", "carbs", "fat"), 0.0)
+    items, remainder = [], []
+    for part in _SEPARATORS.split(description or ""):
+        if not part.strip():
+            continue
+        parsed = parse_food_item(part, index)
+        if parsed is None:
+            remainder.append(part.strip())
+            continue
+        food, grams = parsed
+        for field, per_100g in food.per_100g.items():
+            totals[field] += per_100g * grams / 100
+        items.append({"food": food.description, "grams": round(grams, 1)})
+    if not items:
+        return None, ", ".join(remainder)
+    estimate = {field: round(value, 1) for field, value in totals.items()}
+    estimate.update(precision="alta", items=items)
+    return estimate, ", ".join(remainder)
+
+
+def combine_nutrition(local, estimate):
+    """Merge the table estimate with the AI estimate for the remaining items."""
+    if local is None:
+        return {**estimate, "source": "ai"}
+    combined = {
+        field: round(local[field] + float(estimate[field]), 1)
+        for field in ("calories", "protein", "carbs", "fat")
+    }
+    combined.update(
+        precision="alta" if estimate.get("precision") == "alta" else "moderada",
+        items=local["items"],
+        source="mixed",
+    )
+    return combined
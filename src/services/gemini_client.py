@@ -0,0 +1,174 @@
+import hashlib
+import os
+import time
+from threading import Lock
+
+from google import genai
+from google.genai import types
+
+
+class _ConnectionMetrics:
+    """Counts requests, new connections and TCP/TLS setup time across pooled clients."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.connections = 0
+            self.handshake_ms = 0.0
+
+    def request_started(self):
+        with self._lock:
+            self.requests += 1
+
+    def handshake(self, elapsed_ms, opened):
+        with self._lock:
+            self.connections += int(opened)
+            self.handshake_ms += elapsed_ms
+
+    def snapshot(self):
+        with self._lock:
+            reused = max(self.requests - self.connections, 0)
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections,
+                "connections_reused": reused,
+                "reuse_ratio": round(reused / self.requests, 3) if self.requests else 0.0,
+                "handshake_ms_total": round(self.handshake_ms, 3),
+                "handshake_ms_avg": (
+                    round(self.handshake_ms / self.connections, 3) if self.connections else 0.0
+                ),
+            }
+
+
+_metrics = _ConnectionMetrics()
+
+
+def _trace_request(request):
+    _metrics.request_started()
+    started = {}
+
+    # httpcore reports connection setup as "connection.<step>.started/.complete" pairs;
+    # they only fire when the pool has no idle connection to reuse.
+    def trace(event_name, _info):
+        step, _, phase = event_name.rpartition(".")
+        if step not in ("connection.connect_tcp", "connection.start_tls"):
+            return
+        if phase == "started":
+            started[step] = time.perf_counter()
+        elif phase == "complete" and step in started:
+            elapsed_ms = (time.perf_counter() - started.pop(step)) * 1000
+            _metrics.handshake(elapsed_ms, opened=step == "connection.connect_tcp")
+
+    request.extensions["trace"] = trace
+
+
+class _ClientPool:
+    """One long-lived ``genai.Client`` per (API key, timeout, base URL) and process.
+
+    Each client owns an httpx connection pool with keep-alive; httpx clients are
+    thread-safe, so gthread workers share them. A forked worker starts a new pool
+    instead of reusing sockets inherited from its parent.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._pid = os.getpid()
+        self._lock = Lock()
+
+    def get(self, api_key, timeout_ms, base_url=None):
+        key = (api_key, timeout_ms, base_url)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._clients = {}
+                self._pid = os.getpid()
+            client = self._clients.get(key)
+            if client is None:
+                client = genai.Client(
+                    api_key=api_key,
+                    http_options=types.HttpOptions(
+                        timeout=timeout_ms,
+                        base_url=base_url,
+                        client_args={"event_hooks": {"request": [_trace_request]}},
+                    ),
+                )
+                self._clients[key] = client
+            return client
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.close()
+
+
+_pool = _ClientPool()
+
+
+class _ContextCaches:
+    """Gemini cached contents holding long, static system instructions.
+
+    Entries are refreshed a minute before the server-side TTL ends. A failed
+    creation (model without explicit caching, instruction below the minimum
+    size) is remembered for the same TTL so calls do not retry it every time.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = Lock()
+
+    def get(self, client, model, system_instruction, ttl_seconds):
+        digest = hashlib.sha256(system_instruction.encode()).hexdigest()
+        key = (id(client), model, digest)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        try:
+            cache = client.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_instruction,
+                    ttl=f"{ttl_seconds}s",
+                    display_name=f"prompt-{digest[:16]}",
+                ),
+            )
+            name, expires = cache.name, now + max(ttl_seconds - 60, 1)
+        except Exception:
+            name, expires = None, now + ttl_seconds
+        with self._lock:
+            self._entries[key] = (name, expires)
+        return name
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+
+_context_caches = _ContextCaches()
+
+
+def gemini_client(api_key, timeout_ms, base_url=None):
+    return _pool.get(api_key, timeout_ms, base_url)
+
+
+def cached_context(client, model, system_instruction, ttl_seconds):
+    """Name of a cached content for ``system_instruction`` on ``model``, or None."""
+    return _context_caches.get(client, model, system_instruction, ttl_seconds)
+
+
+def close_gemini_clients():
+    _pool.close()
+    _context_caches.clear()
+
+
+def connection_metrics():
+    return _metrics.snapshot()
+
+
+def reset_connection_metrics():
+    _metrics.reset()
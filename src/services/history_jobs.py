@@ -0,0 +1,146 @@
+from datetime import datetime
+from queue import Queue
+from threading import Lock, Thread
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from src.models.user import User, WorkoutHistoryState, db
+from src.services.achievements import evaluate_achievements
+from src.services.activities import store_missing_summaries
+from src.services.personal_records import backfill_personal_records
+from src.services.workout_progress import (
+    backfill_session_weeks,
+    confirmed_user_timezone,
+    rebuild_week_counts,
+)
+
+
+def mark_history_dirty(user_id):
+    """Flag a user's derived workout history (PRs, weeks, achievements) for reprocessing."""
+    state = db.session.get(WorkoutHistoryState, user_id)
+    if state is None:
+        try:
+            with db.session.begin_nested():
+                state = WorkoutHistoryState(user_id=user_id, dirty_at=datetime.utcnow())
+                db.session.add(state)
+            return state
+        except IntegrityError:
+            state = db.session.get(WorkoutHistoryState, user_id, populate_existing=True)
+    state.dirty_at = datetime.utcnow()
+    return state
+
+
+def history_is_dirty(user_id):
+    return db.session.query(
+        db.session.query(WorkoutHistoryState)
+        .filter(
+            WorkoutHistoryState.user_id == user_id,
+            WorkoutHistoryState.dirty_at.isnot(None),
+        )
+        .exists()
+    ).scalar()
+
+
+def dirty_history_user_ids(limit=None):
+    query = (
+        db.session.query(WorkoutHistoryState.user_id)
+        .filter(WorkoutHistoryState.dirty_at.isnot(None))
+        .order_by(WorkoutHistoryState.dirty_at)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return [user_id for user_id, in query]
+
+
+def process_user_history(user_id):
+    """Run the PR, week, achievement and summary backfill once and clear the marker.
+
+    The marker is only cleared when it was not raised again while the job ran, so a
+    write that lands mid-backfill is picked up by the next run.
+    """
+    started_at = datetime.utcnow()
+    if User.query.filter_by(id=user_id).with_for_update().first() is None:
+        db.session.rollback()
+        return False
+    backfill_personal_records(user_id)
+    timezone_name = confirmed_user_timezone(user_id)
+    if timezone_name:
+        backfill_session_weeks(user_id, timezone_name)
+    rebuild_week_counts(user_id)
+    evaluate_achievements(user_id, backfilled=True)
+    store_missing_summaries(user_id)
+    WorkoutHistoryState.query.filter(
+        WorkoutHistoryState.user_id == user_id,
+        WorkoutHistoryState.dirty_at <= started_at,
+    ).update({"dirty_at": None, "processed_at": datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    return True
+
+
+def process_dirty_histories(limit=None):
+    processed = 0
+    for user_id in dirty_history_user_ids(limit):
+        try:
+            processed += process_user_history(user_id)
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception("Workout history backfill failed for %s", user_id)
+    return processed
+
+
+class _HistoryQueue:
+    """Single background thread that runs each queued user's backfill once."""
+
+    def __init__(self):
+        self._queue = Queue()
+        self._pending = set()
+        self._lock = Lock()
+        self._thread = None
+
+    def submit(self, app, user_id):
+        with self._lock:
+            if user_id in self._pending:
+                return False
+            self._pending.add(user_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._run, name="workout-history", daemon=True)
+                self._thread.start()
+        self._queue.put((app, user_id))
+        return True
+
+    def join(self):
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            app, user_id = self._queue.get()
+            try:
+                with app.app_context():
+                    try:
+                        process_user_history(user_id)
+                    except Exception:
+                        db.session.rollback()
+                        app.logger.exception("Workout history backfill failed for %s", user_id)
+                    finally:
+                        db.session.remove()
+            finally:
+                with self._lock:
+                    self._pending.discard(user_id)
+                self._queue.task_done()
+
+
+history_queue = _HistoryQueue()
+
+
+def schedule_history_backfill(user_id):
+    """Queue a backfill for dirty users without touching the database for writes.
+
+    With ``WORKOUT_HISTORY_JOBS = "worker"`` the marker is left for the
+    ``flask process-workout-history`` command instead of the in-process thread.
+    """
+    if not history_is_dirty(user_id):
+        return False
+    if current_app.config.get("WORKOUT_HISTORY_JOBS", "thread") != "thread":
+        return False
+    return history_queue.submit(current_app._get_current_object(), user_id)
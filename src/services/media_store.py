@@ -0,0 +1,136 @@
+import os
+import tempfile
+from pathlib import Path
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.models.user import ExerciseMediaBlob, db
+
+
+class MediaStoreError(Exception):
+    """The durable media tier could not read or write; the caller goes to WorkoutX."""
+
+
+class DirectoryStore:
+    """Durable tier in a directory, e.g. a mounted volume or a synced bucket.
+
+    Stands in for an object store: any class with the same ``get``/``put`` can be
+    returned by ``create_media_store``.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def get(self, name):
+        try:
+            return (self.path / name).read_bytes()
+        except FileNotFoundError:
+            return None
+        except OSError as error:
+            raise MediaStoreError(str(error)) from error
+
+    def put(self, name, data):
+        try:
+            write_atomically(self.path / name, data)
+        except OSError as error:
+            raise MediaStoreError(str(error)) from error
+
+
+class DatabaseStore:
+    """Durable tier in ``exercise_media_blob``, written in its own short transactions."""
+
+    def get(self, name):
+        try:
+            with Session(db.engine) as session:
+                blob = session.get(ExerciseMediaBlob, name)
+                return None if blob is None else bytes(blob.data)
+        except Exception as error:
+            raise MediaStoreError(str(error)) from error
+
+    def put(self, name, data):
+        try:
+            with Session(db.engine) as session:
+                session.add(ExerciseMediaBlob(name=name, data=data, size=len(data)))
+                session.commit()
+        except IntegrityError:
+            # Another worker stored the same GIF first.
+            return
+        except Exception as error:
+            raise MediaStoreError(str(error)) from error
+
+
+def create_media_store(config):
+    """Durable tier named by ``WORKOUTX_DURABLE_STORE``: none (default), db or dir."""
+    name = (config.get("WORKOUTX_DURABLE_STORE") or "none").lower()
+    if name == "none":
+        return None
+    if name == "db":
+        return DatabaseStore()
+    if name == "dir":
+        path = config.get("WORKOUTX_DURABLE_DIR")
+        if not path:
+            raise ValueError("WORKOUTX_DURABLE_DIR is required when WORKOUTX_DURABLE_STORE=dir")
+        return DirectoryStore(path)
+    raise ValueError(f"Unknown WORKOUTX_DURABLE_STORE: {name}")
+
+
+def write_atomically(path, data):
+    """Write ``data`` to ``path`` through a temporary file, so readers never see half a file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}-", suffix=".tmp")
+    temporary_path = Path(temporary_name)
+    try:
+        with os.fdopen(descriptor, "wb") as temporary_file:
+            temporary_file.write(data)
+        temporary_path.replace(path)
+    finally:
+        temporary_path.unlink(missing_ok=True)
+
+
+def enforce_size_limit(directory, max_bytes, keep=None):
+    """Delete the least recently used GIFs of ``directory`` until it fits ``max_bytes``.
+
+    Recency is the file's mtime, which cache hits refresh. ``keep`` (the file just
+    written) is never deleted. Files another worker removed first are not counted,
+    and files that cannot be deleted are logged and skipped. Returns the number of
+    files this call deleted.
+    """
+    if not max_bytes:
+        return 0
+    entries = []
+    total = 0
+    try:
+        with os.scandir(directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith(".gif"):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+                total += stat.st_size
+    except FileNotFoundError:
+        return 0
+    removed = 0
+    for _, path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if keep is not None and Path(path) == Path(keep):
+            continue
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            # Already evicted by another worker: the space is free, but not by us.
+            total -= size
+            continue
+        except OSError as error:
+            current_app.logger.warning("Could not evict cached GIF %s: %s", path, error)
+            continue
+        total -= size
+        removed += 1
+    return removed
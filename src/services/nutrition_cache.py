@@ -0,0 +1,156 @@
+import hashlib
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+
+from flask import current_app
+from sqlalchemy import delete
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from src.models.user import NutritionEstimate, db
+
+
+def normalize_description(text):
+    """Case, accent composition and whitespace do not change what Gemini estimates."""
+    text = unicodedata.normalize("NFC", text or "").casefold()
+    return " ".join(text.split()).strip(" .;!")
+
+
+def nutrition_cache_key(description, image_bytes, mime_type, model, prompt_version):
+    """Content address of one estimate: what was asked, which photo, which model and prompt."""
+    image_part = ""
+    if image_bytes:
+        image_part = f"{mime_type or ''}:{hashlib.sha256(image_bytes).hexdigest()}"
+    parts = (str(prompt_version), model or "", normalize_description(description), image_part)
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+class NutritionCache:
+    """In-process LRU with per-entry TTL in front of an optional shared SQL tier.
+
+    The SQL tier (``nutrition_estimate``) lets gunicorn workers and restarts reuse
+    estimates; the in-process tier answers repeats without a query. Stores use their
+    own short transactions, and expired rows are purged at most once per
+    ``purge_interval`` seconds instead of on every store.
+    """
+
+    purge_interval = 3600
+
+    def __init__(self, max_entries, ttl_seconds, shared):
+        self.max_entries = max(int(max_entries), 1)
+        self.ttl_seconds = int(ttl_seconds)
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._next_purge = 0.0
+        self._counters = dict.fromkeys(
+            ("hits", "shared_hits", "misses", "stores", "evictions", "expirations"), 0
+        )
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _remember(self, key, macros, ttl_seconds):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, dict(macros))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _recall(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, macros = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                self._counters["expirations"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return dict(macros)
+
+    def get(self, key):
+        macros = self._recall(key)
+        if macros is not None:
+            return macros
+        if self.shared:
+            row = db.session.get(NutritionEstimate, key)
+            remaining = (row.expires_at - datetime.utcnow()).total_seconds() if row else 0
+            if remaining > 0:
+                self._remember(key, row.macros, remaining)
+                self._count("shared_hits")
+                return dict(row.macros)
+        self._count("misses")
+        return None
+
+    def put(self, key, macros):
+        self._remember(key, macros, self.ttl_seconds)
+        self._count("stores")
+        if not self.shared:
+            return
+        now = datetime.utcnow()
+        try:
+            with Session(db.engine) as session:
+                session.merge(NutritionEstimate(
+                    key=key,
+                    macros=dict(macros),
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=self.ttl_seconds),
+                ))
+                session.commit()
+        except SQLAlchemyError:
+            # Another worker stored the same key first, or the table is unavailable:
+            # the in-process tier still has the estimate.
+            current_app.logger.warning("Could not store nutrition estimate %s", key, exc_info=True)
+        self._purge_expired(now)
+
+    def _purge_expired(self, now):
+        with self._lock:
+            if time.monotonic() < self._next_purge:
+                return
+            self._next_purge = time.monotonic() + self.purge_interval
+        try:
+            with Session(db.engine) as session:
+                session.execute(delete(NutritionEstimate).where(NutritionEstimate.expires_at <= now))
+                session.commit()
+        except SQLAlchemyError:
+            current_app.logger.warning("Could not purge expired nutrition estimates", exc_info=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters, entries=len(self._entries), max_entries=self.max_entries)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_ratio"] = (
+            round((stats["hits"] + stats["shared_hits"]) / lookups, 3) if lookups else 0.0
+        )
+        return stats
+
+
+_create_lock = Lock()
+
+
+def nutrition_cache():
+    """The cache of the current app; each app (and test) gets its own in-process tier."""
+    cache = current_app.extensions.get("nutrition_cache")
+    if cache is None:
+        with _create_lock:
+            cache = current_app.extensions.get("nutrition_cache")
+            if cache is None:
+                cache = NutritionCache(
+                    current_app.config.get("NUTRITION_CACHE_SIZE", 2048),
+                    current_app.config.get("NUTRITION_CACHE_TTL", 30 * 24 * 3600),
+                    current_app.config.get("NUTRITION_CACHE_SHARED", True),
+                )
+                current_app.extensions["nutrition_cache"] = cache
+    return cache
+
+
+def nutrition_cache_stats():
+    return nutrition_cache().stats()
@@ -1,20 +1,25 @@
 from collections import defaultdict
 from decimal import Decimal, InvalidOperation
 
-from sqlalchemy.orm import selectinload
+from sqlalchemy import and_, insert, or_
+from sqlalchemy.orm import joinedload, selectinload
 
 from src.models.user import (
+    PersonalRecordBest,
     PersonalRecordEvent,
+    User,
     WorkoutSession,
     WorkoutSessionExerciseCompletion,
     db,
 )
+from src.services.user_context import invalidate_user_context, user_context
 
 
 LOAD_PRECISION = Decimal("0.01")
 VALUE_PRECISION = Decimal("0.0001")
 E1RM_METRIC_KEY = "e1rm:epley:v1"
 METRIC_PRIORITY = {"max_load": 0, "estimated_1rm": 1, "reps_at_load": 2}
+BACKFILL_CHUNK_SIZE = 500
 
 
 def _decimal(value, precision):
@@ -29,15 +34,117 @@ def _event_value(event):
     return _decimal(event.new_value, VALUE_PRECISION) or Decimal("0")
 
 
-def process_session_personal_records(session_record, backfilled=False):
-    if session_record.completed_at is None:
-        return []
-    if (session_record.pr_processed_version or 0) >= 1:
-        return PersonalRecordEvent.query.filter_by(
-            workout_session_id=session_record.id
-        ).order_by(PersonalRecordEvent.id).all()
+def _event_position(event):
+    return (event.achieved_at, event.workout_session_id)
 
-    db.session.flush()
+
+def _metric_events(user_id, exercise_key, metric_type, metric_key):
+    return PersonalRecordEvent.query.filter_by(
+        user_id=user_id,
+        exercise_key=exercise_key,
+        metric_type=metric_type,
+        metric_key=metric_key,
+    )
+
+
+def _rebuild_best(user_id, exercise_key, metric_type, metric_key):
+    events = _metric_events(user_id, exercise_key, metric_type, metric_key)
+    best_event = events.order_by(
+        PersonalRecordEvent.new_value.desc(),
+        PersonalRecordEvent.achieved_at,
+        PersonalRecordEvent.id,
+    ).first()
+    if best_event is None:
+        return None
+    latest_event = events.order_by(
+        PersonalRecordEvent.achieved_at.desc(),
+        PersonalRecordEvent.workout_session_id.desc(),
+    ).first()
+    best = PersonalRecordBest(
+        user_id=user_id,
+        exercise_key=exercise_key,
+        metric_type=metric_type,
+        metric_key=metric_key,
+        best_event=best_event,
+        best_value=best_event.new_value,
+        latest_event=latest_event,
+        latest_achieved_at=latest_event.achieved_at,
+        latest_session_id=latest_event.workout_session_id,
+    )
+    db.session.add(best)
+    return best
+
+
+def _load_bests(user_id, candidates):
+    """One indexed lookup for every metric touched by the session.
+
+    Metrics recorded before the bests table existed are rebuilt on first use.
+    """
+    keys = {
+        (candidate["exercise_key"], candidate["metric_type"], candidate["metric_key"])
+        for candidate in candidates
+    }
+    bests = {
+        (best.exercise_key, best.metric_type, best.metric_key): best
+        for best in PersonalRecordBest.query.filter(
+            PersonalRecordBest.user_id == user_id,
+            PersonalRecordBest.exercise_key.in_({key[0] for key in keys}),
+            PersonalRecordBest.metric_key.in_({key[2] for key in keys}),
+        ).options(joinedload(PersonalRecordBest.best_event))
+    }
+    for key in keys - set(bests):
+        best = _rebuild_best(user_id, *key)
+        if best is not None:
+            bests[key] = best
+    return bests
+
+
+def _previous_event(session_record, exercise_key, metric_type, metric_key):
+    """Best event strictly before the session, for sessions processed out of order."""
+    completed_at = session_record.completed_at
+    return (
+        _metric_events(session_record.user_id, exercise_key, metric_type, metric_key)
+        .filter(
+            or_(
+                PersonalRecordEvent.achieved_at < completed_at,
+                and_(
+                    PersonalRecordEvent.achieved_at == completed_at,
+                    PersonalRecordEvent.workout_session_id < session_record.id,
+                ),
+            )
+        )
+        .order_by(PersonalRecordEvent.new_value.desc(), PersonalRecordEvent.achieved_at)
+        .first()
+    )
+
+
+def _record_best(best, event):
+    if best is None:
+        best = PersonalRecordBest(
+            user_id=event.user_id,
+            exercise_key=event.exercise_key,
+            metric_type=event.metric_type,
+            metric_key=event.metric_key,
+            best_event=event,
+            best_value=event.new_value,
+            latest_event=event,
+            latest_achieved_at=event.achieved_at,
+            latest_session_id=event.workout_session_id,
+        )
+        db.session.add(best)
+        return best
+    if event.new_value > (_decimal(best.best_value, VALUE_PRECISION) or Decimal("0")):
+        best.best_event = event
+        best.best_value = event.new_value
+    if _event_position(event) > (best.latest_achieved_at, best.latest_session_id):
+        best.latest_event = event
+        best.latest_achieved_at = event.achieved_at
+        best.latest_session_id = event.workout_session_id
+    return best
+
+
+def _session_candidates(session_record):
+    """Best value per (exercise, metric) performed in the session, in processing order."""
     candidates = {}
 
     def consider(completion, performed_set, metric_type, metric_key, value, load_kg):
@@ -101,18 +208,7 @@ def process_session_personal_records(session_record, backfilled=False):
                 load_kg,
             )
 
-    if not candidates:
-        session_record.pr_processed_version = 1
-        db.session.flush()
-        return []
-
-    exercise_keys = {candidate["exercise_key"] for candidate in candidates.values()}
-    known_events = PersonalRecordEvent.query.filter(
-        PersonalRecordEvent.user_id == session_record.user_id,
-        PersonalRecordEvent.exercise_key.in_(exercise_keys),
-    ).all()
-
-    ordered_candidates = sorted(
+    return sorted(
         candidates.values(),
         key=lambda item: (
             item["exercise_key"],
@@ -120,27 +216,54 @@ def process_session_personal_records(session_record, backfilled=False):
             -item["load_kg"],
         ),
     )
-    for candidate in ordered_candidates:
-        matching = [
-            event
-            for event in known_events
-            if event.exercise_key == candidate["exercise_key"]
-            and event.metric_type == candidate["metric_type"]
-            and event.metric_key == candidate["metric_key"]
-        ]
-        if any(event.workout_session_id == session_record.id for event in matching):
+
+
+def _highlight_rank(metric_type, load_kg):
+    return (
+        METRIC_PRIORITY.get(metric_type, len(METRIC_PRIORITY)),
+        -(_decimal(load_kg, LOAD_PRECISION) or Decimal("0"))
+        if metric_type == "reps_at_load"
+        else Decimal("0"),
+    )
+
+
+def process_session_personal_records(session_record, backfilled=False):
+    if session_record.completed_at is None:
+        return []
+    if (session_record.pr_processed_version or 0) >= 1:
+        return PersonalRecordEvent.query.filter_by(
+            workout_session_id=session_record.id
+        ).order_by(PersonalRecordEvent.id).all()
+
+    db.session.flush()
+    candidates = _session_candidates(session_record)
+    if not candidates:
+        session_record.pr_processed_version = 1
+        db.session.flush()
+        return []
+
+    bests = _load_bests(session_record.user_id, candidates)
+    recorded = {
+        (exercise_key, metric_key)
+        for exercise_key, metric_key in db.session.query(
+            PersonalRecordEvent.exercise_key,
+            PersonalRecordEvent.metric_key,
+        ).filter_by(workout_session_id=session_record.id)
+    }
+    position = (session_record.completed_at, session_record.id)
+
+    for candidate in candidates:
+        if (candidate["exercise_key"], candidate["metric_key"]) in recorded:
             continue
 
-        previous_events = [
-            event
-            for event in matching
-            if event.achieved_at < session_record.completed_at
-            or (
-                event.achieved_at == session_record.completed_at
-                and event.workout_session_id < session_record.id
-            )
-        ]
-        previous = max(previous_events, key=_event_value, default=None)
+        key = (candidate["exercise_key"], candidate["metric_type"], candidate["metric_key"])
+        best = bests.get(key)
+        if best is None:
+            previous = None
+        elif position > (best.latest_achieved_at, best.latest_session_id):
+            previous = best.best_event
+        else:
+            previous = _previous_event(session_record, *key)
         if previous is not None and candidate["value"] <= _event_value(previous):
             continue
 
@@ -167,9 +290,10 @@ def process_session_personal_records(session_record, backfilled=False):
             achieved_at=session_record.completed_at,
         )
         db.session.add(event)
-        known_events.append(event)
+        bests[key] = _record_best(best, event)
 
     db.session.flush()
+    invalidate_user_context(session_record.user_id, "max_load")
     session_events = PersonalRecordEvent.query.filter_by(
         workout_session_id=session_record.id
     ).all()
@@ -183,13 +307,7 @@ def process_session_personal_records(session_record, backfilled=False):
         if eligible:
             highlighted = min(
                 eligible,
-                key=lambda event: (
-                    METRIC_PRIORITY.get(event.metric_type, len(METRIC_PRIORITY)),
-                    -(_decimal(event.load_kg, LOAD_PRECISION) or Decimal("0"))
-                    if event.metric_type == "reps_at_load"
-                    else Decimal("0"),
-                    event.id,
-                ),
+                key=lambda event: (*_highlight_rank(event.metric_type, event.load_kg), event.id),
             )
             highlighted.is_highlighted = True
 
@@ -232,7 +350,7 @@ def serialize_personal_record(event):
     }
 
 
-def ensure_personal_record_history(user_id, exclude_session_id=None):
+def _unprocessed_sessions(user_id, exclude_session_id=None):
     query = (
         WorkoutSession.query.filter(
             WorkoutSession.user_id == user_id,
@@ -248,25 +366,204 @@ def ensure_personal_record_history(user_id, exclude_session_id=None):
     )
     if exclude_session_id is not None:
         query = query.filter(WorkoutSession.id != exclude_session_id)
+    return query
+
 
+def ensure_personal_record_history(user_id, exclude_session_id=None):
     events = []
-    for session_record in query.all():
+    for session_record in _unprocessed_sessions(user_id, exclude_session_id).all():
         events.extend(process_session_personal_records(session_record, backfilled=True))
     return events
 
 
-def current_max_load(user_id, exercise_key):
-    event = (
-        PersonalRecordEvent.query.filter_by(
-            user_id=user_id,
-            exercise_key=exercise_key,
-            metric_type="max_load",
-            metric_key="max_load",
-        )
-        .order_by(PersonalRecordEvent.new_value.desc())
-        .first()
+def _snapshot(event_id, value, load_kg, repetitions):
+    return {"id": event_id, "value": value, "load_kg": load_kg, "repetitions": repetitions}
+
+
+def _stronger(*snapshots):
+    return max(
+        (item for item in snapshots if item is not None),
+        key=lambda item: item["value"],
+        default=None,
     )
-    return _decimal(event.new_value, LOAD_PRECISION) if event else None
+
+
+def _backfill_states(user_id, candidates, states):
+    missing = [
+        candidate
+        for candidate in candidates
+        if (candidate["exercise_key"], candidate["metric_type"], candidate["metric_key"])
+        not in states
+    ]
+    if not missing:
+        return
+    for key, best in _load_bests(user_id, missing).items():
+        event = best.best_event
+        states[key] = {
+            "row": best,
+            "best": _snapshot(event.id, event.new_value, event.load_kg, event.repetitions),
+            "latest": (best.latest_achieved_at, best.latest_session_id),
+            "pending": None,
+            "pending_latest": None,
+        }
+    for candidate in missing:
+        key = (candidate["exercise_key"], candidate["metric_type"], candidate["metric_key"])
+        states.setdefault(key, {
+            "row": None,
+            "best": None,
+            "latest": None,
+            "pending": None,
+            "pending_latest": None,
+        })
+
+
+def _backfill_chunk(user_id, sessions, states):
+    rows = []
+    for session_record in sessions:
+        candidates = _session_candidates(session_record)
+        _backfill_states(user_id, candidates, states)
+        position = (session_record.completed_at, session_record.id)
+        session_rows = []
+        for candidate in candidates:
+            key = (candidate["exercise_key"], candidate["metric_type"], candidate["metric_key"])
+            state = states[key]
+            if state["latest"] is None or position > state["latest"]:
+                previous = _stronger(state["best"], state["pending"])
+            else:
+                event = _previous_event(session_record, *key)
+                previous = _stronger(
+                    event and _snapshot(event.id, event.new_value, event.load_kg, event.repetitions),
+                    state["pending"],
+                )
+            if previous is not None and candidate["value"] <= previous["value"]:
+                continue
+
+            row = {
+                "user_id": user_id,
+                "exercise_key": candidate["exercise_key"],
+                "exercise_name": candidate["exercise_name"],
+                "workout_session_id": session_record.id,
+                "completion_id": candidate["completion_id"],
+                "set_id": candidate["set_id"],
+                "metric_type": candidate["metric_type"],
+                "metric_key": candidate["metric_key"],
+                "previous_value": previous["value"] if previous else None,
+                "new_value": candidate["value"],
+                "previous_load_kg": previous["load_kg"] if previous else None,
+                "previous_repetitions": previous["repetitions"] if previous else None,
+                "load_kg": candidate["load_kg"],
+                "repetitions": candidate["repetitions"],
+                "formula": candidate["formula"],
+                "formula_version": candidate["formula_version"],
+                "is_initial": previous is None,
+                "is_highlighted": False,
+                "is_backfilled": True,
+                "achieved_at": session_record.completed_at,
+            }
+            index = len(rows) + len(session_rows)
+            session_rows.append(row)
+            state["pending"] = _stronger(
+                state["pending"],
+                _snapshot(index, row["new_value"], row["load_kg"], row["repetitions"]),
+            )
+            state["pending_latest"] = (position, index)
+
+        eligible = defaultdict(list)
+        for row in session_rows:
+            if not row["is_initial"]:
+                eligible[row["exercise_key"]].append(row)
+        for exercise_rows in eligible.values():
+            min(
+                exercise_rows,
+                key=lambda row: _highlight_rank(row["metric_type"], row["load_kg"]),
+            )["is_highlighted"] = True
+        rows.extend(session_rows)
+
+    ids = []
+    if rows:
+        ids = db.session.scalars(
+            insert(PersonalRecordEvent).returning(
+                PersonalRecordEvent.id,
+                sort_by_parameter_order=True,
+            ),
+            rows,
+        ).all()
+    db.session.flush()
+    for key, state in states.items():
+        pending = state["pending"]
+        if pending is None:
+            continue
+        pending = {**pending, "id": ids[pending["id"]]}
+        (achieved_at, session_id), latest_index = state["pending_latest"]
+        best = _stronger(state["best"], pending)
+        if state["latest"] is None or (achieved_at, session_id) > state["latest"]:
+            state["latest"] = (achieved_at, session_id)
+            latest_id = ids[latest_index]
+        else:
+            latest_id = state["row"].latest_event_id
+        row = state["row"]
+        if row is None:
+            row = PersonalRecordBest(
+                user_id=user_id,
+                exercise_key=key[0],
+                metric_type=key[1],
+                metric_key=key[2],
+            )
+            db.session.add(row)
+            state["row"] = row
+        row.best_event_id = best["id"]
+        row.best_value = best["value"]
+        row.latest_event_id = latest_id
+        row.latest_achieved_at, row.latest_session_id = state["latest"]
+        state["best"] = best
+        state["pending"] = None
+        state["pending_latest"] = None
+
+    WorkoutSession.query.filter(
+        WorkoutSession.id.in_([session_record.id for session_record in sessions])
+    ).update({"pr_processed_version": 1})
+    db.session.flush()
+    invalidate_user_context(user_id, "max_load")
+    return len(rows)
+
+
+def users_with_unprocessed_sessions():
+    return [
+        user_id
+        for user_id, in db.session.query(WorkoutSession.user_id)
+        .filter(
+            WorkoutSession.completed_at.isnot(None),
+            WorkoutSession.pr_processed_version.is_(None),
+        )
+        .distinct()
+    ]
+
+
+def backfill_personal_records(user_id, chunk_size=BACKFILL_CHUNK_SIZE, commit=False):
+    """Set-based alternative to ``ensure_personal_record_history`` for large histories.
+
+    Sessions are streamed in chronological chunks while the running bests stay in
+    memory, so each chunk costs a fixed number of statements: the session load, one
+    bulk event insert with highlights already chosen, the bests upsert and one
+    session update. ``commit`` ends the transaction after every chunk.
+    """
+    totals = {"sessions": 0, "events": 0}
+    states = {}
+    while True:
+        User.query.filter_by(id=user_id).with_for_update().first()
+        sessions = _unprocessed_sessions(user_id).limit(chunk_size).all()
+        if not sessions:
+            break
+        totals["events"] += _backfill_chunk(user_id, sessions, states)
+        totals["sessions"] += len(sessions)
+        if commit:
+            db.session.commit()
+    return totals
+
+
+def current_max_load(user_id, exercise_key):
+    value = user_context(user_id).max_load(exercise_key)
+    return _decimal(value, LOAD_PRECISION) if value is not None else None
 
 
 def exercise_progress(user_id, exercise_key):
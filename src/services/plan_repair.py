@@ -0,0 +1,123 @@
+import re
+from threading import Lock
+
+from flask import current_app
+
+from src.services.ai import AIResponseError
+from src.services.prompt_context import token_meter
+from src.services.workout_plans import PlanValidationError
+
+
+_DAY_FIELD = re.compile(r"^days\.(\d+)(?:\.|$)")
+
+
+def repair_targets(errors):
+    """Sorted 1-based days named by ``errors``, or None when an error is not day-scoped."""
+    days = set()
+    for field in errors:
+        match = _DAY_FIELD.match(field)
+        if match is None:
+            return None
+        days.add(int(match.group(1)))
+    return sorted(days) or None
+
+
+class _RepairStats:
+    """Attempts, validated results and Gemini tokens per plan kind and attempt mode."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._kinds = {}
+
+    def record(self, kind, mode, succeeded, tokens):
+        with self._lock:
+            stats = self._kinds.setdefault(kind, {}).setdefault(mode, {
+                "attempts": 0,
+                "succeeded": 0,
+                "tokens": 0,
+            })
+            stats["attempts"] += 1
+            stats["succeeded"] += int(succeeded)
+            stats["tokens"] += tokens
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {}
+            for kind, modes in self._kinds.items():
+                snapshot[kind] = {}
+                for mode, stats in modes.items():
+                    attempts = stats["attempts"]
+                    snapshot[kind][mode] = {
+                        **stats,
+                        "success_rate": round(stats["succeeded"] / attempts, 3) if attempts else 0.0,
+                        "tokens_per_attempt": round(stats["tokens"] / attempts, 1) if attempts else 0.0,
+                    }
+            return snapshot
+
+
+_stats = _RepairStats()
+
+
+def build_plan(kind, generate, repair, normalize, max_attempts):
+    """Generate and validate a plan, repairing only the invalid days between attempts.
+
+    ``generate(draft, error)`` writes a whole plan (``draft`` and ``error`` describe the
+    previous invalid attempt, or are None); ``repair(draft, days, errors)`` rewrites the
+    listed days of ``draft`` and returns the merged plan; ``normalize`` validates it.
+    A repair is used whenever every validation error points at a day, so the days
+    already accepted are neither paid for again nor put at risk. The last
+    ``PlanValidationError`` or ``AIResponseError`` is raised when attempts run out.
+    """
+    draft = error = None
+    for attempt in range(1, max_attempts + 1):
+        days = repair_targets(error.errors) if error is not None and draft is not None else None
+        mode = "repair" if days else "full"
+        candidate = None
+        with token_meter() as meter:
+            try:
+                if days:
+                    candidate = repair(draft, days, error.errors)
+                else:
+                    candidate = generate(draft, error)
+                plan_data = normalize(candidate)
+            except PlanValidationError as invalid:
+                _stats.record(kind, mode, False, meter["tokens"])
+                current_app.logger.warning(
+                    "Invalid generated %s plan (%s attempt %s/%s): %s",
+                    kind,
+                    mode,
+                    attempt,
+                    max_attempts,
+                    list(invalid.errors)[:8],
+                )
+                if attempt == max_attempts:
+                    raise
+                if candidate is not None:
+                    draft = candidate
+                error = invalid
+                continue
+            except AIResponseError:
+                _stats.record(kind, mode, False, meter["tokens"])
+                current_app.logger.warning(
+                    "%s plan AI returned invalid output (%s attempt %s/%s)", kind, mode, attempt, max_attempts
+                )
+                if attempt == max_attempts:
+                    raise
+                # A broken repair keeps the last draft; a broken full plan starts over.
+                if mode == "full":
+                    draft = error = None
+                continue
+        _stats.record(kind, mode, True, meter["tokens"])
+        return plan_data
+
+
+def plan_repair_stats():
+    return _stats.snapshot()
+
+
+def reset_plan_repair_stats():
+    _stats.reset()
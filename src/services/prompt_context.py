@@ -0,0 +1,138 @@
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from threading import Lock
+
+from src.services.workout_plans import catalog_by_key, catalog_for_prompt
+
+
+WORKOUT_CATALOG_COLUMNS = (
+    "key",
+    "group",
+    "training_role",
+    "muscle",
+    "secondary_muscles",
+    "equipment",
+    "difficulty",
+)
+
+
+def compact_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def estimate_tokens(text):
+    """Rough Gemini token count (about four characters per token) for size comparisons."""
+    return (len(text) + 3) // 4
+
+
+@lru_cache(maxsize=64)
+def _workout_catalog(equipment, experience_level):
+    items = catalog_for_prompt({"equipment": sorted(equipment), "experience_level": experience_level})
+    rows = [
+        [
+            "|".join(item[column]) if column == "secondary_muscles" else item[column]
+            for column in WORKOUT_CATALOG_COLUMNS
+        ]
+        for item in items
+    ]
+    compact = compact_json({"columns": WORKOUT_CATALOG_COLUMNS, "rows": rows})
+    return compact, estimate_tokens(compact_json(items)) - estimate_tokens(compact)
+
+
+def workout_catalog_context(questionnaire):
+    """``(json, tokens_saved)`` for the exercise_catalog allowed by the questionnaire.
+
+    The catalog only depends on equipment and experience level, so the encoding is
+    built once per combination and reused by every attempt and user. Rows are a
+    column table without the display names (keys are already descriptive), which
+    is what saves most of the input tokens against a list of objects.
+    """
+    return _workout_catalog(frozenset(questionnaire["equipment"]), questionnaire["experience_level"])
+
+
+@lru_cache(maxsize=1)
+def classification_catalog_context():
+    """``(json, tokens_saved)`` mapping catalog key to exercise name."""
+    catalog = catalog_by_key().values()
+    verbose = compact_json([{"key": item["key"], "name": item["name"]} for item in catalog])
+    compact = compact_json({item["key"]: item["name"] for item in catalog})
+    return compact, estimate_tokens(verbose) - estimate_tokens(compact)
+
+
+class _PromptStats:
+    """Input tokens per prompt kind: sent, served from Gemini's context cache, and saved."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._kinds = {}
+
+    def record(self, kind, usage, tokens_saved):
+        prompt_tokens = getattr(usage, "prompt_token_count", None) or 0
+        cached_tokens = getattr(usage, "cached_content_token_count", None) or 0
+        with self._lock:
+            stats = self._kinds.setdefault(kind, {
+                "calls": 0,
+                "prompt_tokens": 0,
+                "cached_tokens": 0,
+                "estimated_tokens_saved": 0,
+            })
+            stats["calls"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["cached_tokens"] += cached_tokens
+            stats["estimated_tokens_saved"] += tokens_saved
+        return {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "estimated_tokens_saved": tokens_saved,
+        }
+
+    def snapshot(self):
+        with self._lock:
+            return {kind: dict(stats) for kind, stats in self._kinds.items()}
+
+
+_stats = _PromptStats()
+
+
+def record_prompt(kind, usage, tokens_saved=0):
+    return _stats.record(kind, usage, tokens_saved)
+
+
+def prompt_stats():
+    return _stats.snapshot()
+
+
+def reset_prompt_stats():
+    _stats.reset()
+
+
+_meter = ContextVar("prompt_token_meter", default=None)
+_meter_lock = Lock()
+
+
+@contextmanager
+def token_meter():
+    """Count prompt and output tokens of the Gemini calls made inside the block."""
+    meter = {"tokens": 0}
+    token = _meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _meter.reset(token)
+
+
+def meter_usage(usage):
+    meter = _meter.get()
+    if meter is not None and usage is not None:
+        tokens = (getattr(usage, "prompt_token_count", None) or 0) + (
+            getattr(usage, "candidates_token_count", None) or 0
+        )
+        # Calls made by worker threads (see diet_days) share the caller's meter.
+        with _meter_lock:
+            meter["tokens"] += tokens
@@ -1,36 +1,68 @@
 import time
-from collections import defaultdict, deque
 from threading import Lock
 
 from flask import current_app, jsonify, request
 from functools import wraps
 
+from src.services.rate_limit_backends import MemoryBackend, RateLimitBackendError, create_backend, memory_backend
 
-class _LimiterState:
-    def __init__(self):
-        self._hits = defaultdict(deque)
+
+class RateLimiter:
+    """The app's backend plus a local in-memory stand-in used while it is unreachable.
+
+    Falling back keeps limits per process instead of dropping them, and the
+    warning is logged at most once per ``warn_interval`` seconds.
+    """
+
+    def __init__(self, backend, local=None, warn_interval=60):
+        self.backend = backend
+        self.local = backend if isinstance(backend, MemoryBackend) else local or MemoryBackend()
+        self.fallbacks = 0
+        self.warn_interval = warn_interval
+        self._warned = 0.0
         self._lock = Lock()
 
     def allow(self, key, limit, window):
-        now = time.monotonic()
-        with self._lock:
-            hits = self._hits[key]
-            while hits and hits[0] <= now - window:
-                hits.popleft()
-            if len(hits) >= limit:
-                return False
-            hits.append(now)
-            return True
+        try:
+            return self.backend.allow(key, limit, window)
+        except RateLimitBackendError as error:
+            now = time.monotonic()
+            with self._lock:
+                self.fallbacks += 1
+                warn = now - self._warned >= self.warn_interval
+                if warn:
+                    self._warned = now
+            if warn:
+                current_app.logger.warning("Rate limit backend unavailable, using local limits: %s", error)
+            return self.local.allow(key, limit, window)
+
+
+_create_lock = Lock()
+
 
-_state = _LimiterState()
+def rate_limiter():
+    """The limiter of the current app; each app (and test) gets its own backend instance."""
+    limiter = current_app.extensions.get("rate_limiter")
+    if limiter is None:
+        with _create_lock:
+            limiter = current_app.extensions.get("rate_limiter")
+            if limiter is None:
+                config = current_app.config
+                limiter = RateLimiter(create_backend(config), memory_backend(config))
+                current_app.extensions["rate_limiter"] = limiter
+    return limiter
 
 
-def _client_key():
+# Login and register change the session, so their buckets must not depend on it.
+IP_ONLY_LIMITS = {"login", "register"}
+
+
+def _client_key(name):
     from flask import session
 
     remote = request.remote_addr or "unknown"
-    account = str(session.get("user_id") or "")
-    return f"{remote}|{account}"
+    account = "" if name in IP_ONLY_LIMITS else str(session.get("user_id") or "")
+    return f"{name}|{remote}|{account}"
 
 
 def _rate_config(name):
@@ -38,20 +70,30 @@ def _rate_config(name):
     return app_config.get(name)
 
 
+def check_rate_limit(name, default_limit, default_window):
+    """Consume one request of ``name``; return the 429 response when over the limit.
+
+    For views that only spend the budget on some paths (e.g. cache misses).
+    """
+    limit, window = _rate_config(name) or (default_limit, default_window)
+    if not rate_limiter().allow(_client_key(name), int(limit), int(window)):
+        return jsonify({"error": "Muitas tentativas. Aguarde um instante."}), 429
+    return None
+
+
 def rate_limit(name, default_limit, default_window):
-    """In-memory sliding-window limiter keyed by client IP (+ user when logged in).
+    """Limit a view per limit name and client IP (+ user when logged in).
 
-    Limits are per-process only; if the app later runs multiple gunicorn
-    workers, switch to a shared backend (e.g. Redis).
+    ``RATE_LIMIT_BACKEND`` selects where hits are counted: ``memory`` (per
+    process), or ``sql``/``redis`` to share the limits between gunicorn workers.
     """
 
     def decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
-            limit, window = _rate_config(name) or (default_limit, default_window)
-            key = _client_key()
-            if not _state.allow(key, int(limit), int(window)):
-                return jsonify({"error": "Muitas tentativas. Aguarde um instante."}), 429
+            limited = check_rate_limit(name, default_limit, default_window)
+            if limited is not None:
+                return limited
             return f(*args, **kwargs)
 
         return wrapper
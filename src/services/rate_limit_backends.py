@@ -0,0 +1,247 @@
+import socket
+import time
+import zlib
+from collections import OrderedDict
+from queue import Empty, LifoQueue
+from threading import Lock
+from urllib.parse import urlparse
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.models.user import RateLimitBucket, db
+
+
+class RateLimitBackendError(Exception):
+    """The shared backend could not answer; the caller falls back to local limits."""
+
+
+class MemoryBackend:
+    """Per-process sliding-window counter with a hard cap on the number of keys.
+
+    Each key keeps only ``(window, index, current, previous)``: the hits of the
+    current fixed window and of the one before it, weighted like ``RedisBackend``,
+    so a check is O(1) whatever the limit. Keys live in per-shard LRU order (which
+    also spreads lock contention); keys idle for two windows are dropped from the
+    LRU end as they are met, and past ``max_keys`` the least recently seen key is
+    evicted, so memory stays flat under a flood of distinct clients.
+    """
+
+    def __init__(self, shards=16, max_keys=100_000):
+        self._shards = [(Lock(), OrderedDict()) for _ in range(shards)]
+        self._shard_cap = max(1, -(-max_keys // shards))
+        self.evicted = 0
+
+    def _shard(self, key):
+        return self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+
+    def allow(self, key, limit, window):
+        lock, entries = self._shard(key)
+        now = time.monotonic()
+        index = int(now // window)
+        with lock:
+            entry = entries.get(key)
+            if entry is None:
+                self._make_room(entries, now)
+                current = previous = 0
+            else:
+                _, last_index, current, previous = entry
+                if index != last_index:
+                    previous = current if index == last_index + 1 else 0
+                    current = 0
+                entries.move_to_end(key)
+            elapsed = (now % window) / window
+            allowed = previous * (1 - elapsed) + current + 1 <= limit
+            entries[key] = (window, index, current + 1 if allowed else current, previous)
+            return allowed
+
+    def _make_room(self, entries, now):
+        while entries:
+            key, (window, index, _, _) = next(iter(entries.items()))
+            if int(now // window) > index + 1:
+                del entries[key]
+            elif len(entries) >= self._shard_cap:
+                del entries[key]
+                self.evicted += 1
+            else:
+                return
+
+    def size(self):
+        return sum(len(entries) for _, entries in self._shards)
+
+
+class SQLBackend:
+    """Token bucket per key in ``rate_limit_bucket``, shared by every worker on the database.
+
+    Each check runs in its own short transaction (row locked with ``FOR UPDATE``
+    where supported), so it never commits the request's session. A bucket idle
+    for ``idle_seconds`` is full again, so it is deleted instead of updated.
+    """
+
+    def __init__(self, engine=None, idle_seconds=3600, sweep_interval=300):
+        self._engine = engine
+        self.idle_seconds = idle_seconds
+        self.sweep_interval = sweep_interval
+        self._swept = time.time()
+        self._sweep_lock = Lock()
+
+    @property
+    def engine(self):
+        return self._engine or db.engine
+
+    def allow(self, key, limit, window):
+        now = time.time()
+        try:
+            for _ in range(2):
+                try:
+                    allowed = self._take(key, limit, window, now)
+                    break
+                except IntegrityError:
+                    # Another worker created the bucket first; read it again.
+                    continue
+            else:
+                raise RateLimitBackendError("rate limit bucket kept conflicting")
+            self._maybe_sweep(now)
+        except RateLimitBackendError:
+            raise
+        except Exception as error:
+            raise RateLimitBackendError(str(error)) from error
+        return allowed
+
+    def _take(self, key, limit, window, now):
+        with Session(self.engine) as session, session.begin():
+            bucket = session.get(RateLimitBucket, key, with_for_update=True)
+            if bucket is None:
+                bucket = RateLimitBucket(key=key, tokens=float(limit), updated_at=now)
+                session.add(bucket)
+            tokens = min(float(limit), bucket.tokens + max(now - bucket.updated_at, 0) * limit / window)
+            allowed = tokens >= 1
+            bucket.tokens = tokens - 1 if allowed else tokens
+            bucket.updated_at = now
+        return allowed
+
+    def _maybe_sweep(self, now):
+        with self._sweep_lock:
+            if now - self._swept < self.sweep_interval:
+                return
+            self._swept = now
+        with Session(self.engine) as session, session.begin():
+            session.execute(delete(RateLimitBucket).where(RateLimitBucket.updated_at < now - self.idle_seconds))
+
+
+class RedisBackend:
+    """Sliding-window counter on a Redis-compatible server, spoken over RESP directly.
+
+    Each key keeps one counter per fixed window; the estimate weights the previous
+    window by how much of it still overlaps the sliding window. Denied requests
+    are not counted. Only INCR, DECR, GET and PEXPIRE are used.
+    """
+
+    def __init__(self, url, timeout=0.5, pool_size=8):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.database = int((parsed.path or "/0").lstrip("/") or 0)
+        self.timeout = timeout
+        self._pool = LifoQueue(maxsize=pool_size)
+
+    def _connect(self):
+        connection = _RespConnection(socket.create_connection((self.host, self.port), timeout=self.timeout))
+        if self.password:
+            connection.execute([("AUTH", self.password)])
+        if self.database:
+            connection.execute([("SELECT", self.database)])
+        return connection
+
+    def _execute(self, commands):
+        try:
+            connection = self._pool.get_nowait()
+        except Empty:
+            connection = None
+        try:
+            connection = connection or self._connect()
+            replies = connection.execute(commands)
+        except (OSError, RateLimitBackendError) as error:
+            if connection is not None:
+                connection.close()
+            raise RateLimitBackendError(str(error)) from error
+        try:
+            self._pool.put_nowait(connection)
+        except Exception:
+            connection.close()
+        return replies
+
+    def allow(self, key, limit, window):
+        now = time.time()
+        current = int(now // window)
+        elapsed = (now % window) / window
+        current_key, previous_key = f"rl:{key}:{current}", f"rl:{key}:{current - 1}"
+        count, _, previous = self._execute([
+            ("INCR", current_key),
+            ("PEXPIRE", current_key, int(window * 2000)),
+            ("GET", previous_key),
+        ])
+        if int(previous or 0) * (1 - elapsed) + count <= limit:
+            return True
+        self._execute([("DECR", current_key)])
+        return False
+
+
+class _RespConnection:
+    def __init__(self, sock):
+        self._socket = sock
+        self._reader = sock.makefile("rb")
+
+    def execute(self, commands):
+        """Send pipelined commands and return their replies in order."""
+        payload = bytearray()
+        for command in commands:
+            payload += b"*%d\r\n" % len(command)
+            for argument in command:
+                value = str(argument).encode()
+                payload += b"$%d\r\n%s\r\n" % (len(value), value)
+        self._socket.sendall(bytes(payload))
+        return [self._reply() for _ in commands]
+
+    def _reply(self):
+        line = self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise RateLimitBackendError("connection closed")
+        kind, value = line[:1], line[1:-2]
+        if kind == b"+":
+            return value.decode()
+        if kind == b"-":
+            raise RateLimitBackendError(value.decode())
+        if kind == b":":
+            return int(value)
+        if kind == b"$":
+            length = int(value)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2].decode()
+        if kind == b"*":
+            return [self._reply() for _ in range(int(value))]
+        raise RateLimitBackendError(f"unexpected reply {line!r}")
+
+    def close(self):
+        self._reader.close()
+        self._socket.close()
+
+
+def memory_backend(config):
+    return MemoryBackend(max_keys=config.get("RATE_LIMIT_MAX_KEYS") or 100_000)
+
+
+def create_backend(config):
+    """Backend named by ``RATE_LIMIT_BACKEND``: memory (default), sql or redis."""
+    name = (config.get("RATE_LIMIT_BACKEND") or "memory").lower()
+    if name == "memory":
+        return memory_backend(config)
+    if name == "sql":
+        return SQLBackend()
+    if name == "redis":
+        return RedisBackend(config.get("RATE_LIMIT_REDIS_URL") or "redis://localhost:6379/0")
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {name}")
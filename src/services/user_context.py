@@ -0,0 +1,117 @@
+from flask import g, has_request_context
+from sqlalchemy import func
+
+from src.models.user import (
+    ExerciseGoal,
+    PersonalRecordEvent,
+    UserProfile,
+    WorkoutWeeklyGoal,
+    db,
+)
+
+
+# Derived values that must be dropped together with the rows they are computed from.
+_DEPENDENTS = {
+    "profile": ("timezone", "confirmed_timezone"),
+    "weekly_goals": ("timezone", "confirmed_timezone"),
+}
+
+
+class UserContext:
+    """Lazily loaded profile, goals and max loads for one user, cached for a request.
+
+    Services read through ``user_context(user_id)``; code that writes any of these
+    rows calls ``invalidate_user_context`` so later reads in the same request reload.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._values = {}
+        self._max_loads = {}
+
+    def get(self, name, loader):
+        if name not in self._values:
+            self._values[name] = loader()
+        return self._values[name]
+
+    def invalidate(self, *names):
+        if not names:
+            self._values.clear()
+            self._max_loads.clear()
+            return
+        for name in names:
+            if name == "max_load":
+                self._max_loads.clear()
+                continue
+            self._values.pop(name, None)
+            for dependent in _DEPENDENTS.get(name, ()):
+                self._values.pop(dependent, None)
+
+    @property
+    def profile(self):
+        return self.get(
+            "profile",
+            lambda: UserProfile.query.filter_by(user_id=self.user_id).first(),
+        )
+
+    @property
+    def weekly_goals(self):
+        """All weekly goals, oldest effective week first."""
+        return self.get(
+            "weekly_goals",
+            lambda: WorkoutWeeklyGoal.query.filter_by(user_id=self.user_id)
+            .order_by(
+                WorkoutWeeklyGoal.effective_week_start.asc(),
+                WorkoutWeeklyGoal.created_at.asc(),
+                WorkoutWeeklyGoal.id.asc(),
+            )
+            .all(),
+        )
+
+    @property
+    def exercise_goal(self):
+        return self.get(
+            "exercise_goal",
+            lambda: ExerciseGoal.query.filter_by(user_id=self.user_id, status="active")
+            .order_by(ExerciseGoal.created_at.desc(), ExerciseGoal.id.desc())
+            .first(),
+        )
+
+    def max_load(self, exercise_key):
+        if exercise_key not in self._max_loads:
+            self._max_loads[exercise_key] = (
+                db.session.query(func.max(PersonalRecordEvent.new_value))
+                .filter(
+                    PersonalRecordEvent.user_id == self.user_id,
+                    PersonalRecordEvent.exercise_key == exercise_key,
+                    PersonalRecordEvent.metric_type == "max_load",
+                )
+                .scalar()
+            )
+        return self._max_loads[exercise_key]
+
+
+def start_user_context(user):
+    """Attach a fresh context for the logged-in user next to ``g.user``."""
+    g.user_context = UserContext(user.id)
+    return g.user_context
+
+
+def user_context(user_id):
+    """Return the request's context for ``user_id``, or an uncached one elsewhere.
+
+    Only the logged-in user's context is shared; other users (students viewed by a
+    professional, CLI and background jobs) get a context that lives for one call.
+    """
+    if has_request_context():
+        context = g.get("user_context")
+        if context is not None and str(context.user_id) == str(user_id):
+            return context
+    return UserContext(user_id)
+
+
+def invalidate_user_context(user_id, *names):
+    if has_request_context():
+        context = g.get("user_context")
+        if context is not None and str(context.user_id) == str(user_id):
+            context.invalidate(*names)
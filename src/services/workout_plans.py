@@ -4,6 +4,8 @@ import unicodedata
 from functools import lru_cache
 from pathlib import Path
 
+from flask import current_app, has_app_context
+
 
 CATALOG_PATH = Path(__file__).resolve().parent.parent / "data" / "exercises.json"
 GOALS = {"hypertrophy", "strength", "conditioning", "fat_loss", "mobility"}
@@ -101,8 +103,12 @@ def catalog_by_key():
     return {exercise["key"]: exercise for exercise in exercise_catalog()}
 
 
+def normalize_exercise_name(value):
+    return _normalized(value)
+
+
 @lru_cache(maxsize=1)
-def catalog_aliases():
+def _static_aliases():
     aliases = {}
     for exercise in exercise_catalog():
         for value in (exercise["name"], *exercise["aliases"]):
@@ -110,6 +116,16 @@ def catalog_aliases():
     return aliases
 
 
+def catalog_aliases():
+    """Normalized names and aliases of the catalog, plus the app's learned aliases.
+
+    Learned aliases (``exercise_aliases``) never override the catalog's own names.
+    """
+    static = _static_aliases()
+    learned = current_app.extensions.get("exercise_aliases") if has_app_context() else None
+    return learned.merged(static) if learned is not None else static
+
+
 def resolve_catalog_exercise(catalog_key=None, name=None):
     if catalog_key and catalog_key in catalog_by_key():
         return catalog_by_key()[catalog_key]
@@ -8,12 +8,15 @@ from src.models.user import (
     PersonalRecordEvent,
     UserProfile,
     WorkoutSession,
+    WorkoutWeekCount,
     WorkoutWeeklyGoal,
     db,
 )
+from src.services.user_context import invalidate_user_context, user_context
 
 
 DEFAULT_TIMEZONE = "UTC"
+STREAK_WINDOW_WEEKS = 26
 _CURRENT_MAX_UNSET = object()
 
 
@@ -34,31 +37,20 @@ def validate_timezone(value):
 
 
 def user_timezone(user_id):
-    profile = UserProfile.query.filter_by(user_id=user_id).first()
-    if profile and profile.timezone:
-        return validate_timezone(profile.timezone)
-
-    latest_goal = (
-        WorkoutWeeklyGoal.query.filter_by(user_id=user_id)
-        .order_by(
-            WorkoutWeeklyGoal.effective_week_start.desc(),
-            WorkoutWeeklyGoal.created_at.desc(),
-            WorkoutWeeklyGoal.id.desc(),
-        )
-        .first()
-    )
-    return validate_timezone(latest_goal.timezone) if latest_goal else DEFAULT_TIMEZONE
+    return confirmed_user_timezone(user_id) or DEFAULT_TIMEZONE
 
 
 def confirmed_user_timezone(user_id):
-    profile = UserProfile.query.filter_by(user_id=user_id).first()
-    if profile and profile.timezone:
-        return validate_timezone(profile.timezone)
-    latest_goal = WorkoutWeeklyGoal.query.filter_by(user_id=user_id).order_by(
-        WorkoutWeeklyGoal.effective_week_start.desc(),
-        WorkoutWeeklyGoal.id.desc(),
-    ).first()
-    return validate_timezone(latest_goal.timezone) if latest_goal else None
+    context = user_context(user_id)
+
+    def load():
+        profile = context.profile
+        if profile and profile.timezone:
+            return validate_timezone(profile.timezone)
+        goals = context.weekly_goals
+        return validate_timezone(goals[-1].timezone) if goals else None
+
+    return context.get("confirmed_timezone", load)
 
 
 def _aware_utc(value=None):
@@ -96,10 +88,6 @@ def _timezone_from_user(user, user_id):
             return validate_timezone(profile.timezone)
         if isinstance(user, UserProfile) and user.timezone:
             return validate_timezone(user.timezone)
-
-    profile = UserProfile.query.filter_by(user_id=user_id).first()
-    if profile and profile.timezone:
-        return validate_timezone(profile.timezone)
     return user_timezone(user_id)
 
 
@@ -138,9 +126,61 @@ def snapshot_session_week(session, user=None, timezone=None):
         session.completed_local_date = local_date
     if session.completed_week_start is None:
         session.completed_week_start = _monday(local_date)
+        _count_session_week(session.user_id, session.completed_week_start)
     return session
 
 
+def _count_session_week(user_id, week_start):
+    counter = db.session.get(WorkoutWeekCount, (user_id, week_start))
+    if counter is None:
+        counter = WorkoutWeekCount(user_id=user_id, week_start=week_start, completed_count=0)
+        db.session.add(counter)
+    counter.completed_count += 1
+    return counter
+
+
+def week_count(user_id, week_start):
+    counter = db.session.get(WorkoutWeekCount, (user_id, week_start))
+    return counter.completed_count if counter else 0
+
+
+def rebuild_week_counts(user_id):
+    """Recount the per-week totals from the sessions' frozen week starts."""
+    db.session.flush()
+    WorkoutWeekCount.query.filter_by(user_id=user_id).delete(synchronize_session="fetch")
+    rows = (
+        db.session.query(WorkoutSession.completed_week_start, func.count(WorkoutSession.id))
+        .filter(
+            WorkoutSession.user_id == user_id,
+            WorkoutSession.completed_at.isnot(None),
+            WorkoutSession.completed_week_start.isnot(None),
+            WorkoutSession.completions.any(),
+        )
+        .group_by(WorkoutSession.completed_week_start)
+        .all()
+    )
+    for week_start, completed in rows:
+        db.session.add(WorkoutWeekCount(
+            user_id=user_id,
+            week_start=week_start,
+            completed_count=completed,
+        ))
+    db.session.flush()
+    return len(rows)
+
+
+def _week_counts(user_id, first_week, last_week):
+    return dict(
+        db.session.query(WorkoutWeekCount.week_start, WorkoutWeekCount.completed_count)
+        .filter(
+            WorkoutWeekCount.user_id == user_id,
+            WorkoutWeekCount.week_start >= first_week,
+            WorkoutWeekCount.week_start <= last_week,
+        )
+        .all()
+    )
+
+
 def backfill_session_weeks(user_id, timezone):
     timezone_name = validate_timezone(timezone)
     sessions = (
@@ -196,19 +236,7 @@ def current_weekly_goal(user_id, week_start=None, *, now=None, timezone=None):
         week_start = week_start_for(now, timezone_name)
     else:
         week_start = _monday(week_start)
-
-    return (
-        WorkoutWeeklyGoal.query.filter(
-            WorkoutWeeklyGoal.user_id == user_id,
-            WorkoutWeeklyGoal.effective_week_start <= week_start,
-        )
-        .order_by(
-            WorkoutWeeklyGoal.effective_week_start.desc(),
-            WorkoutWeeklyGoal.created_at.desc(),
-            WorkoutWeeklyGoal.id.desc(),
-        )
-        .first()
-    )
+    return _goal_for_week(user_context(user_id).weekly_goals, week_start)
 
 
 def _target_sessions(value):
@@ -259,6 +287,7 @@ def create_weekly_goal(
         goal.target_sessions = target
         goal.timezone = timezone_name
     db.session.flush()
+    invalidate_user_context(user_id, "weekly_goals")
     return goal
 
 
@@ -289,40 +318,17 @@ def _goal_for_week(goals, week_start):
     return applicable
 
 
-def weekly_progress(user_id, now=None):
-    timezone_name = user_timezone(user_id)
+def weekly_progress(user_id, now=None, timezone=None):
+    timezone_name = validate_timezone(timezone) if timezone else user_timezone(user_id)
     current_week_start = week_start_for(now, timezone_name)
-    confirmed_timezone = confirmed_user_timezone(user_id)
-    if confirmed_timezone:
-        backfill_session_weeks(user_id, confirmed_timezone)
-
-    goals = (
-        WorkoutWeeklyGoal.query.filter(
-            WorkoutWeeklyGoal.user_id == user_id,
-            WorkoutWeeklyGoal.effective_week_start <= current_week_start,
-        )
-        .order_by(
-            WorkoutWeeklyGoal.effective_week_start.asc(),
-            WorkoutWeeklyGoal.created_at.asc(),
-            WorkoutWeeklyGoal.id.asc(),
-        )
-        .all()
-    )
-    counts = dict(
-        db.session.query(
-            WorkoutSession.completed_week_start,
-            func.count(WorkoutSession.id),
-        )
-        .filter(
-            WorkoutSession.user_id == user_id,
-            WorkoutSession.completed_at.isnot(None),
-            WorkoutSession.completed_week_start.isnot(None),
-            WorkoutSession.completed_week_start <= current_week_start,
-            WorkoutSession.completions.any(),
-        )
-        .group_by(WorkoutSession.completed_week_start)
-        .all()
-    )
+
+    goals = [
+        goal
+        for goal in user_context(user_id).weekly_goals
+        if goal.effective_week_start <= current_week_start
+    ]
+    window_start = current_week_start - timedelta(weeks=STREAK_WINDOW_WEEKS)
+    counts = _week_counts(user_id, window_start, current_week_start)
 
     current_goal = _goal_for_week(goals, current_week_start)
     completed = int(counts.get(current_week_start, 0))
@@ -333,6 +339,9 @@ def weekly_progress(user_id, now=None):
     week = current_week_start if fulfilled else current_week_start - timedelta(days=7)
     earliest_goal_week = goals[0].effective_week_start if goals else None
     while earliest_goal_week is not None and week >= earliest_goal_week:
+        if week < window_start:
+            window_start -= timedelta(weeks=STREAK_WINDOW_WEEKS)
+            counts.update(_week_counts(user_id, window_start, week))
         goal = _goal_for_week(goals, week)
         if goal is None or int(counts.get(week, 0)) < goal.target_sessions:
             break
@@ -363,15 +372,7 @@ def weekly_progress(user_id, now=None):
 
 
 def _current_max_load(user_id, exercise_key):
-    value = (
-        db.session.query(func.max(PersonalRecordEvent.new_value))
-        .filter(
-            PersonalRecordEvent.user_id == user_id,
-            PersonalRecordEvent.exercise_key == exercise_key,
-            PersonalRecordEvent.metric_type == "max_load",
-        )
-        .scalar()
-    )
+    value = user_context(user_id).max_load(exercise_key)
     return float(value) if value is not None else None
 
 
@@ -380,11 +381,7 @@ def current_max_load(user_id, exercise_key):
 
 
 def current_exercise_goal(user_id):
-    return (
-        ExerciseGoal.query.filter_by(user_id=user_id, status="active")
-        .order_by(ExerciseGoal.created_at.desc(), ExerciseGoal.id.desc())
-        .first()
-    )
+    return user_context(user_id).exercise_goal
 
 
 def current_active_exercise_goal(user_id):
@@ -440,4 +437,5 @@ def complete_exercise_goal(session):
     goal.status = "achieved"
     goal.achieved_at = event.achieved_at or session.completed_at
     goal.achieved_session_id = session.id
+    invalidate_user_context(session.user_id, "exercise_goal")
     return goal
@@ -1,8 +1,11 @@
 import json
 import os
 import ssl
-import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from threading import Event, Lock
 from urllib.error import HTTPError, URLError
 from urllib.parse import quote
 from urllib.request import Request, urlopen
@@ -10,6 +13,8 @@ from urllib.request import Request, urlopen
 import certifi
 from flask import current_app
 
+from src.services.media_store import MediaStoreError, create_media_store, enforce_size_limit, write_atomically
+
 
 BASE_URL = "https://api.workoutxapp.com/v1"
 SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
@@ -40,32 +45,112 @@ class WorkoutXServiceError(Exception):
     """Raised when WorkoutX cannot provide a usable exercise GIF."""
 
 
+class WorkoutXProviderError(WorkoutXServiceError):
+    """WorkoutX answered, but with an error status or an unusable body."""
+
+
+_create_lock = Lock()
+
+
+class MediaIndex:
+    """Approved media per catalog key: database reviews overlaid on the JSON mapping.
+
+    The mapping file is parsed again only when its mtime or size changes. Reviews
+    are loaded in one query and kept until ``invalidate()`` (called after a review
+    is written here) or for ``reviews_ttl`` seconds, which bounds how long other
+    workers serve a superseded approval.
+    """
+
+    def __init__(self, reviews_ttl=60):
+        self.reviews_ttl = reviews_ttl
+        self._lock = Lock()
+        self._file_signature = None
+        self._mapping = {}
+        self._resolved = None
+        self._loaded_at = 0.0
+
+    def mapping(self):
+        path = Path(current_app.config["WORKOUTX_MEDIA_MAPPING_PATH"])
+        try:
+            stat = path.stat()
+            signature = (str(path), stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature = (str(path), None, None)
+        with self._lock:
+            if signature == self._file_signature:
+                return self._mapping
+        mapping = {}
+        if signature[1] is not None:
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError) as error:
+                raise WorkoutXServiceError("WorkoutX media mapping is invalid") from error
+            mapping = data if isinstance(data, dict) else {}
+        with self._lock:
+            self._file_signature = signature
+            self._mapping = mapping
+            self._resolved = None
+        return mapping
+
+    def resolved(self):
+        mapping = self.mapping()
+        with self._lock:
+            if self._resolved is not None and time.monotonic() - self._loaded_at < self.reviews_ttl:
+                return self._resolved
+        # Runtime approvals live in the database because Render's filesystem is ephemeral.
+        from src.models.user import ExerciseMediaReview
+
+        resolved = {
+            key: entry
+            for key, entry in mapping.items()
+            if isinstance(entry, dict) and entry.get("provider_id")
+        }
+        for review in ExerciseMediaReview.query.all():
+            if review.status != "approved" or not review.provider_id:
+                resolved.pop(review.catalog_key, None)
+                continue
+            resolved[review.catalog_key] = {
+                "provider_id": review.provider_id,
+                "provider_name": review.provider_name,
+                "provider_equipment": review.provider_equipment or "",
+            }
+        with self._lock:
+            self._resolved = resolved
+            self._loaded_at = time.monotonic()
+        return resolved
+
+    def invalidate(self):
+        with self._lock:
+            self._resolved = None
+
+
+def media_index():
+    """The index of the current app; each app (and test) gets its own."""
+    index = current_app.extensions.get("workoutx_media")
+    if index is None:
+        with _create_lock:
+            index = current_app.extensions.get("workoutx_media")
+            if index is None:
+                index = MediaIndex(current_app.config.get("WORKOUTX_MEDIA_REVIEWS_TTL", 60))
+                current_app.extensions["workoutx_media"] = index
+    return index
+
+
 def media_mapping():
-    path = Path(current_app.config["WORKOUTX_MEDIA_MAPPING_PATH"])
-    if not path.is_file():
-        return {}
-    try:
-        data = json.loads(path.read_text(encoding="utf-8"))
-    except (OSError, json.JSONDecodeError) as error:
-        raise WorkoutXServiceError("WorkoutX media mapping is invalid") from error
-    return data if isinstance(data, dict) else {}
+    return media_index().mapping()
 
 
 def approved_media(catalog_key):
-    # Runtime approvals live in the database because Render's filesystem is ephemeral.
-    from src.models.user import ExerciseMediaReview
-
-    review = ExerciseMediaReview.query.filter_by(catalog_key=catalog_key).first()
-    if review is not None:
-        if review.status != "approved" or not review.provider_id:
-            return None
-        return {
-            "provider_id": review.provider_id,
-            "provider_name": review.provider_name,
-            "provider_equipment": review.provider_equipment or "",
-        }
-    entry = media_mapping().get(catalog_key)
-    return entry if isinstance(entry, dict) and entry.get("provider_id") else None
+    return media_index().resolved().get(catalog_key)
+
+
+def approved_media_many(catalog_keys):
+    resolved = media_index().resolved()
+    return {catalog_key: resolved.get(catalog_key) for catalog_key in catalog_keys}
+
+
+def invalidate_media():
+    media_index().invalidate()
 
 
 def _request(url, max_bytes=None):
@@ -82,10 +167,10 @@ def _request(url, max_bytes=None):
             limit = max_bytes or current_app.config["WORKOUTX_MAX_RESPONSE_BYTES"]
             body = response.read(limit + 1)
             if len(body) > limit:
-                raise WorkoutXServiceError("WorkoutX response is too large")
+                raise WorkoutXProviderError("WorkoutX response is too large")
             return body
     except HTTPError as error:
-        raise WorkoutXServiceError(f"WorkoutX request failed with status {error.code}") from error
+        raise WorkoutXProviderError(f"WorkoutX request failed with status {error.code}") from error
     except URLError as error:
         raise WorkoutXServiceError("WorkoutX is unavailable") from error
 
@@ -133,33 +218,225 @@ def get_exercise(provider_id):
     return data
 
 
-def get_cached_gif(catalog_key, provider_id):
+class _Flight:
+    def __init__(self):
+        self.done = Event()
+        self.error = None
+
+
+# A hit refreshes the file's mtime (its LRU recency) at most this often.
+_TOUCH_INTERVAL = 3600
+
+
+def _cached(cache_path):
+    try:
+        stat = cache_path.stat()
+    except OSError:
+        return False
+    if not stat.st_size:
+        return False
+    if time.time() - stat.st_mtime > _TOUCH_INTERVAL:
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+    return True
+
+
+class GifFetcher:
+    """Single-flight GIF downloads with a short negative cache per provider ID.
+
+    Concurrent misses for the same cache file wait for one fill instead of each
+    fetching the GIF; a provider ID that just failed is not requested again for
+    ``negative_ttl`` seconds. ``store`` is the optional durable tier checked
+    before WorkoutX, so a fresh disk is refilled from it after a deploy.
+    """
+
+    def __init__(self, negative_ttl=300, max_failures=1024, store=None):
+        self.negative_ttl = negative_ttl
+        self.max_failures = max_failures
+        self.store = store
+        self._lock = Lock()
+        self._flights = {}
+        self._failures = OrderedDict()
+        self._stats = {
+            "hits": 0,
+            "downloads": 0,
+            "rehydrated": 0,
+            "coalesced": 0,
+            "failures": 0,
+            "negative_hits": 0,
+            "evicted": 0,
+            "store_errors": 0,
+        }
+
+    def get(self, cache_path, provider_id, fill, wait_timeout):
+        """Return ``cache_path``, running ``fill()`` to create it at most once at a time."""
+        if _cached(cache_path):
+            self.count("hits")
+            return cache_path
+        with self._lock:
+            failure = self._failures.get(provider_id)
+            if failure is not None and failure[0] <= time.monotonic():
+                del self._failures[provider_id]
+                failure = None
+            if failure is not None:
+                self._stats["negative_hits"] += 1
+                raise WorkoutXServiceError(failure[1])
+            flight = self._flights.get(cache_path)
+            leader = flight is None
+            if leader:
+                flight = self._flights[cache_path] = _Flight()
+            else:
+                self._stats["coalesced"] += 1
+        if not leader:
+            if not flight.done.wait(wait_timeout):
+                raise WorkoutXServiceError("WorkoutX GIF download is taking too long")
+            if flight.error is not None:
+                raise WorkoutXServiceError(str(flight.error))
+            return cache_path
+        try:
+            # The previous leader may have finished between the check above and the lock.
+            if not _cached(cache_path):
+                fill()
+            return cache_path
+        except Exception as error:
+            flight.error = error
+            # Only what WorkoutX answered is remembered; local failures (missing key,
+            # disk errors, timeouts) are retried on the next request.
+            if isinstance(error, WorkoutXProviderError):
+                self._remember_failure(provider_id, str(error))
+            raise
+        finally:
+            with self._lock:
+                del self._flights[cache_path]
+            flight.done.set()
+
+    def _remember_failure(self, provider_id, message):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures[provider_id] = (time.monotonic() + self.negative_ttl, message)
+            self._failures.move_to_end(provider_id)
+            while len(self._failures) > self.max_failures:
+                self._failures.popitem(last=False)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._flights), "failing_ids": len(self._failures)}
+
+
+def gif_fetcher():
+    """The fetcher of the current app; each app (and test) gets its own state."""
+    fetcher = current_app.extensions.get("workoutx_gifs")
+    if fetcher is None:
+        with _create_lock:
+            fetcher = current_app.extensions.get("workoutx_gifs")
+            if fetcher is None:
+                fetcher = GifFetcher(
+                    current_app.config.get("WORKOUTX_NEGATIVE_CACHE_TTL", 300),
+                    store=create_media_store(current_app.config),
+                )
+                current_app.extensions["workoutx_gifs"] = fetcher
+    return fetcher
+
+
+def gif_cache_stats():
+    return gif_fetcher().stats()
+
+
+def get_cached_gif(catalog_key, provider_id, durable=True):
+    """Path of the cached GIF: from disk, else the durable tier, else WorkoutX.
+
+    ``durable=False`` keeps the GIF out of the durable tier (review candidates).
+    """
     provider_id = _provider_id(provider_id)
     cache_dir = Path(current_app.config["WORKOUTX_CACHE_DIR"])
     cache_path = cache_dir / f"{catalog_key}-{provider_id}.gif"
-    if cache_path.is_file() and cache_path.stat().st_size:
-        return cache_path
+    fetcher = gif_fetcher()
+    return fetcher.get(
+        cache_path,
+        provider_id,
+        lambda: _fill_cache(fetcher, cache_path, provider_id, durable),
+        current_app.config["WORKOUTX_TIMEOUT"] * 2,
+    )
 
+
+def _fill_cache(fetcher, cache_path, provider_id, durable):
+    store = fetcher.store if durable else None
+    gif = None
+    if store is not None:
+        try:
+            gif = store.get(cache_path.name)
+        except MediaStoreError as error:
+            fetcher.count("store_errors")
+            current_app.logger.warning("Durable media store unavailable: %s", error)
+    if gif:
+        fetcher.count("rehydrated")
+    else:
+        gif = _download_gif(provider_id)
+        fetcher.count("downloads")
+        if store is not None:
+            try:
+                store.put(cache_path.name, gif)
+            except MediaStoreError as error:
+                fetcher.count("store_errors")
+                current_app.logger.warning("Could not keep %s in the durable media store: %s", cache_path.name, error)
+    try:
+        write_atomically(cache_path, gif)
+    except OSError as error:
+        raise WorkoutXServiceError("WorkoutX GIF could not be cached") from error
+    evicted = enforce_size_limit(cache_path.parent, current_app.config.get("WORKOUTX_CACHE_MAX_BYTES"), keep=cache_path)
+    if evicted:
+        fetcher.count("evicted", evicted)
+
+
+def _download_gif(provider_id):
     gif = _request(
         f"{BASE_URL}/gifs/{provider_id}",
         max_bytes=current_app.config["WORKOUTX_MAX_RESPONSE_BYTES"],
     )
     if not gif.startswith((b"GIF87a", b"GIF89a")):
-        raise WorkoutXServiceError("WorkoutX did not return a GIF")
-    try:
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        descriptor, temporary_name = tempfile.mkstemp(
-            dir=cache_dir,
-            prefix=f".{catalog_key}-{provider_id}-",
-            suffix=".tmp",
-        )
-        temporary_path = Path(temporary_name)
-        try:
-            with os.fdopen(descriptor, "wb") as temporary_file:
-                temporary_file.write(gif)
-            temporary_path.replace(cache_path)
-        finally:
-            temporary_path.unlink(missing_ok=True)
-    except OSError as error:
-        raise WorkoutXServiceError("WorkoutX GIF could not be cached") from error
-    return cache_path
+        raise WorkoutXProviderError("WorkoutX did not return a GIF")
+    return gif
+
+
+def _warm_one(app, catalog_key, provider_id):
+    with app.app_context():
+        get_cached_gif(catalog_key, provider_id)
+
+
+def warm_media(catalog_keys, workers=4):
+    """Download the approved GIF of each catalog key into the cache, ``workers`` at a time.
+
+    Returns the counts of ready, failed and unmapped keys plus the failure
+    messages; a failing key does not stop the others.
+    """
+    app = current_app._get_current_object()
+    pending = {}
+    unmapped = 0
+    for catalog_key, media in approved_media_many(catalog_keys).items():
+        if media is None:
+            unmapped += 1
+        else:
+            pending[catalog_key] = media["provider_id"]
+    failures = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="warm-media") as executor:
+        futures = {
+            catalog_key: executor.submit(_warm_one, app, catalog_key, provider_id)
+            for catalog_key, provider_id in pending.items()
+        }
+        for catalog_key, future in futures.items():
+            try:
+                future.result()
+            except Exception as error:
+                failures[catalog_key] = str(error) or type(error).__name__
+    return {
+        "ready": len(pending) - len(failures),
+        "failed": len(failures),
+        "unmapped": unmapped,
+        "failures": failures,
+    }
@@ -1,4 +1,9 @@
+import json
 import os
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from threading import Lock, Thread
 
 import pytest
 
@@ -7,6 +12,8 @@ os.environ.setdefault("SECRET_KEY", "test-secret-key")
 from main import create_app
 from src.config import TestConfig
 from src.models.user import db
+from src.services.db_metrics import count_queries
+from src.services.gemini_client import close_gemini_clients
 
 
 @pytest.fixture
@@ -22,3 +29,157 @@ def app():
 @pytest.fixture
 def client(app):
     return app.test_client()
+
+
+@pytest.fixture
+def query_budget():
+    """Fail when the block issues more SQL statements than ``limit``."""
+
+    @contextmanager
+    def check(limit):
+        with count_queries() as counter:
+            yield counter
+        assert counter.count <= limit, (
+            f"{counter.count} queries exceeded the budget of {limit}:\n"
+            + "\n".join(counter.statements)
+        )
+
+    return check
+
+
+class _FakeGemini:
+    """Minimal generateContent endpoint; replies with queued texts, then ``default``.
+
+    streamGenerateContent sends the reply word by word as SSE and ends with
+    ``stream_finish_reason``; cachedContents creates a named context cache.
+    ``finish_reasons`` queues finish reasons for generateContent (default STOP).
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.replies = []
+        self.default = "Resposta"
+        self.stream_finish_reason = "STOP"
+        self.finish_reasons = []
+        fake = self
+
+        def chunk(text, finish_reason=None):
+            candidate = {"content": {"role": "model", "parts": [{"text": text}]}}
+            if finish_reason:
+                candidate["finishReason"] = finish_reason
+            return {"candidates": [candidate]}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                fake.requests.append({"path": self.path, "body": json.loads(body or b"{}")})
+                if self.path.split("?")[0].endswith("/cachedContents"):
+                    payload = json.dumps({"name": f"cachedContents/fake-{len(fake.requests)}"}).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+                text = fake.replies.pop(0) if fake.replies else fake.default
+                if ":streamGenerateContent" in self.path:
+                    words = text.split(" ")
+                    chunks = [chunk(word + " ") for word in words[:-1]]
+                    chunks.append(chunk(words[-1], fake.stream_finish_reason))
+                    payload = "".join(f"data: {json.dumps(item)}\r\n\r\n" for item in chunks).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+                payload = json.dumps({
+                    "candidates": [{
+                        "content": {"role": "model", "parts": [{"text": text}]},
+                        "finishReason": fake.finish_reasons.pop(0) if fake.finish_reasons else "STOP",
+                    }],
+                    "usageMetadata": {"promptTokenCount": 10, "candidatesTokenCount": 5},
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *_args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def fake_gemini(app):
+    fake = _FakeGemini()
+    app.config["GEMINI_API_KEY"] = "test-key"
+    app.config["GEMINI_BASE_URL"] = fake.url
+    yield fake
+    close_gemini_clients()
+    fake.server.shutdown()
+    fake.server.server_close()
+
+
+class _FakeRedis:
+    """RESP server with the commands of the rate limiter: INCR, DECR, GET, PEXPIRE.
+
+    Expiry is ignored; ``down()`` closes the listener to simulate an outage.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.commands = []
+        fake = self
+        lock = Lock()
+
+        class Handler(StreamRequestHandler):
+            def handle(self):
+                while True:
+                    header = self.rfile.readline()
+                    if not header.startswith(b"*"):
+                        return
+                    command = []
+                    for _ in range(int(header[1:])):
+                        length = int(self.rfile.readline()[1:])
+                        command.append(self.rfile.read(length + 2)[:-2].decode())
+                    with lock:
+                        fake.commands.append(command)
+                        self.wfile.write(fake.reply(command))
+
+        self.server = ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"redis://127.0.0.1:{self.server.server_address[1]}/0"
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reply(self, command):
+        name, args = command[0].upper(), command[1:]
+        if name in ("INCR", "DECR"):
+            value = int(self.values.get(args[0], 0)) + (1 if name == "INCR" else -1)
+            self.values[args[0]] = str(value)
+            return b":%d\r\n" % value
+        if name == "GET":
+            value = self.values.get(args[0])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value.encode())
+        if name == "PEXPIRE":
+            return b":1\r\n"
+        return b"-ERR unknown command\r\n"
+
+    def down(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_redis(app):
+    fake = _FakeRedis()
+    app.config["RATE_LIMIT_BACKEND"] = "redis"
+    app.config["RATE_LIMIT_REDIS_URL"] = fake.url
+    yield fake
+    fake.down()
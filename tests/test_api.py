@@ -1,10 +1,13 @@
 import base64
 import json
 import uuid
+from datetime import datetime, timedelta
 
 import pytest
 
-from src.models.user import db, DietPlan, DietPlanMeal, User, WorkoutExercise, WorkoutPlan
+from src.models.user import (
+    db, AIUsage, ChatMessage, DietPlan, DietPlanMeal, NutritionEstimate, User, WorkoutExercise, WorkoutPlan,
+)
 from src.services import ai
 from src.services.ai import (
     AIQuotaExceededError,
@@ -14,6 +17,10 @@ from src.services.ai import (
     AITruncatedResponseError,
     generate_response,
 )
+from src.services.food_lookup import local_nutrition
+from src.services.gemini_client import connection_metrics, reset_connection_metrics
+from src.services.prompt_context import prompt_stats, reset_prompt_stats, workout_catalog_context
+from src.services.nutrition_cache import NutritionCache, nutrition_cache_key
 
 
 def register(client, username="alice"):
@@ -27,6 +34,29 @@ def test_register_and_create_diet_entry(client):
     assert response.get_json()["entry"]["description"] == "Arroz"
 
 
+def test_diet_entries_support_cursor_pagination(client):
+    register(client)
+    for day in (1, 2, 2, 3, 4):
+        client.post("/api/diet", json={
+            "date": f"2026-08-0{day}",
+            "meal_type": "Almoço",
+            "description": f"Dia {day}",
+        })
+
+    first = client.get("/api/diet?cursor=&limit=2").get_json()
+    assert [item["date"] for item in first["items"]] == ["2026-08-04", "2026-08-03"]
+    client.post("/api/diet", json={"date": "2026-08-09", "meal_type": "Jantar", "description": "Novo"})
+    seen = [item["id"] for item in first["items"]]
+    cursor = first["next_cursor"]
+    while cursor:
+        page = client.get(f"/api/diet?cursor={cursor}&limit=2").get_json()
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+    assert len(seen) == len(set(seen)) == 5
+    assert isinstance(client.get("/api/diet").get_json(), list)
+    assert client.get("/api/diet?cursor=not-a-cursor").status_code == 400
+
+
 def test_plan_details_include_children(app, client):
     register(client)
     with app.app_context():
@@ -97,6 +127,64 @@ def test_gemini_requires_api_key(app):
             generate_response("Olá", user, None)
 
 
+def test_gemini_client_is_reused_across_requests(app, fake_gemini):
+    reset_connection_metrics()
+    fake_gemini.replies = ["Primeira", "Segunda", "Terceira"]
+    with app.app_context():
+        user = User(username="pooled-user")
+        answers = [generate_response("Olá", user, None) for _ in range(3)]
+
+    assert answers == ["Primeira", "Segunda", "Terceira"]
+    assert all(":generateContent" in item["path"] for item in fake_gemini.requests)
+    metrics = connection_metrics()
+    assert metrics["requests"] == 3
+    assert metrics["connections_opened"] == 1
+    assert metrics["connections_reused"] == 2
+    assert metrics["handshake_ms_total"] > 0
+
+
+def test_workout_prompt_uses_compact_cached_catalog_context(app, fake_gemini):
+    reset_prompt_stats()
+    app.config["GEMINI_CONTEXT_CACHE"] = True
+    fake_gemini.default = '{"type": "workout_plan", "title": "Treino", "description": "", "days": []}'
+    questionnaire = {
+        "goal": "hypertrophy",
+        "experience_level": "beginner",
+        "days_per_week": 2,
+        "split_type": "full_body",
+        "session_duration": 45,
+        "equipment": ["full_gym"],
+    }
+    with app.app_context():
+        ai.generate_workout_plan(questionnaire, None)
+        ai.generate_workout_plan(dict(questionnaire, session_duration=60), None)
+
+    cache_requests = [item for item in fake_gemini.requests if item["path"].endswith("/cachedContents")]
+    generations = [item["body"] for item in fake_gemini.requests if ":generateContent" in item["path"]]
+    assert len(cache_requests) == 1
+    assert '{"columns":["key",' in cache_requests[0]["body"]["systemInstruction"]["parts"][0]["text"]
+    assert len(generations) == 2
+    assert {body["cachedContent"] for body in generations} == {"cachedContents/fake-1"}
+    for body in generations:
+        assert "systemInstruction" not in body
+        assert "exercise_catalog" not in body["contents"][0]["parts"][0]["text"]
+    stats = prompt_stats()["workout_plan"]
+    assert stats["calls"] == 2
+    assert stats["prompt_tokens"] == 20
+    assert stats["estimated_tokens_saved"] > 0
+
+
+def test_compact_catalog_is_memoized_per_equipment_and_level():
+    first, saved = workout_catalog_context({"equipment": ["dumbbell", "bodyweight"], "experience_level": "beginner"})
+    again, _ = workout_catalog_context({"equipment": ["bodyweight", "dumbbell"], "experience_level": "beginner"})
+    table = json.loads(first)
+
+    assert again is first
+    assert saved > 0
+    assert table["columns"][0] == "key"
+    assert all(row[-1] == "beginner" for row in table["rows"])
+
+
 def test_chat_uses_configured_output_limit(app, monkeypatch):
     output_limits = []
     monkeypatch.setattr(ai, "_completion", lambda *args, **kwargs: output_limits.append((args[2], kwargs["model"])) or "Resposta")
@@ -222,6 +310,126 @@ def test_workout_generation_uses_fallback_model(app, monkeypatch):
     assert models == ["primary-model", "fallback-model"]
 
 
+def test_macro_endpoint_answers_repeated_foods_from_cache(app, client, monkeypatch):
+    register(client)
+    app.config["RATE_LIMITS"] = {"ai": (1, 60)}
+    calls = []
+
+    def completion(*args, **kwargs):
+        calls.append(args[1])
+        return '{"calories": 155, "protein": 13, "carbs": 1, "fat": 11}'
+
+    monkeypatch.setattr(ai, "_completion", completion)
+
+    first = client.post("/api/diet/ai_macros", json={"description": "omelete de claras"})
+    repeat = client.post("/api/diet/ai_macros", json={"description": "  Omelete de   Claras."})
+
+    assert first.status_code == repeat.status_code == 200
+    assert repeat.get_json() == first.get_json()
+    assert len(calls) == 1
+    # Only the first (uncached) request spent the single allowed AI request.
+    assert client.post("/api/diet/ai_macros", json={"description": "arroz e feijão"}).status_code == 429
+
+    # A new process (empty in-process tier) still reuses the shared SQL tier.
+    del app.extensions["nutrition_cache"]
+    assert client.post("/api/diet/ai_macros", json={"description": "omelete de claras"}).status_code == 200
+    assert len(calls) == 1
+
+    app.config["RATE_LIMITS"] = {"ai": (100, 60)}
+    client.post("/api/register", json={"username": "admin", "password": "strong-password"})
+    with app.app_context():
+        User.query.filter_by(username="admin").one().is_admin = True
+        db.session.commit()
+    stats = client.get("/api/admin/metrics").get_json()["nutrition_cache"]
+    assert stats["shared_hits"] == 1
+    assert stats["entries"] == 1
+
+
+def test_nutrition_cache_key_depends_on_photo_model_and_prompt_version():
+    base = nutrition_cache_key("Arroz", None, None, "model-a", 1)
+    assert base == nutrition_cache_key(" arroz ", None, None, "model-a", 1)
+    assert base != nutrition_cache_key("Arroz", b"photo", "image/jpeg", "model-a", 1)
+    assert base != nutrition_cache_key("Arroz", None, None, "model-b", 1)
+    assert base != nutrition_cache_key("Arroz", None, None, "model-a", 2)
+    assert nutrition_cache_key("", b"photo", "image/jpeg", "m", 1) != nutrition_cache_key(
+        "", b"other photo", "image/jpeg", "m", 1
+    )
+
+
+def test_nutrition_cache_stores_outside_the_request_session_and_purges_periodically(app):
+    macros = {"calories": 100, "protein": 1, "carbs": 20, "fat": 2, "precision": "baixa"}
+    with app.app_context():
+        cache = NutritionCache(10, 3600, shared=True)
+        db.session.add(NutritionEstimate(
+            key="expired", macros=macros, created_at=datetime.utcnow(), expires_at=datetime.utcnow() - timedelta(1),
+        ))
+        db.session.commit()
+        # Pending work of the request is neither committed nor discarded by a store.
+        pending = User(username="pending", password_hash="x")
+        db.session.add(pending)
+
+        cache.put("first", macros)
+        assert pending in db.session
+        db.session.rollback()
+        assert User.query.filter_by(username="pending").first() is None
+        assert {row.key for row in NutritionEstimate.query} == {"first"}
+
+        db.session.add(NutritionEstimate(
+            key="expired", macros=macros, created_at=datetime.utcnow(), expires_at=datetime.utcnow() - timedelta(1),
+        ))
+        db.session.commit()
+        cache.put("second", macros)
+        # The purge already ran within this interval.
+        assert {row.key for row in NutritionEstimate.query} == {"expired", "first", "second"}
+
+
+def test_food_table_parses_quantities_and_tolerates_accents_and_typos():
+    estimate, remainder = local_nutrition("150 g de arroz e 1 concha de feijao; 2 OVOS, aroz 100g")
+
+    assert remainder == ""
+    assert [item["food"] for item in estimate["items"]] == [
+        "Arroz, tipo 1, cozido",
+        "Feijão, carioca, cozido",
+        "Ovo, de galinha, inteiro, cozido/10minutos",
+        "Arroz, tipo 1, cozido",
+    ]
+    assert [item["grams"] for item in estimate["items"]] == [150, 100, 100, 100]
+    assert estimate["calories"] == pytest.approx(1.5 * 128 + 76 + 146 + 128)
+    assert local_nutrition("arroz")[0] is None
+    # A preferred food is not picked through one of its qualifiers ("Manteiga, com sal").
+    for description in ("5 g de sal", "1 colher de sal", "1 pera", "100 g de pêra"):
+        assert local_nutrition(description) == (None, description)
+    assert local_nutrition("1 colher de sopa de aveia, um suco verde") == (
+        {
+            "calories": 59.1, "protein": 2.1, "carbs": 10.0, "fat": 1.3, "precision": "alta",
+            "items": [{"food": "Aveia, flocos, crua", "grams": 15.0}],
+        },
+        "um suco verde",
+    )
+
+
+def test_macro_endpoint_uses_food_table_and_asks_ai_only_for_the_rest(client, monkeypatch):
+    register(client)
+    asked = []
+
+    def fake_calculate(description, image_bytes=None, mime_type=None):
+        asked.append(description)
+        return {"calories": 100, "protein": 1, "carbs": 20, "fat": 2, "precision": "baixa"}
+
+    monkeypatch.setattr("src.routes.user_routes.calculate_nutrition", fake_calculate)
+
+    local = client.post("/api/diet/ai_macros", json={"description": "200g de arroz"}).get_json()
+    assert local["source"] == "local"
+    assert local["calories"] == 256
+    assert asked == []
+
+    mixed = client.post("/api/diet/ai_macros", json={"description": "200g de arroz e farofa"}).get_json()
+    assert asked == ["farofa"]
+    assert mixed["source"] == "mixed"
+    assert mixed["calories"] == 356
+    assert mixed["precision"] == "moderada"
+
+
 def test_macro_endpoint_reports_invalid_ai_json(client, monkeypatch):
     register(client)
     monkeypatch.setattr(
@@ -318,6 +526,140 @@ def test_chat_opens_diet_questionnaire(app, client):
         assert DietPlan.query.count() == 0
 
 
+def sse_events(response):
+    events = []
+    for block in response.get_data(as_text=True).strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_chat_stream_forwards_chunks_and_saves_the_full_answer(app, client, fake_gemini):
+    register(client)
+    with app.app_context():
+        User.query.filter_by(username="alice").one().is_premium = True
+        db.session.commit()
+    fake_gemini.replies = ["Beba água e durma bem."]
+
+    response = client.post("/api/chat/stream", json={"message": "Dicas?"})
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    events = sse_events(response)
+    deltas = [data["text"] for event, data in events if event == "delta"]
+    assert len(deltas) == 5
+    assert "".join(deltas) == "Beba água e durma bem."
+    event, done = events[-1]
+    assert event == "done"
+    assert done["response"] == "Beba água e durma bem."
+    assert done["truncated"] is False
+    assert ":streamGenerateContent" in fake_gemini.requests[0]["path"]
+    history = client.get("/api/chat/history").get_json()
+    assert [item["response"] for item in history] == ["Beba água e durma bem."]
+
+
+def test_chat_stream_flags_truncation_and_maps_early_errors(app, client, fake_gemini, monkeypatch):
+    register(client)
+    with app.app_context():
+        User.query.filter_by(username="alice").one().is_premium = True
+        db.session.commit()
+    fake_gemini.replies = ["Resposta cortada no"]
+    fake_gemini.stream_finish_reason = "MAX_TOKENS"
+
+    done = sse_events(client.post("/api/chat/stream", json={"message": "Explique"}))[-1][1]
+
+    assert done["truncated"] is True
+    assert done["response"] == "Resposta cortada no"
+
+    intent = sse_events(client.post("/api/chat/stream", json={"message": "Oi", "intent": "workout_plan"}))
+    assert intent[-1][1]["action"]["type"] == "open_workout_questionnaire"
+    assert len(fake_gemini.requests) == 1
+
+    def quota(*args):
+        raise AIQuotaExceededError("A cota da IA foi atingida. Tente novamente mais tarde.")
+
+    monkeypatch.setattr("src.routes.user_routes.stream_response", lambda *args: iter(quota, None))
+    response = client.post("/api/chat/stream", json={"message": "Olá"})
+    assert response.status_code == 429
+    assert response.is_json
+
+
+def test_ai_usage_ledger_records_calls_and_retries_per_feature(app, client, fake_gemini):
+    register(client)
+    with app.app_context():
+        user = User.query.filter_by(username="alice").one()
+        user.is_premium = user.is_admin = True
+        db.session.commit()
+        user_id = user.id
+    fake_gemini.replies = ["Resposta longa", "Resposta curta", "Resposta cortada no"]
+    fake_gemini.finish_reasons = ["MAX_TOKENS"]
+
+    assert client.post("/api/chat", json={"message": "Como emagrecer?"}).get_json()["response"] == "Resposta curta"
+    fake_gemini.stream_finish_reason = "MAX_TOKENS"
+    sse_events(client.post("/api/chat/stream", json={"message": "Explique"}))
+
+    with app.app_context():
+        rows = AIUsage.query.order_by(AIUsage.id).all()
+        assert [(row.feature, row.attempt, row.outcome) for row in rows] == [
+            ("chat", 1, "truncated"),
+            ("chat", 2, "ok"),
+            ("chat", 1, "truncated"),
+        ]
+        assert {row.user_id for row in rows} == {user_id}
+        assert rows[1].finish_reason == "STOP"
+        assert (rows[1].prompt_tokens, rows[1].output_tokens) == (10, 5)
+        latencies = sorted(row.latency_ms for row in rows)
+
+    response = client.get("/api/admin/ai-usage?days=1")
+    assert response.status_code == 200
+    (chat,) = response.get_json()["features"]
+    assert chat["feature"] == "chat"
+    assert chat["model"] == app.config["GEMINI_CHAT_MODEL"]
+    assert chat["calls"] == 3
+    assert chat["retries"] == 1
+    assert chat["outcomes"] == {"ok": 1, "truncated": 2}
+    assert chat["prompt_tokens"] == 20
+    assert (chat["latency_ms_p50"], chat["latency_ms_p95"]) == (round(latencies[1], 1), round(latencies[2], 1))
+    (today,) = chat["daily"]
+    assert (today["calls"], today["retries"], today["prompt_tokens"]) == (3, 1, 20)
+    assert client.get("/api/admin/ai-usage?days=365").status_code == 400
+
+
+def test_chat_stream_records_cancelled_usage_when_the_client_disconnects(app, client, fake_gemini, monkeypatch):
+    register(client)
+    with app.app_context():
+        User.query.filter_by(username="alice").one().is_premium = True
+        db.session.commit()
+    fake_gemini.replies = ["Uma resposta com várias palavras para transmitir"]
+    # Hold the Gemini generator, as a reference cycle would, so only an explicit close
+    # (not refcounting after the response is dropped) can record its usage in time.
+    held = []
+    stream_response = ai.stream_response
+
+    class HeldStream:
+        truncated = False
+
+        def __init__(self, stream):
+            self.stream = stream
+
+        def __iter__(self):
+            held.append(iter(self.stream))
+            return held[-1]
+
+    monkeypatch.setattr("src.routes.user_routes.stream_response", lambda *args: HeldStream(stream_response(*args)))
+
+    response = client.post("/api/chat/stream", json={"message": "Explique"}, buffered=False)
+    stream = iter(response.response)
+    assert b"delta" in next(stream)
+    assert b"delta" in next(stream)
+    response.close()
+
+    with app.app_context():
+        rows = AIUsage.query.all()
+        assert [(row.feature, row.outcome) for row in rows] == [("chat", "cancelled")]
+        assert ChatMessage.query.count() == 0
+
+
 def test_chat_reports_other_invalid_ai_response(app, client, monkeypatch):
     register(client)
     with app.app_context():
@@ -0,0 +1,27 @@
+from benchmarks.rate_limit import UnboundedBackend, run
+from benchmarks.run import compare, run_size
+from src.services.rate_limit_backends import MemoryBackend
+
+
+def test_benchmark_run_covers_hot_paths_and_compares_reports(tmp_path):
+    result = run_size(f"sqlite:///{tmp_path / 'bench.db'}", 4, repeat=1, seed=1)
+
+    assert result["sessions"] == 4
+    assert "POST /api/workout_sessions/<id>/finish" in result["endpoints"]
+    assert "evaluate_achievements" in result["services"]
+    for group in ("services", "endpoints"):
+        for stats in result[group].values():
+            assert stats["min_ms"] <= stats["median_ms"] <= stats["max_ms"]
+            assert stats["queries"] > 0
+
+    lines = compare({"results": [result]}, {"results": [result]})
+    assert lines and all("1.00x" in line for line in lines)
+
+
+def test_rate_limit_benchmark_memory_stays_flat_at_the_key_cap():
+    bounded = run(lambda: MemoryBackend(shards=4, max_keys=200), 2000, checkpoints=4)
+    unbounded = run(UnboundedBackend, 2000, checkpoints=4)
+
+    assert [sample["keys_held"] for sample in bounded["checkpoints"]] == [200] * 4
+    assert [sample["keys_held"] for sample in unbounded["checkpoints"]] == [500, 1000, 1500, 2000]
+    assert bounded["checkpoints"][-1]["memory_mb"] < unbounded["checkpoints"][-1]["memory_mb"]
@@ -1,9 +1,13 @@
+import json
+import threading
 import pytest
 from datetime import datetime, timedelta
 from types import SimpleNamespace
 
 from src.models.user import (
+    AIJob,
     DietPlan,
+    ExerciseAlias,
     User,
     UserProfile,
     WorkoutExercise,
@@ -20,8 +24,18 @@ from src.services.diet_plans import (
     normalize_diet_output,
     validate_diet_questionnaire,
 )
+from src.services import ai
+from src.services.diet_days import DAY_BRIEFS
+from src.services.exercise_aliases import (
+    exercise_alias_store,
+    fuzzy_catalog_match,
+    remember_exercise_alias,
+    resolve_exercise_name,
+)
+from src.services.plan_repair import plan_repair_stats, reset_plan_repair_stats
 from src.services.workout_plans import (
     PlanValidationError,
+    catalog_aliases,
     normalize_workout_output,
     validate_workout_questionnaire,
     workout_day_specs,
@@ -696,6 +710,68 @@ def test_guided_workout_returns_502_when_retries_exhausted(app, client, monkeypa
         assert WorkoutPlan.query.count() == 0
 
 
+def test_guided_workout_runs_as_job_when_async_is_preferred(app, client, monkeypatch):
+    register_premium(app, client)
+    monkeypatch.setattr("src.routes.user_routes.generate_workout_plan", lambda *args: generated_workout())
+
+    response = client.post(
+        "/api/workout_plans/generate",
+        json=workout_questionnaire(),
+        headers={"Prefer": "respond-async"},
+    )
+
+    assert response.status_code == 202
+    assert response.headers["Preference-Applied"] == "respond-async"
+    job_id = response.get_json()["job"]["id"]
+    assert response.headers["Location"] == f"/api/ai-jobs/{job_id}"
+
+    job = client.get(f"/api/ai-jobs/{job_id}").get_json()["job"]
+    assert job["kind"] == "workout_plan"
+    assert job["status"] == "succeeded"
+    assert job["status_code"] == 201
+    with app.app_context():
+        assert db.session.get(WorkoutPlan, job["result"]["plan"]["id"]) is not None
+
+
+def test_failed_async_job_keeps_error_and_is_private(app, client, monkeypatch):
+    register_premium(app, client)
+
+    def always_bad(*args):
+        raise PlanValidationError({"days.1": "Para 45 minutos, cada treino deve ter entre 4 e 7 exercícios."})
+
+    monkeypatch.setattr("src.routes.user_routes.generate_workout_plan", always_bad)
+
+    response = client.post(
+        "/api/workout_plans/generate",
+        json=workout_questionnaire(),
+        headers={"Prefer": "respond-async"},
+    )
+    job_id = response.get_json()["job"]["id"]
+
+    job = client.get(f"/api/ai-jobs/{job_id}").get_json()["job"]
+    assert job["status"] == "failed"
+    assert job["status_code"] == 502
+    assert "error" in job["result"]
+
+    client.post("/api/logout")
+    client.post("/api/register", json={"username": "intruder", "password": "strong-password"})
+    assert client.get(f"/api/ai-jobs/{job_id}").status_code == 404
+
+
+def test_async_job_validates_questionnaire_before_queueing(app, client):
+    register_premium(app, client)
+
+    response = client.post(
+        "/api/workout_plans/generate",
+        json=workout_questionnaire(days_per_week=9),
+        headers={"Prefer": "respond-async"},
+    )
+
+    assert response.status_code == 400
+    with app.app_context():
+        assert AIJob.query.count() == 0
+
+
 def test_guided_diet_creation(app, client, monkeypatch):
     register_premium(app, client)
     monkeypatch.setattr("src.routes.user_routes.generate_diet_plan", lambda *args: generated_diet(args[2]))
@@ -751,7 +827,46 @@ def test_guided_diet_requires_complete_adult_profile(app, client, monkeypatch):
     assert called["value"] is False
 
 
-def test_guided_diet_retries_with_validation_feedback(app, client, monkeypatch):
+def test_guided_diet_repairs_only_the_invalid_day(app, client, monkeypatch):
+    register_premium(app, client)
+    calls = []
+    repairs = []
+
+    def generate(*args):
+        calls.append(args[3])
+        result = generated_diet(args[2])
+        result["days"][1]["meals"][0]["calories"] = 0
+        return result
+
+    def repair(questionnaire, profile, targets, draft, days, errors):
+        repairs.append((days, errors))
+        fixed = generated_diet(targets)
+        return dict(draft, days=[draft["days"][0], fixed["days"][1], draft["days"][2]])
+
+    monkeypatch.setattr("src.routes.user_routes.generate_diet_plan", generate)
+    monkeypatch.setattr("src.routes.user_routes.repair_diet_plan", repair)
+    reset_plan_repair_stats()
+
+    response = client.post("/api/diet_plans/generate", json=diet_questionnaire())
+
+    assert response.status_code == 201
+    assert calls == [None]
+    assert [days for days, _ in repairs] == [[2]]
+    assert all(field.startswith("days.2.") for field in repairs[0][1])
+    stats = plan_repair_stats()["diet"]
+    assert stats["full"]["attempts"] == 1 and stats["full"]["succeeded"] == 0
+    assert stats["repair"] == {
+        "attempts": 1,
+        "succeeded": 1,
+        "tokens": 0,
+        "success_rate": 1.0,
+        "tokens_per_attempt": 0.0,
+    }
+    with app.app_context():
+        assert DietPlan.query.count() == 1
+
+
+def test_guided_diet_regenerates_with_feedback_after_plan_level_errors(app, client, monkeypatch):
     register_premium(app, client)
     calls = []
 
@@ -759,7 +874,7 @@ def test_guided_diet_retries_with_validation_feedback(app, client, monkeypatch):
         calls.append(args[3])
         result = generated_diet(args[2])
         if len(calls) == 1:
-            result["days"][0]["meals"][0]["calories"] = 0
+            result["days"].pop()
         return result
 
     monkeypatch.setattr("src.routes.user_routes.generate_diet_plan", generate)
@@ -769,33 +884,208 @@ def test_guided_diet_retries_with_validation_feedback(app, client, monkeypatch):
     assert response.status_code == 201
     assert len(calls) == 2
     assert calls[0] is None
-    assert "validation_errors" in calls[1]
+    assert "days" in calls[1]["validation_errors"]
     assert calls[1]["previous_plan"]["type"] == "diet_plan"
     assert calls[1]["allowed_daily_ranges"]["protein"]["min"] > 0
     with app.app_context():
         assert DietPlan.query.count() == 1
 
 
+def test_guided_diet_generates_days_concurrently_and_merges_in_order(app, client, monkeypatch):
+    register_premium(app, client)
+    app.config["GEMINI_DIET_PARALLEL_DAYS"] = True
+    calls = []
+    lock = threading.Lock()
+    started = threading.Barrier(3, timeout=5)
+
+    def generate_day(questionnaire, profile, existing_meals, brief, targets, correction):
+        day = next(number for number, focus in enumerate(DAY_BRIEFS, start=1) if focus in brief)
+        assert isinstance(profile, dict)
+        with lock:
+            calls.append((day, correction, threading.current_thread().name))
+            first_call = sum(1 for call in calls if call[0] == day) == 1
+        if first_call:
+            started.wait()
+        meals = generated_diet(targets)["days"][0]["meals"]
+        for meal in meals:
+            meal["items"] = [f"Dia {day}: {item}" for item in meal["items"]]
+        if day == 2 and first_call:
+            meals[0]["calories"] = 0
+        return {"type": "diet_plan_day", "meals": meals}
+
+    monkeypatch.setattr("src.routes.user_routes.generate_diet_day", generate_day)
+    monkeypatch.setattr(
+        "src.routes.user_routes.generate_diet_plan",
+        lambda *args: pytest.fail("the whole plan should not be requested"),
+    )
+
+    response = client.post("/api/diet_plans/generate", json=diet_questionnaire())
+
+    assert response.status_code == 201
+    assert sorted(day for day, _, _ in calls) == [1, 2, 2, 3]
+    assert all(name.startswith("diet-day") for _, _, name in calls)
+    retry = next(correction for day, correction, _ in calls if correction)
+    assert retry["previous_plan"]["type"] == "diet_plan_day"
+    meals = response.get_json()["plan"]["meals"]
+    assert [meal["day_of_week"] for meal in meals] == ["Dia 1"] * 3 + ["Dia 2"] * 3 + ["Dia 3"] * 3
+    assert all(meal["items"][0].startswith(meal["day_of_week"]) for meal in meals)
+
+
 def test_guided_diet_does_not_persist_after_invalid_attempts(app, client, monkeypatch):
     register_premium(app, client)
-    calls = {"count": 0}
+    calls = {"generate": 0, "repair": 0}
 
     def generate(*args):
-        calls["count"] += 1
+        calls["generate"] += 1
         result = generated_diet(args[2])
         result["days"][0]["meals"][0]["calories"] = 0
         return result
 
+    def repair(questionnaire, profile, targets, draft, days, errors):
+        calls["repair"] += 1
+        return draft
+
     monkeypatch.setattr("src.routes.user_routes.generate_diet_plan", generate)
+    monkeypatch.setattr("src.routes.user_routes.repair_diet_plan", repair)
 
     response = client.post("/api/diet_plans/generate", json=diet_questionnaire())
 
     assert response.status_code == 502
-    assert calls["count"] == app.config["GEMINI_DIET_VALIDATION_ATTEMPTS"]
+    assert calls["generate"] + calls["repair"] == app.config["GEMINI_DIET_VALIDATION_ATTEMPTS"]
+    assert calls["generate"] == 1
     with app.app_context():
         assert DietPlan.query.count() == 0
 
 
+def test_fuzzy_exercise_match_requires_a_clear_winner():
+    assert fuzzy_catalog_match("Cadeira extensora unilateral")["key"] == "cadeira_extensora"
+    assert fuzzy_catalog_match("rosca direta")["key"] == "rosca_direta_barra"
+    assert fuzzy_catalog_match("Agachamento búlgaro com halteres")["key"] == "agachamento_bulgaro"
+    assert fuzzy_catalog_match("supino") is None
+    assert fuzzy_catalog_match("abdominal") is None
+
+
+def test_replacement_options_learn_exercise_aliases(app, client, monkeypatch):
+    register_premium(app, client)
+    monkeypatch.setattr("src.routes.user_routes.generate_workout_plan", lambda *args: generated_workout())
+    plan = client.post("/api/workout_plans/generate", json=workout_questionnaire()).get_json()["plan"]
+    exercises = plan["days"][0]["exercises"]
+    renamed = {
+        exercises[0]["id"]: "Cadeira extensora unilateral",
+        exercises[1]["id"]: "Supino pegada neutra no aparelho",
+        exercises[2]["id"]: "supino pegada neutra no aparelho",
+    }
+    with app.app_context():
+        for exercise_id, name in renamed.items():
+            exercise = db.session.get(WorkoutExercise, exercise_id)
+            exercise.name, exercise.catalog_key = name, None
+        db.session.commit()
+    session_id = client.post(
+        f"/api/workout_plans/{plan['id']}/days/{plan['days'][0]['id']}/sessions"
+    ).get_json()["session"]["id"]
+    classified = []
+
+    def classify(name):
+        classified.append(name)
+        return "supino_maquina"
+
+    monkeypatch.setattr("src.routes.user_routes.classify_exercise_catalog_key", classify)
+
+    for exercise_id in renamed:
+        response = client.post(
+            f"/api/workout_sessions/{session_id}/exercises/{exercise_id}/replacement_options",
+            json={"available_equipment": ["full_gym"]},
+        )
+        assert response.status_code == 200
+        assert response.get_json()["options"]
+
+    assert classified == ["Supino pegada neutra no aparelho"]
+    with app.app_context():
+        assert [
+            db.session.get(WorkoutExercise, exercise_id).catalog_key for exercise_id in list(renamed)[:2]
+        ] == ["cadeira_extensora", "supino_maquina"]
+        aliases = {alias.name: (alias.catalog_key, alias.source) for alias in ExerciseAlias.query}
+        assert aliases == {
+            "cadeira extensora unilateral": ("cadeira_extensora", "fuzzy"),
+            "supino pegada neutra no aparelho": ("supino_maquina", "ai"),
+        }
+        assert catalog_aliases()["supino pegada neutra no aparelho"]["key"] == "supino_maquina"
+        # Another worker starts with an empty store and finds the alias in the table.
+        app.extensions.pop("exercise_aliases")
+        assert resolve_exercise_name("Supino pegada neutra no aparelho")["key"] == "supino_maquina"
+
+
+def test_learning_an_alias_leaves_the_request_session_alone(app):
+    long_name = "supino pegada neutra no aparelho " * 6
+    with app.test_request_context():
+        db.session.add(ExerciseAlias(name="pendente", catalog_key="supino_maquina", source="ai"))
+        remember_exercise_alias(long_name, "supino_maquina", "ai")
+        db.session.rollback()
+
+        stored = [alias.name for alias in ExerciseAlias.query]
+        assert stored == [long_name.strip()[:160]]
+        assert exercise_alias_store().merged({})[stored[0]]["key"] == "supino_maquina"
+
+
+def test_guided_workout_repairs_only_the_invalid_day(app, client, monkeypatch):
+    register_premium(app, client)
+    calls = {"generate": 0}
+    repairs = []
+
+    def generate(*args):
+        calls["generate"] += 1
+        result = generated_workout()
+        result["days"][1]["exercises"][0]["catalog_key"] = "exercicio_inexistente"
+        return result
+
+    def repair(questionnaire, profile, draft, days, errors):
+        repairs.append((days, errors))
+        return dict(draft, days=[draft["days"][0], generated_workout()["days"][1]])
+
+    monkeypatch.setattr("src.routes.user_routes.generate_workout_plan", generate)
+    monkeypatch.setattr("src.routes.user_routes.repair_workout_plan", repair)
+
+    response = client.post("/api/workout_plans/generate", json=workout_questionnaire())
+
+    assert response.status_code == 201
+    assert calls["generate"] == 1
+    assert [days for days, _ in repairs] == [[2]]
+    assert "days.2.exercises.1" in repairs[0][1]
+    assert all(field.startswith("days.2.") for field in repairs[0][1])
+    with app.app_context():
+        assert WorkoutPlan.query.count() == 1
+
+
+def test_workout_repair_sends_only_broken_days_and_merges_them(app, monkeypatch):
+    captured = {}
+    fixed_day = generated_workout()["days"][1]
+
+    def completion(*args, **kwargs):
+        captured["payload"] = json.loads(args[1])
+        captured["kind"] = kwargs["prompt_kind"]
+        return json.dumps({"days": [{"day": 2, **fixed_day}]})
+
+    monkeypatch.setattr(ai, "_completion", completion)
+    draft = generated_workout()
+    draft["days"][1]["exercises"][0]["catalog_key"] = "exercicio_inexistente"
+    errors = {"days.2.exercises.1": "Exercício desconhecido."}
+
+    with app.app_context():
+        questionnaire = validate_workout_questionnaire(workout_questionnaire())
+        repaired = ai.repair_workout_plan(questionnaire, None, draft, [2], errors)
+        rewrite = captured["payload"]["days_to_rewrite"]
+        with pytest.raises(ai.AIResponseError):
+            ai.repair_workout_plan(questionnaire, None, draft, [1, 2], errors)
+
+    assert captured["kind"] == "workout_repair"
+    assert [day["day"] for day in rewrite] == [2]
+    assert rewrite[0]["validation_errors"] == errors
+    assert "required_days" not in captured["payload"]
+    assert repaired["days"] == [draft["days"][0], fixed_day]
+    assert repaired["title"] == draft["title"]
+    assert draft["days"][1]["exercises"][0]["catalog_key"] == "exercicio_inexistente"
+
+
 def test_guided_generation_requires_premium(app, client, monkeypatch):
     client.post("/api/register", json={"username": "free", "password": "strong-password"})
     monkeypatch.setattr("src.routes.user_routes.generate_workout_plan", lambda *args: generated_workout())
@@ -1,11 +1,14 @@
+from datetime import date, datetime, timedelta
 from uuid import uuid4
 
 from src.models.user import (
     DelegatedActionAudit,
     DietPlan,
+    Measurement,
     ProfessionalStudentRelationship,
     User,
     UserProfile,
+    WorkoutDay,
     WorkoutPlan,
     db,
 )
@@ -381,3 +384,44 @@ def test_student_can_revoke_own_relationship(app):
     assert student_client.delete("/api/professional-relationship").status_code == 200
     assert trainer_client.get(f"/api/professional/students/{student_id}").status_code == 404
     assert student_client.get("/api/professional-relationship").get_json()["relationship"] is None
+
+
+def test_student_list_query_count_does_not_grow_with_students(app, query_budget):
+    trainer_client = app.test_client()
+    register(trainer_client, "trainer")
+    enable_professional(app, "trainer")
+    with app.app_context():
+        trainer = User.query.filter_by(username="trainer").one()
+        for index in range(12):
+            student = User(username=f"budget-student-{index}")
+            student.set_password("strong-password")
+            db.session.add(student)
+            db.session.flush()
+            db.session.add(UserProfile(user_id=student.id, goal="hipertrofia"))
+            db.session.add(Measurement(user_id=student.id, date=date(2026, 8, 1), weight=70 + index))
+            db.session.add(Measurement(user_id=student.id, date=date(2026, 9, 1), weight=71 + index))
+            for title in ("Antigo", "Atual"):
+                plan = WorkoutPlan(user_id=student.id, author_user_id=trainer.id, title=title)
+                db.session.add(plan)
+                db.session.flush()
+                db.session.add(WorkoutDay(workout_plan_id=plan.id, code="A", title="A", order=1))
+            db.session.add(DietPlan(user_id=student.id, author_user_id=trainer.id, title="Dieta"))
+            db.session.add(ProfessionalStudentRelationship(
+                professional_user_id=trainer.id,
+                student_user_id=student.id,
+                status="active",
+                invite_token_hash=uuid4().hex,
+                invite_expires_at=datetime(2026, 9, 1),
+                accepted_at=datetime(2026, 8, 1) + timedelta(hours=index),
+            ))
+        db.session.commit()
+
+    with query_budget(12):
+        response = trainer_client.get("/api/professional/students")
+    assert response.status_code == 200
+    items = response.get_json()["items"]
+    assert len(items) == 12
+    assert items[0]["username"] == "budget-student-11"
+    assert items[0]["latest_measurement"]["weight"] == 82
+    assert items[0]["latest_workout_plan"]["days_count"] == 1
+    assert items[0]["latest_diet_plan"]["title"] == "Dieta"
@@ -1,6 +1,8 @@
 import pytest
 
 from src.config import ProductionConfig
+from src.models.user import RateLimitBucket
+from src.services.rate_limit_backends import MemoryBackend, SQLBackend
 
 
 def _register(client, username="alice", password="strong-password"):
@@ -71,6 +73,87 @@ def test_rate_limit_exceeded_returns_429(client, app):
     assert responses[-1].is_json
 
 
+def test_rate_limit_buckets_are_per_limit_name_and_login_register_use_only_the_ip(client, app):
+    app.config["RATE_LIMITS"] = {"register": (2, 60), "login": (3, 60), "ai": (2, 60)}
+    # Registering logs the client in; the register bucket must not move with the session.
+    assert _register(client, "first").status_code == 201
+    assert _register(client, "second").status_code == 201
+    assert _register(client, "third").status_code == 429
+
+    # The ai bucket is separate from register and keyed by account as well as IP.
+    assert [client.post("/api/chat", json={"message": "oi"}).status_code for _ in range(3)] == [403, 403, 429]
+    assert _login(client, "first").status_code == 200
+    assert client.post("/api/chat", json={"message": "oi"}).status_code == 403
+
+    # Login has its own budget, untouched by the register and ai requests above.
+    assert [_login(client, "first").status_code for _ in range(3)] == [200, 200, 429]
+
+
+def test_sql_rate_limit_backend_is_shared_between_app_instances(client, app):
+    app.config["RATE_LIMIT_BACKEND"] = "sql"
+    app.config["RATE_LIMITS"] = {"register": (3, 60), "login": (100, 60), "ai": (100, 60)}
+    responses = [_register(client, f"user{i}", "strong-password") for i in range(3)]
+    assert [response.status_code for response in responses] == [201, 201, 201]
+
+    # A second worker sees the same buckets, so the limit does not multiply.
+    other_worker = SQLBackend()
+    with app.app_context():
+        assert other_worker.allow("register|127.0.0.1|", 3, 60) is False
+        assert RateLimitBucket.query.count() == 1
+    assert _register(client, "user3", "strong-password").status_code == 429
+
+
+def test_redis_rate_limit_backend_counts_on_the_server(client, app, fake_redis):
+    app.config["RATE_LIMITS"] = {"register": (3, 60), "login": (100, 60), "ai": (100, 60)}
+    responses = [_register(client, f"user{i}", "strong-password") for i in range(4)]
+    assert [response.status_code for response in responses] == [201, 201, 201, 429]
+    assert {command[0] for command in fake_redis.commands} == {"INCR", "PEXPIRE", "GET", "DECR"}
+    # The denied request was given back, so only the allowed ones count.
+    assert sum(int(value) for value in fake_redis.values.values()) == 3
+
+
+def test_rate_limits_fall_back_to_local_when_redis_is_down(client, app, fake_redis):
+    app.config["RATE_LIMITS"] = {"register": (2, 60), "login": (100, 60), "ai": (100, 60)}
+    fake_redis.down()
+    responses = [_register(client, f"user{i}", "strong-password") for i in range(3)]
+    assert [response.status_code for response in responses] == [201, 201, 429]
+    assert app.extensions["rate_limiter"].fallbacks == 3
+
+
+def test_memory_rate_limit_backend_slides_and_evicts_idle_keys(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("src.services.rate_limit_backends.time.monotonic", lambda: clock[0])
+    backend = MemoryBackend(shards=4)
+    assert [backend.allow("ai|10.0.0.1|", 2, 10) for _ in range(3)] == [True, True, False]
+    # Halfway through the next window, half of the previous window still counts.
+    clock[0] += 15
+    assert [backend.allow("ai|10.0.0.1|", 2, 10) for _ in range(2)] == [True, False]
+
+    for index in range(50):
+        backend.allow(f"ai|10.0.1.{index}|", 1, 10)
+    assert backend.size() == 51
+    clock[0] += 30
+    for index in range(40):
+        backend.allow(f"ai|10.0.2.{index}|", 1, 10)
+    assert backend.size() == 40
+    assert backend.evicted == 0
+
+
+def test_memory_rate_limit_backend_caps_keys_in_lru_order(monkeypatch):
+    monkeypatch.setattr("src.services.rate_limit_backends.time.monotonic", lambda: 1000.0)
+    backend = MemoryBackend(shards=1, max_keys=3)
+    for key in ("a", "b", "c"):
+        backend.allow(key, 1, 60)
+    assert backend.allow("a", 1, 60) is False
+    backend.allow("d", 1, 60)
+
+    assert backend.size() == 3
+    assert backend.evicted == 1
+    # "b" was the least recently seen, so it starts over; "a" is still limited.
+    assert backend.allow("a", 1, 60) is False
+    assert backend.allow("b", 1, 60) is True
+
+
 def test_diet_field_length_limits(client):
     assert _register(client).status_code == 201
     long_description = client.post("/api/diet", json={
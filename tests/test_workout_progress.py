@@ -1,26 +1,54 @@
 from datetime import datetime, timedelta
 
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
 from src.models.user import (
+    AchievementProgress,
     AchievementUnlock,
     ExerciseGoal,
+    PersonalRecordBest,
     PersonalRecordEvent,
     User,
     UserProfile,
     WorkoutDay,
     WorkoutExercise,
+    WorkoutHistoryState,
     WorkoutPlan,
     WorkoutSession,
     WorkoutSessionExerciseCompletion,
+    WorkoutSessionSummary,
     WorkoutSetPerformance,
+    WorkoutWeekCount,
     db,
 )
-from src.services.achievements import evaluate_achievements
+from src.services.achievements import (
+    ensure_achievement_progress,
+    evaluate_achievements,
+    record_finished_session,
+)
+from src.services.history_jobs import (
+    history_is_dirty,
+    history_queue,
+    mark_history_dirty,
+    process_dirty_histories,
+    process_user_history,
+)
 from src.services.personal_records import (
     E1RM_METRIC_KEY,
+    backfill_personal_records,
+    ensure_personal_record_history,
     process_session_personal_records,
 )
+from src.services import workout_progress
+from src.services.db_metrics import count_queries, reset_metrics
+from src.services.user_context import invalidate_user_context, start_user_context
 from src.services.workout_progress import (
+    confirmed_user_timezone,
     create_weekly_goal,
+    current_weekly_goal,
+    rebuild_week_counts,
     snapshot_session_week,
     weekly_progress,
 )
@@ -223,6 +251,101 @@ def test_pr_histories_are_independent_between_users(app):
         assert {float(item.new_value) for item in second_events if item.metric_type == "max_load"} == {40}
 
 
+def test_pr_bests_track_current_record_and_out_of_order_sessions(app):
+    with app.app_context():
+        user = create_user("pr-bests", "UTC")
+        plan, day, exercises = create_plan(user, ("supino_reto_halteres",))
+        base = datetime(2026, 7, 1, 12, 0)
+        sessions = {
+            load: create_session(user, plan, day, base + timedelta(days=index), [(exercises[0], [
+                {"load_kg": load, "repetitions": 5},
+            ])])
+            for index, load in enumerate((60, 70, 65, 80))
+        }
+        for load in (60, 70, 80):
+            process_session_personal_records(sessions[load])
+        late = process_session_personal_records(sessions[65])
+        assert not any(item.metric_type == "max_load" for item in late)
+
+        best = PersonalRecordBest.query.filter_by(
+            user_id=user.id,
+            exercise_key=exercises[0].catalog_key,
+            metric_key="max_load",
+        ).one()
+        assert float(best.best_value) == 80
+        assert best.latest_session_id == sessions[80].id
+        maxima = [
+            float(item.new_value)
+            for item in PersonalRecordEvent.query.filter_by(metric_key="max_load")
+            .order_by(PersonalRecordEvent.achieved_at)
+        ]
+        assert maxima == [60, 70, 80]
+
+        PersonalRecordBest.query.delete()
+        db.session.flush()
+        newer = create_session(user, plan, day, base + timedelta(days=10), [(exercises[0], [
+            {"load_kg": 85, "repetitions": 5},
+        ])])
+        newer_max = next(
+            item for item in process_session_personal_records(newer)
+            if item.metric_type == "max_load"
+        )
+        assert float(newer_max.previous_value) == 80
+        db.session.commit()
+
+
+def test_bulk_pr_backfill_matches_session_by_session_processing(app):
+    loads = [(60, 8), (70, 5), (65, 12), (70, 6), (80, 3), (75, 10), (82.5, 2)]
+
+    def build(username):
+        user = create_user(username, "UTC")
+        plan, day, exercises = create_plan(user)
+        base = datetime(2026, 5, 1, 12, 0)
+        sessions = [
+            create_session(user, plan, day, base + timedelta(days=index), [
+                (exercises[0], [{"load_kg": load, "repetitions": reps}]),
+                (exercises[1], [{"load_kg": load / 2, "repetitions": reps + 2}]),
+            ])
+            for index, (load, reps) in enumerate(loads)
+        ]
+        process_session_personal_records(sessions[-1])
+        return user, sessions
+
+    def history(user, sessions):
+        order = {session.id: index for index, session in enumerate(sessions)}
+        return sorted(
+            (
+                order[item.workout_session_id],
+                item.exercise_key,
+                item.metric_key,
+                item.new_value,
+                item.previous_value,
+                item.is_initial,
+                item.is_highlighted,
+            )
+            for item in PersonalRecordEvent.query.filter_by(user_id=user.id)
+        )
+
+    with app.app_context():
+        expected_user, expected_sessions = build("pr-serial")
+        ensure_personal_record_history(expected_user.id)
+        bulk_user, bulk_sessions = build("pr-bulk")
+        totals = backfill_personal_records(bulk_user.id, chunk_size=2)
+        assert totals["sessions"] == len(loads) - 1
+        assert history(bulk_user, bulk_sessions) == history(expected_user, expected_sessions)
+        assert not WorkoutSession.query.filter_by(
+            user_id=bulk_user.id,
+            pr_processed_version=None,
+        ).count()
+        best = PersonalRecordBest.query.filter_by(user_id=bulk_user.id, metric_key="max_load").all()
+        assert sorted(float(item.best_value) for item in best) == [41.25, 82.5]
+        db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=["backfill-prs", "--all"])
+    assert result.exit_code == 0
+    assert "Backfilled 0 sessions" in result.output
+
+
 def test_weekly_goal_and_streak_use_completed_qualifying_sessions(app):
     with app.app_context():
         user = create_user("weekly-owner", "UTC")
@@ -260,6 +383,61 @@ def test_weekly_goal_and_streak_use_completed_qualifying_sessions(app):
         assert progress_after_failure["current"]["streak"] == 0
 
 
+def test_week_counters_match_rebuild_and_extend_streak_window(app, monkeypatch):
+    monkeypatch.setattr(workout_progress, "STREAK_WINDOW_WEEKS", 2)
+    with app.app_context():
+        user = create_user("week-counter-owner", "UTC")
+        plan, day, exercises = create_plan(user)
+        start = datetime(2026, 6, 1, 12, 0)
+        create_weekly_goal(user.id, 1, "UTC", effective_week_start=start.date())
+        for week in range(7):
+            session = create_session(
+                user,
+                plan,
+                day,
+                start + timedelta(weeks=week),
+                [(exercises[0], [{"load_kg": 50, "repetitions": 8}])],
+            )
+            snapshot_session_week(session, timezone="UTC")
+        db.session.flush()
+
+        def counts():
+            return {
+                (row.week_start, row.completed_count)
+                for row in WorkoutWeekCount.query.filter_by(user_id=user.id)
+            }
+
+        incremental = counts()
+        assert len(incremental) == 7
+        rebuild_week_counts(user.id)
+        assert counts() == incremental
+
+        progress = weekly_progress(user.id, now=start + timedelta(weeks=6, days=2))
+        assert progress["current"]["completed"] == 1
+        assert progress["current"]["streak"] == 7
+
+
+def test_user_context_caches_reads_until_invalidated(app):
+    with app.test_request_context():
+        user = create_user("context-owner", "UTC")
+        other = create_user("context-other", "UTC")
+        start_user_context(user)
+        assert confirmed_user_timezone(user.id) == "UTC"
+        assert current_weekly_goal(user.id) is None
+
+        UserProfile.query.filter_by(user_id=user.id).update({"timezone": "Europe/Lisbon"})
+        UserProfile.query.filter_by(user_id=other.id).update({"timezone": "Europe/Lisbon"})
+        assert confirmed_user_timezone(user.id) == "UTC"
+        assert confirmed_user_timezone(other.id) == "Europe/Lisbon"
+
+        db.session.expire_all()
+        invalidate_user_context(user.id, "profile")
+        assert confirmed_user_timezone(user.id) == "Europe/Lisbon"
+
+        goal = create_weekly_goal(user.id, 3, "UTC", effective_week_start=datetime(2026, 6, 1).date())
+        assert current_weekly_goal(user.id, datetime(2026, 6, 8).date()) == goal
+
+
 def test_exercise_goal_and_achievements_are_idempotent(app, client):
     with app.app_context():
         user = create_user("goal-owner", "UTC")
@@ -317,3 +495,227 @@ def test_exercise_goal_and_achievements_are_idempotent(app, client):
         assert len(codes) == len(set(codes))
         assert "first_pr" in codes
         assert "first_goal" in codes
+
+
+def test_history_reads_do_not_write_and_dirty_users_are_processed_once(app, client):
+    with app.app_context():
+        user = create_user("history-owner", "UTC")
+        plan, day, exercises = create_plan(user, ("supino_reto_halteres",))
+        session = create_session(user, plan, day, datetime(2026, 8, 3, 12), [(exercises[0], [
+            {"load_kg": 70, "repetitions": 8},
+        ])])
+        mark_history_dirty(user.id)
+        user_id = user.id
+        session_id = session.id
+        db.session.commit()
+
+    login(client, "history-owner")
+    assert client.get("/api/progress/achievements").status_code == 200
+    with app.app_context():
+        assert history_is_dirty(user_id)
+        assert AchievementUnlock.query.count() == 0
+        assert db.session.get(WorkoutSession, session_id).completed_week_start is None
+
+        assert process_dirty_histories() == 1
+        assert not history_is_dirty(user_id)
+        assert db.session.get(WorkoutHistoryState, user_id).processed_at is not None
+        assert db.session.get(WorkoutSession, session_id).completed_week_start is not None
+        assert PersonalRecordEvent.query.filter_by(user_id=user_id).count() > 0
+        assert "first_step" in {item.achievement_code for item in AchievementUnlock.query.all()}
+        assert process_dirty_histories() == 0
+
+
+def test_history_thread_runner_clears_marker(app, client):
+    app.config["WORKOUT_HISTORY_JOBS"] = "thread"
+    with app.app_context():
+        user = create_user("history-thread", "UTC")
+        plan, day, exercises = create_plan(user, ("supino_reto_halteres",))
+        create_session(user, plan, day, datetime(2026, 8, 3, 12), [(exercises[0], [
+            {"load_kg": 70, "repetitions": 8},
+        ])])
+        mark_history_dirty(user.id)
+        user_id = user.id
+        db.session.commit()
+
+    login(client, "history-thread")
+    assert client.get("/api/progress/overview").status_code == 200
+    history_queue.join()
+    with app.app_context():
+        assert not history_is_dirty(user_id)
+        assert AchievementUnlock.query.filter_by(user_id=user_id).count() > 0
+
+
+def test_incremental_achievements_match_full_recompute(app):
+    with app.app_context():
+        user = create_user("incremental-owner", "UTC")
+        plan, day, exercises = create_plan(user)
+        start = datetime(2026, 6, 1, 12, 0)
+        create_weekly_goal(user.id, 2, "UTC", effective_week_start=start.date())
+        assert ensure_achievement_progress(user.id) == []
+        unlocked = []
+        for week in range(4):
+            for offset in (0, 3):
+                load = 50 + week * 5 + offset
+                session = create_session(
+                    user,
+                    plan,
+                    day,
+                    start + timedelta(weeks=week, days=offset),
+                    [
+                        (exercises[0], [{"load_kg": load, "repetitions": 8}]),
+                        (exercises[1], [{"load_kg": load - 10, "repetitions": 10}]),
+                    ],
+                )
+                snapshot_session_week(session, timezone="UTC")
+                records = process_session_personal_records(session)
+                unlocked.extend(record_finished_session(session, records))
+
+        codes = [item.achievement_code for item in unlocked]
+        assert codes[0] == "first_step"
+        assert {"first_pr", "evolving", "consistent"} <= set(codes)
+        progress = db.session.get(AchievementProgress, user.id)
+        incremental = (
+            progress.session_count,
+            progress.highlighted_pr_count,
+            progress.streak_weeks,
+            progress.streak_week_start,
+        )
+        assert evaluate_achievements(user.id, backfilled=True) == []
+        assert incremental == (
+            progress.session_count,
+            progress.highlighted_pr_count,
+            progress.streak_weeks,
+            progress.streak_week_start,
+        )
+        assert incremental[0] == 8
+        assert incremental[2] == 4
+
+
+def test_finished_sessions_store_a_summary_used_by_listings(app, client):
+    with app.app_context():
+        user = create_user("summary-owner", "UTC")
+        plan, day, exercises = create_plan(user, ("supino_reto_halteres",))
+        legacy = create_session(user, plan, day, datetime(2026, 8, 1, 12), [(exercises[0], [
+            {"load_kg": 60, "repetitions": 8},
+        ])])
+        active = WorkoutSession(
+            user_id=user.id,
+            workout_plan_id=plan.id,
+            workout_day_id=day.id,
+            started_at=datetime.utcnow() - timedelta(minutes=30),
+        )
+        db.session.add(active)
+        db.session.flush()
+        completion = WorkoutSessionExerciseCompletion(
+            workout_session_id=active.id,
+            workout_exercise_id=exercises[0].id,
+            exercise_name=exercises[0].name,
+            exercise_catalog_key=exercises[0].catalog_key,
+        )
+        db.session.add(completion)
+        db.session.flush()
+        db.session.add(WorkoutSetPerformance(
+            completion_id=completion.id,
+            set_order=1,
+            load_kg=70,
+            repetitions=8,
+            is_warmup=False,
+        ))
+        db.session.commit()
+        user_id = user.id
+        legacy_id = legacy.id
+        active_id = active.id
+
+    login(client, "summary-owner")
+    finished = client.post(f"/api/workout_sessions/{active_id}/finish").get_json()["summary"]
+    with app.app_context():
+        stored = db.session.get(WorkoutSessionSummary, active_id)
+        assert stored.data == finished
+        assert db.session.get(WorkoutSessionSummary, legacy_id) is None
+        stored.data = {**stored.data, "workout_name": "Snapshot"}
+        db.session.commit()
+
+    items = client.get("/api/activities").get_json()["items"]
+    assert [item["id"] for item in items] == [active_id, legacy_id]
+    assert items[0]["workout_name"] == "Snapshot"
+    assert items[0]["volume_total_kg"] == 560
+    assert items[1]["volume_total_kg"] == 480
+    assert client.get(f"/api/activities/{legacy_id}").get_json()["activity"]["sets_performed"] == 1
+    repeated = client.post(f"/api/workout_sessions/{active_id}/finish").get_json()["summary"]
+    assert repeated["workout_name"] == "Snapshot"
+
+    with app.app_context():
+        process_user_history(user_id)
+        assert db.session.get(WorkoutSessionSummary, legacy_id).data["sets_performed"] == 1
+
+
+def test_activities_cursor_pages_follow_completion_order(app, client):
+    with app.app_context():
+        user = create_user("cursor-owner", "UTC")
+        plan, day, exercises = create_plan(user, ("supino_reto_halteres",))
+        same_time = datetime(2026, 8, 2, 12)
+        session_ids = [
+            create_session(user, plan, day, completed_at, [(exercises[0], [
+                {"load_kg": 50, "repetitions": 8},
+            ])]).id
+            for completed_at in (datetime(2026, 8, 1, 12), same_time, same_time)
+        ]
+        db.session.commit()
+
+    login(client, "cursor-owner")
+    first = client.get("/api/activities?cursor=&limit=2").get_json()
+    assert [item["id"] for item in first["items"]] == [session_ids[2], session_ids[1]]
+    second = client.get(f"/api/activities?cursor={first['next_cursor']}&limit=2").get_json()
+    assert [item["id"] for item in second["items"]] == [session_ids[0]]
+    assert second["next_cursor"] is None
+    offset_page = client.get("/api/activities?limit=2").get_json()
+    assert offset_page["next_cursor"] == first["next_cursor"]
+
+
+def test_progress_endpoints_stay_within_query_budgets(app, client, query_budget):
+    with app.app_context():
+        user = create_user("budget-owner", "UTC")
+        user.is_admin = True
+        plan, day, exercises = create_plan(user)
+        start = datetime(2026, 1, 5, 12)
+        create_weekly_goal(user.id, 2, "UTC", effective_week_start=start.date())
+        for index in range(80):
+            create_session(user, plan, day, start + timedelta(days=2 * index), [
+                (exercises[0], [{"load_kg": 40 + index, "repetitions": 8}] * 3),
+                (exercises[1], [{"load_kg": 30 + index % 5, "repetitions": 10}] * 3),
+            ])
+        process_user_history(user.id)
+        db.session.commit()
+
+    login(client, "budget-owner")
+    budgets = {
+        "/api/progress/overview": 11,
+        "/api/progress/weekly": 6,
+        "/api/activities": 3,
+        "/api/activities?cursor=": 3,
+    }
+    app.config["DB_METRICS_HEADERS"] = True
+    reset_metrics()
+    for url, budget in budgets.items():
+        with query_budget(budget) as counter:
+            response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers["X-DB-Queries"] == str(counter.count)
+        assert float(response.headers["X-DB-Time-Ms"]) >= 0
+
+    endpoints = client.get("/api/admin/metrics").get_json()["endpoints"]
+    assert endpoints["user.list_activities"]["requests"] >= 2
+    assert endpoints["user.progress_overview"]["max_queries"] <= budgets["/api/progress/overview"]
+
+
+def test_failed_statements_are_counted_and_release_their_timer(app):
+    with app.app_context():
+        with count_queries() as counter:
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    db.session.execute(text("SELECT * FROM missing_table"))
+                db.session.rollback()
+            connection = db.session.connection()
+            assert connection.info.get("query_started") == []
+        assert counter.count == 3
+        assert all("missing_table" in statement for statement in counter.statements)
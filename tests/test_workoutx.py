@@ -1,5 +1,13 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
 from src.services import workoutx
-from src.models.user import ExerciseMediaReview, User, db
+from src.services.media_store import enforce_size_limit
+from src.models.user import ExerciseMediaBlob, ExerciseMediaReview, User, db
 
 
 class _Response:
@@ -37,6 +45,209 @@ def test_workoutx_downloads_a_gif_once(app, tmp_path, monkeypatch):
     assert calls == ["https://api.workoutxapp.com/v1/gifs/0201"]
 
 
+def test_concurrent_gif_misses_share_one_download(app, tmp_path, monkeypatch):
+    calls = []
+
+    def slow_urlopen(request, **kwargs):
+        calls.append(request.full_url)
+        time.sleep(0.2)
+        return _Response(b"GIF89ashared")
+
+    monkeypatch.setattr(workoutx, "urlopen", slow_urlopen)
+    app.config.update(WORKOUTX_API_KEY="wx_test", WORKOUTX_CACHE_DIR=tmp_path)
+
+    def fetch(_):
+        with app.app_context():
+            return workoutx.get_cached_gif("agachamento_livre", "0201")
+
+    with ThreadPoolExecutor(max_workers=6) as executor:
+        paths = list(executor.map(fetch, range(6)))
+
+    assert len(set(paths)) == 1
+    assert calls == ["https://api.workoutxapp.com/v1/gifs/0201"]
+    with app.app_context():
+        stats = workoutx.gif_cache_stats()
+    assert stats["downloads"] == 1
+    assert stats["coalesced"] + stats["hits"] == 5
+    assert stats["in_flight"] == 0
+
+
+def test_failing_provider_ids_are_not_retried_until_the_negative_ttl_expires(app, tmp_path, monkeypatch):
+    calls = []
+
+    def broken_urlopen(request, **kwargs):
+        calls.append(request.full_url)
+        return _Response(b"<html>not a gif</html>")
+
+    monkeypatch.setattr(workoutx, "urlopen", broken_urlopen)
+    app.config.update(WORKOUTX_API_KEY="wx_test", WORKOUTX_CACHE_DIR=tmp_path)
+    with app.app_context():
+        for _ in range(3):
+            try:
+                workoutx.get_cached_gif("agachamento_livre", "0201")
+            except workoutx.WorkoutXServiceError as error:
+                assert str(error) == "WorkoutX did not return a GIF"
+            else:
+                raise AssertionError("invalid WorkoutX GIF was accepted")
+        assert len(calls) == 1
+        assert workoutx.gif_cache_stats()["negative_hits"] == 2
+
+        later = time.monotonic() + 301
+        monkeypatch.setattr(workoutx.time, "monotonic", lambda: later)
+        monkeypatch.setattr(workoutx, "urlopen", lambda request, **kwargs: _Response(b"GIF89arecovered"))
+        assert workoutx.get_cached_gif("agachamento_livre", "0201").read_bytes() == b"GIF89arecovered"
+
+
+def test_local_gif_failures_are_not_negative_cached(app, tmp_path, monkeypatch):
+    calls = []
+
+    def fake_urlopen(request, **kwargs):
+        calls.append(request.full_url)
+        return _Response(b"GIF89alocal")
+
+    monkeypatch.setattr(workoutx, "urlopen", fake_urlopen)
+    blocked = tmp_path / "blocked"
+    blocked.write_text("a file where the cache directory should be")
+    app.config.update(WORKOUTX_API_KEY=None, WORKOUTX_CACHE_DIR=blocked)
+    with app.app_context():
+        with pytest.raises(workoutx.WorkoutXServiceError, match="WORKOUTX_API_KEY"):
+            workoutx.get_cached_gif("agachamento_livre", "0201")
+        app.config["WORKOUTX_API_KEY"] = "wx_test"
+        with pytest.raises(workoutx.WorkoutXServiceError, match="could not be cached"):
+            workoutx.get_cached_gif("agachamento_livre", "0201")
+        app.config["WORKOUTX_CACHE_DIR"] = tmp_path / "gifs"
+        assert workoutx.get_cached_gif("agachamento_livre", "0201").read_bytes() == b"GIF89alocal"
+        stats = workoutx.gif_cache_stats()
+
+    assert len(calls) == 2
+    assert (stats["negative_hits"], stats["failing_ids"]) == (0, 0)
+
+
+def test_warm_media_prefetches_approved_mappings(app, tmp_path, monkeypatch):
+    mapping = tmp_path / "media.json"
+    mapping.write_text(json.dumps({
+        "agachamento_livre": {"provider_id": "0201"},
+        "leg_press_45": {"provider_id": "0404"},
+        "agachamento_goblet": {"provider_id": "0505"},
+    }))
+    calls = []
+
+    def fake_urlopen(request, **kwargs):
+        calls.append(request.full_url)
+        if request.full_url.endswith("/0404"):
+            return _Response(b"not a gif")
+        if request.full_url.endswith("/0505"):
+            raise TimeoutError("The read operation timed out")
+        return _Response(b"GIF89awarm")
+
+    monkeypatch.setattr(workoutx, "urlopen", fake_urlopen)
+    app.config.update(
+        WORKOUTX_API_KEY="wx_test",
+        WORKOUTX_CACHE_DIR=tmp_path / "gifs",
+        WORKOUTX_MEDIA_MAPPING_PATH=mapping,
+    )
+    result = app.test_cli_runner().invoke(args=["warm-media", "--workers", "2"])
+
+    assert result.exit_code == 0
+    assert "leg_press_45: WorkoutX did not return a GIF" in result.output
+    assert "agachamento_goblet: The read operation timed out" in result.output
+    assert "Exercise media ready: 1, failed: 2" in result.output
+    assert (tmp_path / "gifs" / "agachamento_livre-0201.gif").read_bytes() == b"GIF89awarm"
+    assert sorted(calls) == [
+        "https://api.workoutxapp.com/v1/gifs/0201",
+        "https://api.workoutxapp.com/v1/gifs/0404",
+        "https://api.workoutxapp.com/v1/gifs/0505",
+    ]
+
+
+@pytest.mark.parametrize("store", ["db", "dir"])
+def test_fresh_disk_is_rehydrated_from_the_durable_tier(app, tmp_path, monkeypatch, store):
+    calls = []
+
+    def fake_urlopen(request, **kwargs):
+        calls.append(request.full_url)
+        return _Response(b"GIF89adurable")
+
+    monkeypatch.setattr(workoutx, "urlopen", fake_urlopen)
+    app.config.update(
+        WORKOUTX_API_KEY="wx_test",
+        WORKOUTX_CACHE_DIR=tmp_path / "disk-1",
+        WORKOUTX_DURABLE_STORE=store,
+        WORKOUTX_DURABLE_DIR=tmp_path / "bucket",
+    )
+    with app.app_context():
+        workoutx.get_cached_gif("agachamento_livre", "0201")
+        workoutx.get_cached_gif("review-0777", "0777", durable=False)
+        if store == "db":
+            assert [blob.name for blob in ExerciseMediaBlob.query.all()] == ["agachamento_livre-0201.gif"]
+        else:
+            assert [path.name for path in (tmp_path / "bucket").iterdir()] == ["agachamento_livre-0201.gif"]
+
+        # A deploy: empty disk and a new process.
+        app.config["WORKOUTX_CACHE_DIR"] = tmp_path / "disk-2"
+        del app.extensions["workoutx_gifs"]
+        path = workoutx.get_cached_gif("agachamento_livre", "0201")
+        stats = workoutx.gif_cache_stats()
+
+    assert path.read_bytes() == b"GIF89adurable"
+    assert len(calls) == 2
+    assert stats["rehydrated"] == 1
+    assert stats["downloads"] == 0
+
+
+def test_disk_cache_evicts_least_recently_used_gifs(tmp_path):
+    for age, name in enumerate(["newest", "recent", "old", "oldest"]):
+        path = tmp_path / f"{name}.gif"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (1000 - age * 10, 1000 - age * 10))
+    (tmp_path / ".partial.tmp").write_bytes(b"x" * 500)
+
+    assert enforce_size_limit(tmp_path, 250, keep=tmp_path / "oldest.gif") == 2
+
+    assert sorted(path.name for path in tmp_path.glob("*.gif")) == ["newest.gif", "oldest.gif"]
+    assert enforce_size_limit(tmp_path, 0) == 0
+
+
+def test_disk_eviction_counts_only_its_own_deletions_and_skips_locked_files(app, tmp_path, monkeypatch):
+    for age, name in enumerate(["newest", "gone", "locked", "oldest"]):
+        path = tmp_path / f"{name}.gif"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (1000 - age * 10, 1000 - age * 10))
+    unlink = os.unlink
+
+    def racing_unlink(path):
+        name = os.path.basename(path)
+        if name == "locked.gif":
+            raise PermissionError(13, "Permission denied", path)
+        if name == "oldest.gif":
+            # Another worker evicts "gone" while this one is busy.
+            unlink(tmp_path / "gone.gif")
+        unlink(path)
+
+    monkeypatch.setattr("src.services.media_store.os.unlink", racing_unlink)
+    with app.app_context():
+        # "oldest" and "newest" are deleted here; "gone" was not, and "locked" is skipped.
+        assert enforce_size_limit(tmp_path, 150) == 2
+
+    assert sorted(path.name for path in tmp_path.glob("*.gif")) == ["locked.gif"]
+
+
+def test_cached_gif_downloads_respect_the_size_cap(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(workoutx, "urlopen", lambda request, **kwargs: _Response(b"GIF89a" + b"x" * 94))
+    app.config.update(WORKOUTX_API_KEY="wx_test", WORKOUTX_CACHE_DIR=tmp_path, WORKOUTX_CACHE_MAX_BYTES=250)
+    with app.app_context():
+        for index, provider_id in enumerate(["0001", "0002", "0003"]):
+            path = workoutx.get_cached_gif("agachamento_livre", provider_id)
+            os.utime(path, (1000 + index, 1000 + index))
+        workoutx.get_cached_gif("agachamento_livre", "0004")
+        assert workoutx.gif_cache_stats()["evicted"] == 2
+
+    assert sorted(path.name for path in tmp_path.glob("*.gif")) == [
+        "agachamento_livre-0003.gif",
+        "agachamento_livre-0004.gif",
+    ]
+
+
 def test_workoutx_review_queue_has_twelve_exercises():
     assert len(workoutx.REVIEW_QUEUE) == 12
 
@@ -94,3 +305,66 @@ def test_admin_can_approve_and_serve_exercise_media(app, client, tmp_path, monke
     assert client.get("/api/exercise-media/agachamento_livre").status_code == 200
     with app.app_context():
         assert db.session.get(ExerciseMediaReview, "agachamento_livre").status == "approved"
+
+
+def test_media_mapping_is_parsed_again_only_when_the_file_changes(app, tmp_path, monkeypatch):
+    mapping = tmp_path / "media.json"
+    mapping.write_text('{"agachamento_livre": {"provider_id": "0201", "provider_name": "Squat"}}')
+    app.config["WORKOUTX_MEDIA_MAPPING_PATH"] = mapping
+    parses = []
+    loads = json.loads
+
+    def counting_loads(text):
+        parses.append(text)
+        return loads(text)
+
+    monkeypatch.setattr(workoutx.json, "loads", counting_loads)
+    with app.app_context():
+        for _ in range(5):
+            assert workoutx.approved_media("agachamento_livre")["provider_name"] == "Squat"
+        assert len(parses) == 1
+
+        mapping.write_text('{"agachamento_livre": {"provider_id": "0202", "provider_name": "Front squat"}}')
+        os.utime(mapping, (time.time() + 10, time.time() + 10))
+        assert workoutx.approved_media("agachamento_livre")["provider_id"] == "0202"
+        assert len(parses) == 2
+
+
+def test_batch_exercise_media_uses_one_review_query_and_sees_new_approvals(app, client, tmp_path, monkeypatch, query_budget):
+    mapping = tmp_path / "media.json"
+    mapping.write_text(json.dumps({
+        key: {"provider_id": f"0{index}", "provider_name": key, "provider_equipment": ""}
+        for index, key in enumerate(["agachamento_livre", "agachamento_goblet", "leg_press_45"], start=100)
+    }))
+    app.config["WORKOUTX_MEDIA_MAPPING_PATH"] = mapping
+    assert client.post("/api/register", json={"username": "admin", "password": "strong-password"}).status_code == 201
+    with app.app_context():
+        User.query.filter_by(username="admin").one().is_admin = True
+        db.session.add(ExerciseMediaReview(
+            catalog_key="agachamento_goblet", provider_id="0999", provider_name="Goblet", status="rejected",
+        ))
+        db.session.commit()
+
+    keys = "agachamento_livre,agachamento_goblet,leg_press_45,agachamento_bulgaro,agachamento_livre"
+    with query_budget(3):
+        response = client.get(f"/api/exercise-media?keys={keys}")
+    assert response.status_code == 200
+    items = response.get_json()["items"]
+    assert [item["catalog_key"] for item in items] == [
+        "agachamento_livre", "agachamento_goblet", "leg_press_45", "agachamento_bulgaro",
+    ]
+    assert [item["available"] for item in items] == [True, False, True, False]
+    assert items[0]["url"] == "/api/exercise-media/agachamento_livre"
+    with query_budget(2):
+        assert client.get(f"/api/exercise-media?keys={keys}").status_code == 200
+
+    monkeypatch.setattr("src.routes.user_routes.get_exercise", lambda provider_id: {
+        "id": provider_id, "name": "Goblet squat", "equipment": "Dumbbell", "gifUrl": "https://example.test/gif",
+    })
+    monkeypatch.setattr("src.routes.user_routes.get_cached_gif", lambda *args: tmp_path / "goblet.gif")
+    assert client.put("/api/admin/exercise-media/agachamento_goblet", json={"provider_id": "0300"}).status_code == 200
+
+    item = client.get("/api/exercise-media?keys=agachamento_goblet").get_json()["items"][0]
+    assert item["available"] is True
+    assert item["provider_name"] == "Goblet squat"
+    assert client.get("/api/exercise-media?keys=").status_code == 400